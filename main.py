@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import warnings
 import sys
@@ -7,12 +8,16 @@ from PySide6 import QtWidgets, QtCore
 from PySide6.QtGui import QFont
 
 from src.Model.Configuration import Configuration
+from src.Model.DVHCalculationPool import DVHCalculationPool
 from src.Controller.TopLevelController import Controller
 warnings.filterwarnings("ignore")
 
 QtWidgets.QApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling, True)
 
 if __name__ == "__main__":
+    # DVHs are calculated in worker processes, which need this when the
+    # application is frozen on Windows.
+    multiprocessing.freeze_support()
 
     # On some configurations error traceback is not being displayed
     #     when the program crashes. This is a workaround.
@@ -28,6 +33,9 @@ if __name__ == "__main__":
     os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
     app = QtWidgets.QApplication(sys.argv)
 
+    # Stop the DVH worker processes when the application exits
+    app.aboutToQuit.connect(DVHCalculationPool().shutdown)
+
     print("PDPI: " + str(app.primaryScreen().physicalDotsPerInch()))
 
     # Set the font to Segoe UI, 9, when in windows OS
@@ -1,13 +1,11 @@
 from src.View.ImageFusion.ImageFusionAxialView import ImageFusionAxialView
 from PySide6 import QtGui, QtWidgets, QtCore
-from PySide6.QtWidgets import QStackedWidget, QDialog, QMessageBox
+from PySide6.QtWidgets import QStackedWidget, QDialog
 
-from src.Model.CalculateImages import get_pixmaps
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.MovingDictContainer import MovingDictContainer
 from src.Controller.PathHandler import resource_path
 from src.Model.MovingModel import read_images_for_fusion
-from src.Model.ImageFusion import get_fused_window
 
 
 class ActionHandler:
@@ -303,35 +301,20 @@ class ActionHandler:
         window = windowing_limits[0]
         level = windowing_limits[1]
 
-        # Update the dictionary of pixmaps with the update window and
-        # level values
-        pixel_values = self.patient_dict_container.get("pixel_values")
-        pixmap_aspect = self.patient_dict_container.get("pixmap_aspect")
-        pixmaps_axial, pixmaps_coronal, pixmaps_sagittal = \
-            get_pixmaps(pixel_values, window, level, pixmap_aspect)
-
-        self.patient_dict_container.set("pixmaps_axial", pixmaps_axial)
-        self.patient_dict_container.set("pixmaps_coronal", pixmaps_coronal)
-        self.patient_dict_container.set("pixmaps_sagittal", pixmaps_sagittal)
+        # Update the pixmaps with the new window and level values. Only
+        # the slices that are displayed will be re-rendered.
+        for view in ["axial", "coronal", "sagittal"]:
+            self.patient_dict_container.get("pixmaps_" + view) \
+                .set_windowing(window, level)
         self.patient_dict_container.set("window", window)
         self.patient_dict_container.set("level", level)
 
+        # The fused pixmaps are also rendered lazily, so they are cheap
+        # to re-window.
         if hasattr(self.__main_page, 'image_fusion_view'):
-            confirm_fuse_window = QMessageBox.information(
-                self.__main_page, "Image Fusion Windowing Confirmation",
-                "Do you want to perform windowing on the Image Fusion Window? "
-                "This process may take a couple of minutes.",
-                QMessageBox.Yes,
-                QMessageBox.No)
-            if confirm_fuse_window == QMessageBox.Yes:
-                fusion_axial, fusion_coronal, fusion_sagittal = \
-                    get_fused_window(level, window)
-                self.patient_dict_container.set(
-                    "color_axial", fusion_axial)
-                self.patient_dict_container.set(
-                    "color_coronal", fusion_coronal)
-                self.patient_dict_container.set(
-                    "color_sagittal", fusion_sagittal)
+            for view in ["axial", "coronal", "sagittal"]:
+                self.patient_dict_container.get("color_" + view) \
+                    .set_windowing(window, level)
 
         self.__main_page.update_views(update_3d_window=True)
 
@@ -384,13 +367,12 @@ class ActionHandler:
         dt = self.patient_dict_container.dataset[slider_id]
         row_s = dt.PixelSpacing[0]
         col_s = dt.PixelSpacing[1]
-        dt.convert_pixel_data()
         pixmap = self.patient_dict_container.get("pixmaps_axial")[slider_id]
         self.__main_page.call_class.run_transect(
             self.__main_page,
             view,
             pixmap,
-            dt._pixel_array.transpose(),
+            self.patient_dict_container.volume[slider_id].transpose(),
             row_s,
             col_s
         )
@@ -4,6 +4,7 @@ import os
 from PySide6 import QtCore, QtWidgets, QtGui
 from PySide6.QtWidgets import QMessageBox
 
+from src.Model.DVHCalculationPool import DVHCalculationPool
 from src.Model.InitialModel import create_initial_model
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.View.OpenPatientWindow import UIOpenPatientWindow
@@ -14,7 +15,6 @@ from src.View.mainpage.MainPage import UIMainWindow
 from src.Controller.PathHandler import resource_path
 
 from src.View.ImageFusion.ImageFusionWindow import UIImageFusionWindow
-from src.Model.MovingModel import read_images_for_fusion
 from src.Model.MovingDictContainer import MovingDictContainer
 
 
@@ -147,8 +147,9 @@ class MainWindow(QtWidgets.QMainWindow, UIMainWindow):
 
     def update_image_fusion_ui(self):
         mvd = MovingDictContainer()
+        # The images have already been registered by the
+        # MovingImageLoader.
         if not mvd.is_empty():
-            read_images_for_fusion()
             self.create_image_fusion_tab()
 
     def pyradiomics_handler(self, path, filepaths, hashed_path):
@@ -202,6 +203,9 @@ class MainWindow(QtWidgets.QMainWindow, UIMainWindow):
         moving_dict_container = MovingDictContainer()
         moving_dict_container.clear()
 
+        # Release the dose grid held by the DVH worker processes
+        DVHCalculationPool().shutdown()
+
     def closeEvent(self, event: QtGui.QCloseEvent) -> None:
         patient_dict_container = PatientDictContainer()
         if patient_dict_container.get("rtss_modified") \
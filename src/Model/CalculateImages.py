@@ -1,28 +1,161 @@
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
+from pydicom.dataelem import RawDataElement
+from pydicom.tag import Tag
 from PySide6 import QtGui, QtCore
 
 import src.constants as constant
+from src.constants import MEMORY_MAP_THRESHOLD, PIXMAP_CACHE_SIZE, \
+    PIXMAP_PREFETCH_RADIUS
+from src.Model.Windowing import apply_window
+from src.Model.Worker import Worker
+
+PIXEL_DATA_TAG = Tag("PixelData")
 
 
-def convert_raw_data(ds):
+def get_volume(ds, memory_map=None):
     """
-    Convert the raw pixel data to readable pixel data in every image dataset
+    Build a single 3D array of the pixel data of every image dataset,
+    with the rescale slope and intercept applied. The array is allocated
+    once and filled slice by slice, and the decoded pixel data cached by
+    each dataset is released afterwards so the pixel data is only held
+    in memory once.
+
+    The volume is int16 when every slice has a rescale slope of 1 and an
+    integer intercept (e.g. CT), and every value the slices can store
+    fits in an int16 once rescaled. Integer data that does not fit (e.g.
+    unsigned 16 bit MR or PET) is int32, and any other data is float32.
+
+    Large volumes are memory-mapped to a temporary cache file rather
+    than being allocated in RAM, so that they are paged in on demand
+    and several large series can be open at the same time.
 
     :param ds: A dictionary of datasets of all the DICOM files of the patient
-    :return: np_pixels, a list of pixel arrays of all slices of the patient
+    :param memory_map: True to always memory-map the volume, False to
+        never memory-map it. By default the volume is memory-mapped if it
+        is larger than MEMORY_MAP_THRESHOLD bytes.
+    :return: Tuple (volume, rescale), where volume is a read-only numpy
+        array in the order (slices, rows, columns) and rescale is the
+        tuple (slope, intercept) of the first slice.
     """
     non_img_list = ['rtss', 'rtdose', 'rtplan', 'rtimage']
-    np_pixels = []
+    image_keys = [key for key in ds if key not in non_img_list]
+
+    slopes = [float(getattr(ds[key], 'RescaleSlope', 1))
+              for key in image_keys]
+    intercepts = [float(getattr(ds[key], 'RescaleIntercept', 0))
+                  for key in image_keys]
+    is_integer = all(slope == 1 for slope in slopes) \
+        and all(intercept.is_integer() for intercept in intercepts)
+
+    first_slice = ds[image_keys[0]]
+    shape = (len(image_keys), first_slice.Rows, first_slice.Columns)
+    if not is_integer:
+        dtype = np.dtype(np.float32)
+    else:
+        value_ranges = [get_stored_value_range(ds[key]) for key in image_keys]
+        min_value = min(low + intercept
+                        for (low, _), intercept in zip(value_ranges,
+                                                       intercepts))
+        max_value = max(high + intercept
+                        for (_, high), intercept in zip(value_ranges,
+                                                        intercepts))
+        if np.iinfo(np.int16).min <= min_value \
+                and max_value <= np.iinfo(np.int16).max:
+            dtype = np.dtype(np.int16)
+        elif np.iinfo(np.int32).min <= min_value \
+                and max_value <= np.iinfo(np.int32).max:
+            dtype = np.dtype(np.int32)
+        else:
+            dtype = np.dtype(np.float32)
+            is_integer = False
+
+    if memory_map is None:
+        memory_map = \
+            int(np.prod(shape)) * dtype.itemsize > MEMORY_MAP_THRESHOLD
+    if memory_map:
+        # The temporary file is removed once the volume is released.
+        volume = np.memmap(tempfile.TemporaryFile(), dtype=dtype,
+                           mode='w+', shape=shape)
+    else:
+        volume = np.empty(shape, dtype=dtype)
+
+    # Do the conversion to every slice (except RTSS, RTDOSE, RTPLAN).
+    # Each slice is written to its own region of the volume, so slices
+    # can be filled concurrently.
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(
+            lambda i: fill_volume_slice(volume, i, ds[image_keys[i]],
+                                        slopes[i], intercepts[i],
+                                        is_integer),
+            range(len(image_keys))))
+
+    if memory_map:
+        volume.flush()
+    volume.flags.writeable = False
+    return volume, (slopes[0], intercepts[0])
+
+
+def get_stored_value_range(dataset):
+    """
+    :param dataset: PyDicom dataset of an image slice.
+    :return: Tuple (min, max) of the pixel values of the slice before
+        the rescale is applied. This is the range the slice declares if
+        it has a SmallestImagePixelValue and LargestImagePixelValue, or
+        else the range of values it can store.
+    """
+    smallest = getattr(dataset, 'SmallestImagePixelValue', None)
+    largest = getattr(dataset, 'LargestImagePixelValue', None)
+    if isinstance(smallest, int) and isinstance(largest, int):
+        return smallest, largest
+
+    bits_stored = int(getattr(dataset, 'BitsStored', None)
+                      or getattr(dataset, 'BitsAllocated', 16))
+    if int(getattr(dataset, 'PixelRepresentation', 0)) == 1:
+        return -2 ** (bits_stored - 1), 2 ** (bits_stored - 1) - 1
+    return 0, 2 ** bits_stored - 1
+
 
-    # Do the conversion to every slice (except RTSS, RTDOSE, RTPLAN)
-    for key in ds:
-        if key not in non_img_list:
-            # dataset of current slice
-            np_tmp = ds[key]
-            np_tmp.convert_pixel_data()
-            np_pixels.append(np_tmp._pixel_array)
+def fill_volume_slice(volume, index, dataset, slope, intercept, is_integer):
+    """
+    Decode the pixel data of an image dataset into a slice of the volume.
+    :param volume: 3D numpy array to write to.
+    :param index: Index of the slice in the volume.
+    :param dataset: PyDicom dataset of the slice.
+    :param slope: Rescale slope of the slice.
+    :param intercept: Rescale intercept of the slice.
+    :param is_integer: True if the volume has an integer dtype.
+    """
+    # If the pixel data has not been read from the file yet (see
+    # ImageLoading.read_dataset), it is put back in that state once the
+    # slice has been decoded so the dataset does not hold a copy of it.
+    # The element is looked up directly, as Dataset.get_item(..) would
+    # read the deferred value from the file.
+    deferred_pixel_data = dataset._dict.get(PIXEL_DATA_TAG)
+    if not isinstance(deferred_pixel_data, RawDataElement) \
+            or deferred_pixel_data.value is not None:
+        deferred_pixel_data = None
 
-    return np_pixels
+    dataset.convert_pixel_data()
+    if is_integer:
+        np.add(dataset._pixel_array, np.int32(intercept), out=volume[index],
+               casting='unsafe')
+    else:
+        np.multiply(dataset._pixel_array, slope, out=volume[index],
+                    casting='unsafe')
+        volume[index] += intercept
+
+    # The slice is now held in the volume; the dataset will decode
+    # its pixel data again if it is ever needed on its own.
+    dataset._pixel_array = None
+    dataset._pixel_id = {}
+    if deferred_pixel_data is not None:
+        dataset._dict[PIXEL_DATA_TAG] = deferred_pixel_data
 
 
 def get_img(pixel_array):
@@ -45,32 +178,23 @@ def get_img(pixel_array):
     return dict_img
 
 
-def scaled_pixmap(np_pixels, window, level, width, height):
+def scaled_image(np_pixels, window, level, width, height, rescale=(1, 0)):
     """
-    Rescale the numpy pixels of image and convert to QPixmap for display.
+    Rescale the numpy pixels of image and convert to a scaled QImage.
+    Unlike QPixmap, QImage can safely be created outside of the GUI
+    thread, which allows slices to be rendered in the background.
 
-    :param np_pixels: A list of converted pixel arrays
+    :param np_pixels: A converted pixel array of a single slice
     :param window: Window width of windowing function
     :param level: Level value of windowing function
     :param width: Pixel width of the window
     :param height: Pixel height of the window
-    :return: pixmap, a QPixmap of the slice
+    :param rescale: Tuple (slope, intercept) already applied to np_pixels
+    :return: qimage, a QImage of the slice
     """
 
-    # Rescale pixel arrays
-    np_pixels = np_pixels.astype(np.int16)
-    if window != 0 and level != 0:
-        # Transformation applied to each individual pixel to unique
-        # contrast level
-        np_pixels = (np_pixels - level) / window * 255
-    else:
-        max_val = np.amax(np_pixels)
-        min_val = np.amin(np_pixels)
-        np_pixels = (np_pixels - min_val) / (max_val - min_val) * 255
-
-    np_pixels[np_pixels < 0] = 0
-    np_pixels[np_pixels > 255] = 255
-    np_pixels = np_pixels.astype(np.int8)
+    # Rescale pixel arrays through the LUT for this window and level
+    np_pixels = apply_window(np_pixels, window, level, rescale)
 
     # Convert numpy array data to QImage for PySide6
     bytes_per_line = np_pixels.shape[1]
@@ -78,43 +202,230 @@ def scaled_pixmap(np_pixels, window, level, width, height):
         np_pixels, np_pixels.shape[1], np_pixels.shape[0], bytes_per_line,
         QtGui.QImage.Format_Indexed8)
 
-    pixmap = QtGui.QPixmap(qimage)
-    pixmap = pixmap.scaled(width, height, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
-    return pixmap
+    # Scaling returns a new QImage which owns its pixel data, so the
+    # numpy buffer above can safely be released afterwards.
+    return qimage.scaled(width, height, QtCore.Qt.IgnoreAspectRatio,
+                         QtCore.Qt.SmoothTransformation)
 
 
-def get_pixmaps(pixel_array, window, level, pixmap_aspect):
+def scaled_pixmap(np_pixels, window, level, width, height):
     """
-    Get a dictionary of pixmaps.
+    Rescale the numpy pixels of image and convert to QPixmap for display.
 
-    :param pixel_array: A list of converted pixel arrays
+    :param np_pixels: A list of converted pixel arrays
     :param window: Window width of windowing function
     :param level: Level value of windowing function
-    :param pixmap_aspect: Scaling ratio for axial, coronal, and sagittal pixmaps
-    :return: dict_pixmaps, a dictionary of all pixmaps within the patient.
+    :param width: Pixel width of the window
+    :param height: Pixel height of the window
+    :return: pixmap, a QPixmap of the slice
     """
-    # Convert pixel array to numpy 3d array
-    pixel_array_3d = np.array(pixel_array)
+    return QtGui.QPixmap.fromImage(
+        scaled_image(np_pixels, window, level, width, height))
+
+
+class LazyPixmaps(Mapping):
+    """
+    Read-only mapping of slice number to QPixmap for a single view
+    (axial, coronal or sagittal). Pixmaps are only rendered when they
+    are requested, and a bounded number of recently viewed pixmaps is
+    kept in a least-recently-used cache. Whenever a slice is requested,
+    its neighbours are rendered on a background thread so that
+    scrolling through the slices does not have to wait for rendering.
+
+    This object can be used wherever a dictionary of pixmaps was
+    previously used, e.g. pixmaps[slice_id] and len(pixmaps).
+    """
+
+    def __init__(self, pixel_array_3d, slice_view, window, level, width,
+                 height, rescale=(1, 0), cache_size=PIXMAP_CACHE_SIZE,
+                 prefetch_radius=PIXMAP_PREFETCH_RADIUS):
+        """
+        :param pixel_array_3d: 3D numpy array of the image volume, in
+            the order (slices, rows, columns)
+        :param slice_view: One of 'axial', 'coronal' or 'sagittal'
+        :param window: Window width of windowing function
+        :param level: Level value of windowing function
+        :param rescale: Tuple (slope, intercept) already applied to
+            pixel_array_3d
+        :param width: Pixel width of the rendered pixmaps
+        :param height: Pixel height of the rendered pixmaps
+        :param cache_size: Maximum number of pixmaps kept in memory
+        :param prefetch_radius: Number of slices either side of the
+            requested slice to render in the background
+        """
+        self.pixel_array_3d = pixel_array_3d
+        self.slice_view = slice_view
+        self.window = window
+        self.level = level
+        self.width = width
+        self.height = height
+        self.rescale = rescale
+        self.cache_size = cache_size
+        self.prefetch_radius = prefetch_radius
+
+        # Pixmaps may only be created and used on the GUI thread, while
+        # prefetched slices are rendered as QImages on the worker thread
+        # and converted to pixmaps when they are first requested.
+        self._pixmaps = OrderedDict()
+        self._images = {}
+        self._lock = threading.Lock()
+        self._prefetch_target = None
+        # Incremented whenever the cache is cleared so that slices being
+        # rendered with outdated settings are discarded.
+        self._generation = 0
+
+        # Prefetching is done one slice at a time so that a burst of
+        # slider movements does not flood the global thread pool.
+        self._threadpool = QtCore.QThreadPool()
+        self._threadpool.setMaxThreadCount(1)
+
+    def __len__(self):
+        return self.pixel_array_3d.shape[self._axis()]
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __contains__(self, index):
+        return isinstance(index, int) and 0 <= index < len(self)
+
+    def __getitem__(self, index):
+        if index not in self:
+            raise KeyError(index)
+
+        with self._lock:
+            pixmap = self._pixmaps.get(index)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(index)
+            image = self._images.pop(index, None)
+
+        if pixmap is None:
+            if image is None:
+                image = self.render_image(index)
+            pixmap = QtGui.QPixmap.fromImage(image)
+            with self._lock:
+                self._pixmaps[index] = pixmap
+                while len(self._pixmaps) > self.cache_size:
+                    self._pixmaps.popitem(last=False)
 
-    # Pixmaps dictionaries of 3 views
-    dict_pixmaps_axial = {}
-    dict_pixmaps_coronal = {}
-    dict_pixmaps_sagittal = {}
+        self.prefetch(index)
+        return pixmap
 
-    axial_width, axial_height = scaled_size(pixel_array_3d.shape[1]*pixmap_aspect["axial"], pixel_array_3d.shape[2])
-    coronal_width, coronal_height = scaled_size(pixel_array_3d.shape[1],
-                                                pixel_array_3d.shape[0] * pixmap_aspect["coronal"])
-    sagittal_width, sagittal_height = scaled_size(pixel_array_3d.shape[2] * pixmap_aspect["sagittal"],
-                                                  pixel_array_3d.shape[0])
+    def _axis(self):
+        return {"axial": 0, "coronal": 1, "sagittal": 2}[self.slice_view]
 
-    for i in range(pixel_array_3d.shape[0]):
-        dict_pixmaps_axial[i] = scaled_pixmap(pixel_array_3d[i, :, :], window, level, axial_width, axial_height)
+    def get_slice(self, index, volume=None):
+        """
+        :param index: Slice number within this view.
+        :param volume: 3D numpy array to take the slice from, in the
+            same order as pixel_array_3d. Defaults to pixel_array_3d.
+        :return: 2D numpy array (a view, not a copy) of the slice.
+        """
+        if volume is None:
+            volume = self.pixel_array_3d
+        if self.slice_view == "axial":
+            return volume[index, :, :]
+        if self.slice_view == "coronal":
+            return volume[:, index, :]
+        return volume[:, :, index]
+
+    def render_image(self, index):
+        """
+        Render a single slice. Safe to call from any thread.
+        :param index: Slice number within this view.
+        :return: QImage of the slice scaled to the size of the view.
+        """
+        return scaled_image(self.get_slice(index), self.window, self.level,
+                            self.width, self.height, self.rescale)
+
+    def prefetch(self, index):
+        """
+        Render the neighbours of the given slice in the background.
+        :param index: Slice number the user is currently viewing.
+        """
+        if self.prefetch_radius <= 0:
+            return
+
+        with self._lock:
+            self._prefetch_target = index
+            # Prefetched images that are out of range of the current
+            # slice are unlikely to be needed anymore.
+            for key in list(self._images):
+                if abs(key - index) > self.prefetch_radius:
+                    del self._images[key]
+
+            generation = self._generation
+
+        self._threadpool.start(
+            Worker(self._prefetch_neighbours, index, generation))
+
+    def _prefetch_neighbours(self, index, generation):
+        for offset in range(1, self.prefetch_radius + 1):
+            for neighbour in (index + offset, index - offset):
+                with self._lock:
+                    if self._prefetch_target != index \
+                            or self._generation != generation:
+                        # The user has moved on to a different slice.
+                        return
+                    if neighbour not in self \
+                            or neighbour in self._pixmaps \
+                            or neighbour in self._images:
+                        continue
+                image = self.render_image(neighbour)
+                with self._lock:
+                    if self._prefetch_target == index \
+                            and self._generation == generation:
+                        self._images[neighbour] = image
+
+    def set_windowing(self, window, level):
+        """
+        Change the window and level. Pixmaps that were already rendered
+        are discarded, and slices are re-rendered as they are requested.
+        :param window: Window width of windowing function
+        :param level: Level value of windowing function
+        """
+        self.window = window
+        self.level = level
+        self.clear_cache()
+
+    def clear_cache(self):
+        """
+        Discard all rendered pixmaps, e.g. after the windowing changes.
+        """
+        with self._lock:
+            self._prefetch_target = None
+            self._generation += 1
+            self._pixmaps.clear()
+            self._images.clear()
+
+
+def get_pixmaps(volume, window, level, pixmap_aspect, rescale=(1, 0)):
+    """
+    Get the lazily rendered pixmaps of the 3 views.
+
+    :param volume: 3D numpy array of the image volume, as returned by
+        get_volume(..)
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :param pixmap_aspect: Scaling ratio for axial, coronal, and sagittal pixmaps
+    :param rescale: Tuple (slope, intercept) already applied to volume
+    :return: Tuple of LazyPixmaps for the axial, coronal and sagittal
+        views. Each can be used like a dictionary of slice number to
+        QPixmap.
+    """
+    axial_width, axial_height = scaled_size(volume.shape[1]*pixmap_aspect["axial"], volume.shape[2])
+    coronal_width, coronal_height = scaled_size(volume.shape[1],
+                                                volume.shape[0] * pixmap_aspect["coronal"])
+    sagittal_width, sagittal_height = scaled_size(volume.shape[2] * pixmap_aspect["sagittal"],
+                                                  volume.shape[0])
 
-    for i in range(pixel_array_3d.shape[1]):
-        dict_pixmaps_coronal[i] = scaled_pixmap(pixel_array_3d[:, i, :], window, level, coronal_width, coronal_height)
-        dict_pixmaps_sagittal[i] = scaled_pixmap(pixel_array_3d[:, :, i], window, level, sagittal_width, sagittal_height)
+    pixmaps_axial = LazyPixmaps(volume, "axial", window, level,
+                                axial_width, axial_height, rescale)
+    pixmaps_coronal = LazyPixmaps(volume, "coronal", window, level,
+                                  coronal_width, coronal_height, rescale)
+    pixmaps_sagittal = LazyPixmaps(volume, "sagittal", window, level,
+                                   sagittal_width, sagittal_height, rescale)
 
-    return dict_pixmaps_axial, dict_pixmaps_coronal, dict_pixmaps_sagittal
+    return pixmaps_axial, pixmaps_coronal, pixmaps_sagittal
 
 
 def scaled_size(width, height):
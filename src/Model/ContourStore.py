@@ -0,0 +1,150 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class ROIContours(Mapping):
+    """
+    Contour data of an ROI, parsed once from the ContourData of its
+    ContourSequence. Every point of the ROI is kept in a single (N, 3)
+    float64 array, ordered so that the contours of each slice are next to
+    each other, along with the offset of the first point of each contour.
+
+    This object can be used wherever the dictionary of contours of an ROI
+    was previously used: roi_contours[slice_uid] is the list of the
+    contours on a slice (as (n, 3) views of the points array), or an
+    empty list if the ROI has no contours on the slice.
+    Example usage:
+    points, offsets = roi_contours.get_slice_points(slice_uid)
+    """
+
+    def __init__(self, points, offsets, slice_uids):
+        """
+        :param points: (N, 3) float64 array of the points of every
+            contour.
+        :param offsets: Array of the offset of the first point of each
+            contour in points, followed by N.
+        :param slice_uids: List of the SOPInstanceUID of the slice each
+            contour is on, or None if the contour does not reference a
+            slice. The contours of a slice must be next to each other.
+        """
+        self.points = points
+        self.points.setflags(write=False)
+        self.offsets = offsets
+        self.slice_uids = slice_uids
+
+        # First and last (exclusive) contour of each slice
+        self._slices = {}
+        for index, slice_uid in enumerate(slice_uids):
+            if slice_uid is None:
+                continue
+            first, _ = self._slices.get(slice_uid, (index, index))
+            self._slices[slice_uid] = (first, index + 1)
+
+    @classmethod
+    def from_contour_sequence(cls, contour_sequence):
+        """
+        Parse the ContourSequence of an ROI.
+        :param contour_sequence: ContourSequence of an item of the
+            ROIContourSequence.
+        :return: ROIContours object.
+        """
+        # Contours of each slice, in the order slices first appear
+        dict_contours = {}
+        for roi_slice in contour_sequence:
+            slice_uid = None
+            for contour_img in roi_slice.get('ContourImageSequence', []):
+                slice_uid = contour_img.ReferencedSOPInstanceUID
+            contour_data = roi_slice.get('ContourData') or []
+            dict_contours.setdefault(slice_uid, []).append(
+                np.asarray(contour_data, dtype=float).reshape(-1, 3))
+
+        contours = []
+        slice_uids = []
+        for slice_uid, slice_contours in dict_contours.items():
+            contours.extend(slice_contours)
+            slice_uids.extend([slice_uid] * len(slice_contours))
+
+        offsets = np.zeros(len(contours) + 1, dtype=np.intp)
+        np.cumsum([len(contour) for contour in contours], out=offsets[1:])
+        if contours:
+            points = np.concatenate(contours)
+        else:
+            points = np.empty((0, 3))
+        return cls(points, offsets, slice_uids)
+
+    def get_contour(self, index):
+        """
+        :param index: Index of a contour.
+        :return: (n, 3) view of the points of the contour.
+        """
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    def contours(self):
+        """
+        :return: List of every contour of the ROI, including contours
+            that do not reference a slice.
+        """
+        return [self.get_contour(i) for i in range(len(self.slice_uids))]
+
+    def get_slice_points(self, slice_uid):
+        """
+        Get the points of every contour on a slice without copying them.
+        :param slice_uid: SOPInstanceUID of the slice.
+        :return: Tuple of an (n, 3) view of the points of the contours on
+            the slice, and the offset of the first point of each contour
+            in it followed by n.
+        """
+        first, last = self._slices.get(slice_uid, (0, 0))
+        offsets = self.offsets[first:last + 1]
+        if not len(offsets):
+            return self.points[:0], np.zeros(1, dtype=np.intp)
+        return self.points[offsets[0]:offsets[-1]], offsets - offsets[0]
+
+    def __getitem__(self, slice_uid):
+        first, last = self._slices.get(slice_uid, (0, 0))
+        return [self.get_contour(i) for i in range(first, last)]
+
+    def __contains__(self, slice_uid):
+        return slice_uid in self._slices
+
+    def __iter__(self):
+        return iter(self._slices)
+
+    def __len__(self):
+        return len(self._slices)
+
+    def __eq__(self, other):
+        if not isinstance(other, ROIContours):
+            return NotImplemented
+        return self.slice_uids == other.slice_uids \
+            and np.array_equal(self.offsets, other.offsets) \
+            and np.array_equal(self.points, other.points)
+
+    __hash__ = None
+
+
+def get_contour_store(dataset_rtss):
+    """
+    Parse the contour data of every ROI of an RTSTRUCT dataset.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :return: Tuple (dict_roi, dict_numpoints) where dict_roi is a
+        dictionary of ROIContours keyed by ROI name, and dict_numpoints
+        the number of contour points of each ROI.
+    """
+    dict_id = {}
+    for elem in dataset_rtss.StructureSetROISequence:
+        dict_id[elem.ROINumber] = elem.ROIName
+
+    dict_roi = {}
+    dict_numpoints = {}
+    for roi in dataset_rtss.ROIContourSequence:
+        roi_name = dict_id[roi.ReferencedROINumber]
+        roi_contours = ROIContours.from_contour_sequence(
+            roi.get('ContourSequence', []))
+        dict_roi[roi_name] = roi_contours
+        dict_numpoints[roi_name] = sum(
+            int(roi_slice.NumberOfContourPoints)
+            for roi_slice in roi.get('ContourSequence', [])
+            if 'ContourImageSequence' in roi_slice)
+    return dict_roi, dict_numpoints
@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from pydicom import dcmread
 from pydicom.errors import InvalidDicomError
@@ -6,123 +7,198 @@ from pydicom.errors import InvalidDicomError
 from src.Model.DICOMStructure import DICOMStructure, Patient, Study, \
     Series, Image
 
+# The only tags required to place a file in the DICOMStructure. Reading
+# is stopped before the pixel data and every other tag is skipped.
+HEADER_TAGS = ["PatientID", "PatientName", "StudyInstanceUID",
+               "StudyDescription", "SeriesInstanceUID", "SeriesDescription",
+               "SOPInstanceUID", "SOPClassUID", "Modality"]
 
-def get_dicom_structure(path, interrupt_flag, progress_callback):
+
+def get_dicom_structure(path, interrupt_flag, progress_callback,
+                        max_workers=None, use_processes=False, index=None):
     """
     Searches the given directory and creates a
     Patient>Study>Series>Image structure based on the DICOM files in the
-    directory and subdirectories.
+    directory and subdirectories. Only the headers of the files are
+    read, and the files are parsed concurrently.
 
     :param path: The root directory to search from.
     :param interrupt_flag: A threading.Event() flag to indicate whether
         or not the process has been interrupted.
     :param progress_callback: A function that receives the progress of
         the current search.
+    :param max_workers: Maximum number of files read at the same time.
+        Defaults to the executor's default (based on the CPU count).
+    :param use_processes: Read files in a pool of processes instead of
+        a pool of threads. Processes avoid contention on the GIL when
+        parsing, threads have less overhead for small archives.
+    :param index: Optional DICOMIndex. Files whose size and modification
+        time match the index are not read again, and the index is
+        updated with the result of the search. The changed attribute of
+        the structure is False if no file was read or removed since the
+        directory was indexed.
     :return: Complete DICOMStructure object with associated DICOM files
     """
-
-    dicom_structure = DICOMStructure()
-
-    files_searched = 0
-
-    files_with_no_patient_id = 1
-
+    file_stats = {}
     for root, dirs, files in os.walk(path, topdown=True):
         files = [f for f in files if not f[0] == '.']
         dirs[:] = [d for d in dirs if not d[0] == '.']
+        if interrupt_flag.is_set():
+            return
+
         for file in files:
-            if file[0] == '.':
-                break
+            # Fix to program crashing when encountering DICOMDIR files
+            if file == "DICOMDIR":
+                continue
+            file_path = root + os.sep + file
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            file_stats[file_path] = (stat.st_size, stat.st_mtime_ns)
+
+    indexed = index.get_entries(path) if index is not None else {}
+
+    dicom_structure = DICOMStructure()
+    files_with_no_patient_id = 1
+    new_entries = {}
+
+    executor_class = ProcessPoolExecutor if use_processes \
+        else ThreadPoolExecutor
+    with executor_class(max_workers=max_workers) as executor:
+        # Only files that are not in the index, or have changed since
+        # they were indexed, need to be read.
+        futures = {}
+        for file_path, stat in file_stats.items():
+            entry = indexed.get(file_path)
+            if entry is None or entry[:2] != stat:
+                futures[file_path] = executor.submit(read_header, file_path)
+
+        # Results are merged in the order the files were found so that
+        # the structure is the same regardless of which file finishes
+        # parsing first.
+        for files_searched, (file_path, stat) in \
+                enumerate(file_stats.items(), 1):
             if interrupt_flag.is_set():
+                for pending in futures.values():
+                    pending.cancel()
                 return
 
-            # The progress is updated first because the total files
-            # represent ALL files inside the selected directory, not
-            # just the DICOM files. Otherwise, most files would be
-            # skipped and the progress would be inaccurate.
-            files_searched += 1
+            if file_path in futures:
+                header = futures[file_path].result()
+                new_entries[file_path] = stat + (header,)
+            else:
+                header = indexed[file_path][2]
             progress_callback.emit("%s" % files_searched)
 
-            # Fix to program crashing when encountering DICOMDIR files
-            if file == "DICOMDIR":
+            if header is None:
                 continue
 
-            file_path = root + os.sep + file
-            try:
-                dicom_file = dcmread(file_path)
-            except (InvalidDicomError, FileNotFoundError, PermissionError):
-                pass
-            else:
-                if 'PatientID' in dicom_file:
-                    patient_id = dicom_file.PatientID
-                else:
-                    patient_id = "no_id_" + str(files_with_no_patient_id)
-                    files_with_no_patient_id += 1
-
-                if "SOPInstanceUID" in dicom_file \
-                        and "SOPClassUID" in dicom_file \
-                        and "Modality" in dicom_file:
-                    new_image = Image(file_path,
-                                      dicom_file.SOPInstanceUID,
-                                      dicom_file.SOPClassUID,
-                                      dicom_file.Modality)
-                    if not dicom_structure.has_patient(patient_id):
-                        # TODO there is definitely a more efficient way of
-                        #  doing this
-                        new_series = Series(dicom_file.SeriesInstanceUID)
-                        new_series.series_description = dicom_file.get(
-                            "SeriesDescription")
-                        new_series.add_image(new_image)
-
-                        new_study = Study(dicom_file.StudyInstanceUID)
-                        new_study.study_description = dicom_file.get(
-                            "StudyDescription")
-                        new_study.add_series(new_series)
-
-                        new_patient = Patient(patient_id,
-                                              dicom_file.PatientName)
-                        new_patient.add_study(new_study)
-
-                        dicom_structure.add_patient(new_patient)
-                    else:
-                        existing_patient = dicom_structure.get_patient(
-                            dicom_file.PatientID)
-                        if not existing_patient.has_study(
-                                dicom_file.StudyInstanceUID):
-                            new_series = Series(
-                                dicom_file.SeriesInstanceUID)
-                            new_series.series_description = dicom_file.get(
-                                "SeriesDescription")
-                            new_series.add_image(new_image)
-
-                            new_study = Study(dicom_file.StudyInstanceUID)
-                            new_study.study_description = dicom_file.get(
-                                "StudyDescription")
-                            new_study.add_series(new_series)
-
-                            existing_patient.add_study(new_study)
-                        else:
-                            existing_study = existing_patient.get_study(
-                                dicom_file.StudyInstanceUID)
-                            if not existing_study.has_series(
-                                    dicom_file.SeriesInstanceUID):
-                                new_series = Series(
-                                    dicom_file.SeriesInstanceUID)
-                                new_series.series_description = dicom_file.get(
-                                    "SeriesDescription")
-                                new_series.add_image(new_image)
-
-                                existing_study.add_series(new_series)
-                            else:
-                                existing_series = existing_study.get_series(
-                                    dicom_file.SeriesInstanceUID)
-                                if not existing_series.has_image(
-                                        dicom_file.SOPInstanceUID):
-                                    existing_series.add_image(new_image)
-                                    
+            if "PatientID" not in header:
+                header = dict(header)
+                header["PatientID"] = \
+                    "no_id_" + str(files_with_no_patient_id)
+                files_with_no_patient_id += 1
+
+            add_to_structure(dicom_structure, file_path, header)
+
+    removed_entries = [file_path for file_path in indexed
+                       if file_path not in file_stats]
+    if index is not None:
+        index.update_entries(new_entries)
+        index.remove_entries(removed_entries)
+    dicom_structure.changed = \
+        index is None or bool(new_entries) or bool(removed_entries)
+
     return dicom_structure
 
 
+def get_indexed_dicom_structure(path, index):
+    """
+    Creates the Patient>Study>Series>Image structure of a directory
+    from the DICOMIndex alone, without searching the directory. The
+    result reflects the directory as of the last search, and is intended
+    to be displayed while the directory is searched again.
+    :param path: The root directory.
+    :param index: DICOMIndex to read from.
+    :return: DICOMStructure object of the indexed DICOM files.
+    """
+    dicom_structure = DICOMStructure()
+    files_with_no_patient_id = 1
+    for file_path, (size, mtime, header) in \
+            sorted(index.get_entries(path).items()):
+        if header is None:
+            continue
+
+        if "PatientID" not in header:
+            header["PatientID"] = "no_id_" + str(files_with_no_patient_id)
+            files_with_no_patient_id += 1
+
+        add_to_structure(dicom_structure, file_path, header)
+
+    return dicom_structure
+
+
+def read_header(file_path):
+    """
+    Reads the tags needed to build the DICOMStructure from a file.
+    This is a module level function so it can be used by a process pool.
+    :param file_path: Path of the file to read.
+    :return: Dictionary of the HEADER_TAGS present in the file, or None
+        if the file is not a readable DICOM file.
+    """
+    try:
+        dicom_file = dcmread(file_path, stop_before_pixels=True,
+                             specific_tags=HEADER_TAGS)
+    except (InvalidDicomError, FileNotFoundError, PermissionError):
+        return None
+
+    # Values are converted to strings so they can be pickled cheaply
+    # when returned from a worker process.
+    return {tag: str(dicom_file.get(tag)) for tag in HEADER_TAGS
+            if tag in dicom_file}
+
+
+def add_to_structure(dicom_structure, file_path, header):
+    """
+    Adds a single file to the DICOMStructure, creating the patient,
+    study and series it belongs to if they do not already exist.
+    :param dicom_structure: DICOMStructure object to add the file to.
+    :param file_path: Path of the file.
+    :param header: Dictionary of tags as returned by read_header(..)
+    """
+    if "SOPInstanceUID" not in header \
+            or "SOPClassUID" not in header \
+            or "Modality" not in header:
+        return
+
+    patient_id = header["PatientID"]
+    patient = dicom_structure.get_patient(patient_id)
+    if patient is None:
+        patient = Patient(patient_id, header.get("PatientName"))
+        dicom_structure.add_patient(patient)
+
+    study_uid = header.get("StudyInstanceUID")
+    study = patient.get_study(study_uid)
+    if study is None:
+        study = Study(study_uid)
+        study.study_description = header.get("StudyDescription")
+        patient.add_study(study)
+
+    series_uid = header.get("SeriesInstanceUID")
+    series = study.get_series(series_uid)
+    if series is None:
+        series = Series(series_uid)
+        series.series_description = header.get("SeriesDescription")
+        study.add_series(series)
+
+    if not series.has_image(header["SOPInstanceUID"]):
+        series.add_image(Image(file_path,
+                               header["SOPInstanceUID"],
+                               header["SOPClassUID"],
+                               header["Modality"]))
+
+
 if __name__ == "__main__":
     ds = get_dicom_structure("XR.Identified")
     print(ds.get_files())
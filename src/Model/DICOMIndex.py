@@ -0,0 +1,115 @@
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+from src.Model.Configuration import set_up_hidden_dir
+from src.Model.DICOMDirectorySearch import HEADER_TAGS as INDEX_TAGS
+from src.Model.Singleton import Singleton
+
+
+class DICOMIndex(metaclass=Singleton):
+    """
+    This Singleton class represents a persistent index of files found
+    when searching directories for DICOM files. For every file the index
+    stores its size and modification time along with the header tags
+    needed to build the DICOMStructure, so that subsequent searches only
+    need to read files that are new or have changed. Files that are not
+    DICOM files are indexed too, so they are not read again either.
+
+    The index is stored in a SQLite database in the hidden directory,
+    alongside the Configuration database. It is only a cache: if the
+    database can not be used, searches fall back to reading every file.
+    Example usage:
+    index = DICOMIndex()
+    """
+
+    def __init__(self, db_file='DICOMIndex.db'):
+        set_up_hidden_dir()
+        self.db_file_path = Path(
+            os.environ['USER_ONKODICOM_HIDDEN']).joinpath(db_file)
+        self.set_up_index_db()
+
+    def set_up_index_db(self):
+        """
+        Create the DICOM_INDEX table inside the SQLite database
+        """
+        columns = ",\n".join("%s TEXT" % tag for tag in INDEX_TAGS)
+        connection = sqlite3.connect(self.db_file_path)
+        connection.execute("""
+                    CREATE TABLE IF NOT EXISTS DICOM_INDEX (
+                        path TEXT PRIMARY KEY,
+                        size INTEGER,
+                        mtime INTEGER,
+                        is_dicom INTEGER,
+                        %s
+                    );
+                """ % columns)
+        connection.commit()
+        connection.close()
+
+    def get_entries(self, root):
+        """
+        Get all indexed files below a directory.
+        :param root: The directory the files are in.
+        :return: Dictionary where keys are file paths and values are
+            tuples of (size, mtime, header). header is a dictionary of
+            the tags present in the file, or None if the file is not a
+            DICOM file.
+        """
+        prefix = os.path.join(str(root), '')
+        entries = {}
+        try:
+            connection = sqlite3.connect(self.db_file_path)
+            cursor = connection.execute(
+                "SELECT path, size, mtime, is_dicom, %s FROM DICOM_INDEX "
+                "WHERE substr(path, 1, ?) = ?;" % ", ".join(INDEX_TAGS),
+                (len(prefix), prefix))
+            for row in cursor:
+                path, size, mtime, is_dicom = row[:4]
+                header = None
+                if is_dicom:
+                    header = {tag: value for tag, value
+                              in zip(INDEX_TAGS, row[4:])
+                              if value is not None}
+                entries[path] = (size, mtime, header)
+            connection.close()
+        except sqlite3.Error:
+            logging.exception("Unable to read the DICOM index")
+            return {}
+        return entries
+
+    def update_entries(self, entries):
+        """
+        Add or replace files in the index.
+        :param entries: Dictionary in the format returned by
+            get_entries(..)
+        """
+        rows = [(path, size, mtime, header is not None)
+                + tuple((header or {}).get(tag) for tag in INDEX_TAGS)
+                for path, (size, mtime, header) in entries.items()]
+        placeholders = ", ".join("?" * (4 + len(INDEX_TAGS)))
+        try:
+            connection = sqlite3.connect(self.db_file_path)
+            connection.executemany(
+                "INSERT OR REPLACE INTO DICOM_INDEX "
+                "(path, size, mtime, is_dicom, %s) VALUES (%s);"
+                % (", ".join(INDEX_TAGS), placeholders), rows)
+            connection.commit()
+            connection.close()
+        except sqlite3.Error:
+            logging.exception("Unable to update the DICOM index")
+
+    def remove_entries(self, paths):
+        """
+        Remove files that no longer exist from the index.
+        :param paths: Iterable of file paths.
+        """
+        try:
+            connection = sqlite3.connect(self.db_file_path)
+            connection.executemany("DELETE FROM DICOM_INDEX WHERE path = ?;",
+                                   [(path,) for path in paths])
+            connection.commit()
+            connection.close()
+        except sqlite3.Error:
+            logging.exception("Unable to update the DICOM index")
@@ -14,8 +14,11 @@ class DICOMStructure:
     def __init__(self):
         """
         patients: A dictionary of Patient objects.
+        changed: False if the structure was built only from indexed
+        files that have not changed since they were indexed.
         """
         self.patients = {}
+        self.changed = True
 
     def add_patient(self, patient):
         """
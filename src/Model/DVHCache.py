@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+from dicompylercore.dvh import DVH
+
+from src.constants import DVH_CACHE_SIZE
+from src.Model.Configuration import set_up_hidden_dir
+from src.Model.Singleton import Singleton
+
+# Version of the DVH calculation. Changing it invalidates every DVH in
+# the cache, and should be done whenever the calculation changes.
+DVH_CACHE_VERSION = 1
+
+
+class DVHCache(metaclass=Singleton):
+    """
+    This Singleton class represents a persistent cache of calculated
+    DVHs, so DVHs do not need to be calculated again when a patient is
+    reopened, and do not need to be written into the RT Dose file.
+
+    Each DVH is stored under a key that is a hash of everything it was
+    calculated from: the contour data of the ROI, the SOPInstanceUID of
+    the RT Dose, the thickness of the ROI and the dose limit. When the
+    contours of an ROI change, its key changes, so only that ROI has to
+    be calculated again.
+
+    The cache is stored in a SQLite database in the hidden directory,
+    alongside the Configuration database. If the database can not be
+    used, DVHs are calculated as if they were not cached. The cache
+    keeps the cache_size most recently used DVHs, and the least recently
+    used DVHs are removed whenever DVHs are added. The order in which
+    DVHs were used is kept as an increasing counter in the last_used
+    column.
+    Example usage:
+    cache = DVHCache()
+    """
+
+    def __init__(self, db_file='DVHCache.db', cache_size=DVH_CACHE_SIZE):
+        set_up_hidden_dir()
+        self.db_file_path = Path(
+            os.environ['USER_ONKODICOM_HIDDEN']).joinpath(db_file)
+        self.cache_size = cache_size
+        self.set_up_cache_db()
+
+    def set_up_cache_db(self):
+        """
+        Create the DVH_CACHE table inside the SQLite database
+        """
+        connection = sqlite3.connect(self.db_file_path)
+        connection.execute("""
+                    CREATE TABLE IF NOT EXISTS DVH_CACHE (
+                        key TEXT PRIMARY KEY,
+                        name TEXT,
+                        dvh_type TEXT,
+                        dose_units TEXT,
+                        volume_units TEXT,
+                        counts BLOB,
+                        bins BLOB,
+                        last_used INTEGER DEFAULT 0
+                    );
+                """)
+        # Databases created before DVHs were trimmed have no last_used
+        # column.
+        columns = [row[1] for row in
+                   connection.execute("PRAGMA table_info(DVH_CACHE);")]
+        if "last_used" not in columns:
+            connection.execute("ALTER TABLE DVH_CACHE "
+                               "ADD COLUMN last_used INTEGER DEFAULT 0;")
+        connection.commit()
+        connection.close()
+
+    @staticmethod
+    def get_keys(dataset_rtss, rtdose_uid, rois, dict_thickness,
+                 dose_limit=None):
+        """
+        Calculate the cache key of the DVH of each ROI.
+        :param dataset_rtss: RTSTRUCT DICOM dataset object.
+        :param rtdose_uid: SOPInstanceUID of the RT Dose.
+        :param rois: Iterable of ROI numbers (or dictionary of ROI
+            information keyed by ROI number).
+        :param dict_thickness: Dictionary where the keys are ROI numbers
+            and the values are thicknesses of the ROI.
+        :param dose_limit: Limit of dose for DVH calculation.
+        :return: Dictionary where keys are ROI numbers and values are
+            the cache keys.
+        """
+        contours = {}
+        for roi_contour in dataset_rtss.ROIContourSequence:
+            digest = hashlib.sha256()
+            for contour in roi_contour.get("ContourSequence", []):
+                digest.update(
+                    str(contour.get("ContourGeometricType")).encode())
+                digest.update(np.asarray(contour.get("ContourData", []),
+                                         dtype=float).tobytes())
+            contours[int(roi_contour.ReferencedROINumber)] = \
+                digest.hexdigest()
+
+        keys = {}
+        for roi in rois:
+            key = "%s|%s|%s|%r|%r|%s" % (
+                DVH_CACHE_VERSION, rtdose_uid, roi,
+                dict_thickness.get(roi), dose_limit,
+                contours.get(int(roi)))
+            keys[roi] = hashlib.sha256(key.encode()).hexdigest()
+        return keys
+
+    def get_dvhs(self, keys):
+        """
+        Get cached DVHs.
+        :param keys: Dictionary where keys are ROI numbers and values are
+            cache keys, as returned by get_keys(..)
+        :return: Dictionary of the cached DVHs, keyed by ROI number. ROIs
+            whose DVH is not cached are left out.
+        """
+        rois = {key: roi for roi, key in keys.items()}
+        dict_dvh = {}
+        if not rois:
+            return dict_dvh
+        try:
+            connection = sqlite3.connect(self.db_file_path)
+            placeholders = ", ".join("?" * len(rois))
+            cursor = connection.execute(
+                "SELECT key, name, dvh_type, dose_units, volume_units, "
+                "counts, bins FROM DVH_CACHE WHERE key IN (%s);"
+                % placeholders, list(rois))
+            for key, name, dvh_type, dose_units, volume_units, counts, \
+                    bins in cursor:
+                dict_dvh[rois[key]] = DVH(
+                    counts=np.frombuffer(counts, dtype=float).copy(),
+                    bins=np.frombuffer(bins, dtype=float).copy(),
+                    dvh_type=dvh_type, dose_units=dose_units,
+                    volume_units=volume_units, name=name)
+            connection.execute(
+                "UPDATE DVH_CACHE SET last_used = (SELECT IFNULL("
+                "MAX(last_used), 0) + 1 FROM DVH_CACHE) "
+                "WHERE key IN (%s);" % placeholders, list(rois))
+            connection.commit()
+            connection.close()
+        except sqlite3.Error:
+            logging.exception("Unable to read the DVH cache")
+            return {}
+        return dict_dvh
+
+    def update_dvhs(self, keys, dict_dvh):
+        """
+        Add calculated DVHs to the cache, and remove the least recently
+        used DVHs if the cache holds more than cache_size DVHs.
+        :param keys: Dictionary where keys are ROI numbers and values are
+            cache keys, as returned by get_keys(..)
+        :param dict_dvh: Dictionary of DVHs keyed by ROI number.
+        """
+        rows = [(keys[roi], dvh.name, dvh.dvh_type, dvh.dose_units,
+                 dvh.volume_units,
+                 np.asarray(dvh.counts, dtype=float).tobytes(),
+                 np.asarray(dvh.bins, dtype=float).tobytes())
+                for roi, dvh in dict_dvh.items()]
+        try:
+            connection = sqlite3.connect(self.db_file_path)
+            connection.executemany(
+                "INSERT OR REPLACE INTO DVH_CACHE (key, name, dvh_type, "
+                "dose_units, volume_units, counts, bins, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT IFNULL(MAX(last_used), "
+                "0) + 1 FROM DVH_CACHE));", rows)
+            connection.execute(
+                "DELETE FROM DVH_CACHE WHERE key NOT IN (SELECT key FROM "
+                "DVH_CACHE ORDER BY last_used DESC LIMIT ?);",
+                (self.cache_size,))
+            connection.commit()
+            connection.close()
+        except sqlite3.Error:
+            logging.exception("Unable to update the DVH cache")
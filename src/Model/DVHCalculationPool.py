@@ -0,0 +1,139 @@
+import threading
+
+from src.Model.ContourStore import ROIContours
+from src.Model.DVHEngine import DVHEngine
+from src.Model.Singleton import Singleton
+from src.Model.WorkerProcessPool import WorkerProcessPool
+
+# DVHEngine of a worker process. It holds the dose grid (and the dose
+# planes extracted from it) of the RT Dose the worker was started with.
+_worker_engine = None
+
+
+def init_worker_engine(dataset_rtdose):
+    """
+    Load the dose grid of an RT Dose when a worker process starts. The
+    engine (along with the dose planes it has extracted) is used for
+    every task the worker runs, until the pool is given another RT Dose.
+    :param dataset_rtdose: RTDOSE DICOM dataset object, or None.
+    """
+    global _worker_engine
+    _worker_engine = None
+    if dataset_rtdose is not None:
+        _worker_engine = DVHEngine(None, dataset_rtdose)
+
+
+def calc_dvh_task(roi, name, planes, thickness, dose_limit):
+    """
+    Calculate the DVH of a single ROI in a worker process.
+    :param roi: ROI number.
+    :param name: Name of the ROI.
+    :param planes: Contour planes of the ROI, as returned by
+        DVHEngine.get_planes(..)
+    :param thickness: Thickness of the ROI, or None.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :return: Tuple of (ROI number, DVH)
+    """
+    _worker_engine.roi_names[int(roi)] = name
+    _worker_engine.roi_planes[int(roi)] = planes
+    try:
+        dict_thickness = {roi: thickness} if thickness else {}
+        return roi, _worker_engine.calc_dvhs([roi], dict_thickness,
+                                             dose_limit=dose_limit)[roi]
+    finally:
+        del _worker_engine.roi_names[int(roi)]
+        del _worker_engine.roi_planes[int(roi)]
+
+
+def get_roi_tasks(dataset_rtss, rois, dict_thickness, dose_limit):
+    """
+    Generate the arguments of the calc_dvh_task of each ROI.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param rois: List of ROI numbers.
+    :param dict_thickness: Dictionary where the keys are ROI numbers
+        and the values are thicknesses of the ROI.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :return: Generator of tuples of the arguments of calc_dvh_task.
+    """
+    roi_names = {int(roi.ROINumber): roi.ROIName
+                 for roi in dataset_rtss.StructureSetROISequence}
+    contour_sequences = {
+        int(roi_contour.ReferencedROINumber):
+            roi_contour.get("ContourSequence", [])
+        for roi_contour in dataset_rtss.ROIContourSequence}
+    for roi in rois:
+        roi_contours = ROIContours.from_contour_sequence(
+            contour_sequences.get(int(roi), []))
+        yield roi, roi_names.get(int(roi)), \
+            DVHEngine.get_planes(roi_contours), dict_thickness.get(roi), \
+            dose_limit
+
+
+class DVHCalculationPool(metaclass=Singleton):
+    """
+    This Singleton class calculates DVHs on a persistent
+    WorkerProcessPool, one task per ROI. The dose grid of the RT Dose is
+    sent to each worker once, when it starts, and the workers are reused
+    by every DVH calculation of that RT Dose. Only the contours of its ROI
+    are sent along with each task, so changes to the structure set do
+    not restart the workers. The workers are restarted with the new dose
+    grid when DVHs of another RT Dose are calculated.
+    Example usage:
+    raw_dvh = DVHCalculationPool().calc_dvhs(rtss, rtdose, rois, {})
+    """
+
+    def __init__(self, max_workers=None):
+        """
+        :param max_workers: Maximum number of worker processes. Defaults
+            to the CPU count.
+        """
+        self.pool = WorkerProcessPool(init_worker_engine, (None,),
+                                      max_workers)
+        self.rtdose_uid = None
+        # Calculations are run one at a time, as each of them uses every
+        # worker, and the workers of a calculation must not be restarted
+        # for another RT Dose while it is running.
+        self.lock = threading.Lock()
+
+    def calc_dvhs(self, dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                  interrupt_flag=None, dose_limit=None):
+        """
+        Calculate the DVHs of the given ROIs on worker processes.
+        :param dataset_rtss: RTSTRUCT DICOM dataset object.
+        :param dataset_rtdose: RTDOSE DICOM dataset object.
+        :param rois: Iterable of ROI numbers (or dictionary of ROI
+            information keyed by ROI number).
+        :param dict_thickness: Dictionary where the keys are ROI numbers
+            and the values are thicknesses of the ROI.
+        :param interrupt_flag: A threading.Event() object that tells the
+            function to stop calculation.
+        :param dose_limit: Limit of dose for DVH calculation.
+        :return: Dictionary of the DVHs of the ROIs, or None if the
+            calculation was interrupted.
+        """
+        roi_list = list(rois)
+        with self.lock:
+            if dataset_rtdose.SOPInstanceUID != self.rtdose_uid:
+                self.pool.set_initargs((dataset_rtdose,))
+                self.rtdose_uid = dataset_rtdose.SOPInstanceUID
+
+            results = self.pool.run_tasks(
+                calc_dvh_task,
+                get_roi_tasks(dataset_rtss, roi_list, dict_thickness,
+                              dose_limit),
+                len(roi_list), interrupt_flag=interrupt_flag)
+        if results is None:
+            return None
+
+        # Return the DVHs in the order of the ROIs
+        return dict(results)
+
+    def shutdown(self):
+        """
+        Shut down the worker processes, and release the RT Dose they were
+        started with. The workers are started again by the next
+        calculation.
+        """
+        with self.lock:
+            self.pool.set_initargs((None,))
+            self.rtdose_uid = None
@@ -0,0 +1,260 @@
+import collections
+
+import numpy as np
+from dicompylercore.dvh import DVH
+from matplotlib.path import Path
+
+from src.Model.ContourStore import ROIContours
+
+
+class DVHEngine:
+    """
+    Calculates DVHs directly from an RTSTRUCT and RTDOSE dataset. The dose
+    grid is read once and shared by every ROI. Each ROI's contours are
+    rasterised onto the dose grid once. The histograms of every ROI are
+    then built together with a single bincount over the 1 cGy dose bins.
+
+    The algorithm follows dicompylercore.dvhcalc.get_dvh (without
+    interpolation), and returns the same cumulative DVH objects:
+    - contour points are tested against the centres of the dose grid
+      voxels on the plane of the contour
+    - contours on the same plane are combined with XOR to remove holes
+    - dose planes between frames are linearly interpolated
+
+    Contour planes outside the dose grid do not contribute to the DVH.
+    Example usage:
+    engine = DVHEngine(dataset_rtss, dataset_rtdose)
+    raw_dvh = engine.calc_dvhs(rois, dict_thickness)
+    """
+
+    def __init__(self, dataset_rtss, dataset_rtdose):
+        """
+        :param dataset_rtss: RTSTRUCT DICOM dataset object, or None to
+            add the names and contour planes of ROIs to roi_names and
+            roi_planes later.
+        :param dataset_rtdose: RTDOSE DICOM dataset object.
+        """
+        self.dataset_rtdose = dataset_rtdose
+
+        # Names and contour planes of each ROI, keyed by ROI number
+        self.roi_names = {}
+        self.roi_planes = {}
+        if dataset_rtss is not None:
+            for roi in dataset_rtss.StructureSetROISequence:
+                self.roi_names[int(roi.ROINumber)] = roi.ROIName
+            for roi_contour in dataset_rtss.ROIContourSequence:
+                roi_contours = ROIContours.from_contour_sequence(
+                    roi_contour.get("ContourSequence", []))
+                self.roi_planes[int(roi_contour.ReferencedROINumber)] = \
+                    self.get_planes(roi_contours)
+
+        # Dose grid
+        self.dose_volume = None
+        self.dose_planes = np.array([])
+        self.dose_scaling = 1.0
+        self.max_dose = 0
+        self.voxel_area = 0
+        self.lut_x = np.array([])
+        self.lut_y = np.array([])
+        if "PixelData" in dataset_rtdose:
+            self.dose_volume = dataset_rtdose.pixel_array
+            if self.dose_volume.ndim == 2:
+                self.dose_volume = self.dose_volume[np.newaxis]
+            self.dose_scaling = float(dataset_rtdose.DoseGridScaling)
+            self.max_dose = int(float(self.dose_volume.max())
+                                * self.dose_scaling * 100)
+            spacing = dataset_rtdose.PixelSpacing
+            self.voxel_area = spacing[0] * spacing[1]
+
+            orientation = dataset_rtdose.ImageOrientationPatient
+            position = dataset_rtdose.ImagePositionPatient
+            self.lut_x = np.arange(dataset_rtdose.Columns, dtype=float) \
+                * (orientation[0] * spacing[0]) + position[0]
+            self.lut_y = np.arange(dataset_rtdose.Rows, dtype=float) \
+                * (orientation[4] * spacing[1]) + position[1]
+            if "GridFrameOffsetVector" in dataset_rtdose:
+                self.dose_planes = orientation[0] \
+                    * np.array(dataset_rtdose.GridFrameOffsetVector) \
+                    + position[2]
+
+        # Dose planes (in cGy) already extracted, keyed by z
+        self._dose_plane_cache = {}
+
+    @staticmethod
+    def get_planes(roi_contours):
+        """
+        Group the contours of an ROI by plane.
+        :param roi_contours: ROIContours of the ROI.
+        :return: Dictionary where keys are the z coordinates of the planes
+            (rounded to 0.01 mm), and values are lists of (N, 2) views of
+            the x and y coordinates of each contour on the plane.
+        """
+        planes = collections.defaultdict(list)
+        for points in roi_contours.contours():
+            if not len(points):
+                continue
+            z = float('%.2f' % points[0, 2])
+            planes[z].append(points[:, :2])
+        return dict(planes)
+
+    @staticmethod
+    def calculate_plane_thickness(planes):
+        """
+        :param planes: Contour planes of an ROI as returned by
+            get_planes(..)
+        :return: The smallest distance between two planes, or 0 if the
+            ROI only has one plane.
+        """
+        if len(planes) < 2:
+            return 0
+        return float(np.min(np.diff(sorted(planes))))
+
+    def get_dose_plane(self, z):
+        """
+        Get the dose on a plane, interpolating between the two closest
+        frames if there is no frame on the plane.
+        :param z: Position of the plane in mm.
+        :return: 2D numpy array of the dose in cGy, or None if the plane
+            is outside the dose grid.
+        """
+        if z in self._dose_plane_cache:
+            return self._dose_plane_cache[z]
+
+        dose_plane = None
+        if len(self.dose_planes):
+            distances = np.fabs(self.dose_planes - z)
+            if np.amin(distances) < 0.5:
+                dose_plane = self.dose_volume[np.argmin(distances)]
+            elif np.amin(self.dose_planes) <= z <= np.amax(self.dose_planes):
+                upper = np.argmin(distances)
+                lower_distances = distances.copy()
+                lower_distances[upper] = np.amax(distances)
+                lower = np.argmin(lower_distances)
+                fz = (z - self.dose_planes[lower]) \
+                    / (self.dose_planes[upper] - self.dose_planes[lower])
+                dose_plane = fz * self.dose_volume[upper] \
+                    + (1.0 - fz) * self.dose_volume[lower]
+        if dose_plane is not None:
+            dose_plane = dose_plane * self.dose_scaling * 100
+
+        self._dose_plane_cache[z] = dose_plane
+        return dose_plane
+
+    def get_contour_mask(self, contour):
+        """
+        Rasterise a contour onto the dose grid.
+        :param contour: (N, 2) array of the x and y coordinates of the
+            contour.
+        :return: 2D boolean numpy array, True for the dose grid voxels
+            whose centres are inside the contour.
+        """
+        mask = np.zeros((len(self.lut_y), len(self.lut_x)), dtype=bool)
+        # Only voxels within the bounding box of the contour can be
+        # inside it.
+        columns = np.flatnonzero((self.lut_x >= contour[:, 0].min())
+                                 & (self.lut_x <= contour[:, 0].max()))
+        rows = np.flatnonzero((self.lut_y >= contour[:, 1].min())
+                              & (self.lut_y <= contour[:, 1].max()))
+        if not len(columns) or not len(rows):
+            return mask
+
+        x, y = np.meshgrid(self.lut_x[columns], self.lut_y[rows])
+        points = np.column_stack((x.ravel(), y.ravel()))
+        inside = Path(contour).contains_points(points)
+        mask[np.ix_(rows, columns)] = inside.reshape(len(rows), len(columns))
+        return mask
+
+    def get_roi_doses(self, roi):
+        """
+        Get the dose of every dose grid voxel inside an ROI.
+        :param roi: ROI number.
+        :return: 1D numpy array of doses in cGy.
+        """
+        doses = []
+        for z, contours in self.roi_planes.get(roi, {}).items():
+            dose_plane = self.get_dose_plane(z)
+            if dose_plane is None:
+                continue
+            mask = np.zeros(dose_plane.shape, dtype=bool)
+            for contour in contours:
+                mask ^= self.get_contour_mask(contour)
+            doses.append(dose_plane[mask])
+        if not doses:
+            return np.array([])
+        return np.concatenate(doses)
+
+    def calc_dvhs(self, rois, dict_thickness, interrupt_flag=None,
+                  dose_limit=None):
+        """
+        Calculate the DVHs of the given ROIs.
+        :param rois: Iterable of ROI numbers (or dictionary of ROI
+            information keyed by ROI number).
+        :param dict_thickness: Dictionary where the keys are ROI numbers
+            and the values are thicknesses of the ROI.
+        :param interrupt_flag: A threading.Event() object that tells the
+            function to stop calculation.
+        :param dose_limit: Limit of dose (in cGy) for DVH calculation.
+        :return: Dictionary of the cumulative DVHs of the ROIs, or None if
+            the calculation was interrupted.
+        """
+        roi_list = list(rois)
+        if not roi_list:
+            return {}
+        max_dose = self.max_dose
+        if isinstance(dose_limit, int) and dose_limit < max_dose:
+            max_dose = dose_limit
+
+        # Rasterise every ROI, and label each voxel with the histogram
+        # bin of its ROI and dose.
+        bins = []
+        for index, roi in enumerate(roi_list):
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                return None
+            doses = self.get_roi_doses(int(roi))
+            # Voxels are binned in the same way as np.histogram over
+            # (0, max_dose) with bins of 1 cGy.
+            doses = doses[(doses >= 0) & (doses <= max_dose)]
+            bins.append(index * max_dose
+                        + np.minimum(doses.astype(np.intp), max_dose - 1))
+
+        if max_dose > 0:
+            counts = np.bincount(np.concatenate(bins),
+                                 minlength=len(roi_list) * max_dose)
+            counts = counts.reshape(len(roi_list), max_dose)
+        else:
+            counts = np.zeros((len(roi_list), 0), dtype=np.intp)
+
+        dict_dvh = {}
+        for index, roi in enumerate(roi_list):
+            thickness = dict_thickness.get(roi)
+            if not thickness:
+                thickness = self.calculate_plane_thickness(
+                    self.roi_planes.get(int(roi), {}))
+            dict_dvh[roi] = self.create_dvh(
+                int(roi), counts[index], self.voxel_area * thickness)
+        return dict_dvh
+
+    def create_dvh(self, roi, counts, voxel_volume):
+        """
+        Create the cumulative DVH of an ROI from its differential voxel
+        counts.
+        :param roi: ROI number.
+        :param counts: Number of voxels of the ROI in each 1 cGy bin.
+        :param voxel_volume: Volume of a voxel in mm^3.
+        :return: Cumulative DVH object.
+        """
+        total = counts.sum()
+        histogram = np.array([0])
+        if total > 0 and voxel_volume > 0:
+            # Volume units are given in cm^3
+            volume = total * voxel_volume / 1000
+            histogram = np.trim_zeros(counts * volume / total, trim='b')
+        if histogram.size == 1:
+            dose_bins = np.arange(0, 2)
+        else:
+            dose_bins = np.arange(0, histogram.size + 1) / 100
+        return DVH(counts=histogram,
+                   bins=dose_bins,
+                   dvh_type='differential',
+                   dose_units='Gy',
+                   name=self.roi_names.get(roi)).cumulative
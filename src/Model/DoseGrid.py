@@ -0,0 +1,119 @@
+"""
+Dose grid functions used by the isodose display, ISO2ROI and the worker
+processes that find isodose boundaries. This module only depends on
+numpy and scikit-image, so worker processes do not import the rest of
+the application when they start.
+"""
+
+
+import numpy as np
+from skimage import measure
+
+# Dose volume and frame positions of a worker process, as given to
+# init_worker_dose(..)
+_worker_dose_volume = None
+_worker_dose_planes = None
+
+
+def get_dose_planes(rtd):
+    """
+    Return the positions of the frames of the dose grid.
+
+    :param rtd:     Data from RTDose file
+    :return:        Position (mm) of each frame as a numpy array, or None
+                    if the RTDose has no GridFrameOffsetVector
+    """
+    if 'GridFrameOffsetVector' not in rtd:
+        return None
+    return rtd.ImageOrientationPatient[0] \
+        * np.array(rtd.GridFrameOffsetVector) \
+        + rtd.ImagePositionPatient[2]
+
+
+def interpolate_dose_grid(dose_volume, planes, z):
+    """
+    Return the 2d dose grid for the given slice position (mm), given the
+    positions of the frames of the dose grid.
+
+    :param dose_volume: Pixel array of the RTDose
+    :param planes:  Frame positions as returned by get_dose_planes(..)
+    :param z:       Position of slice in mm
+    :return:        Dose grid as a 2d numpy array
+    """
+    z = float(z)
+    distances = np.fabs(planes - z)
+
+    if np.amin(distances) < 0.5:
+        frame = np.argmin(distances)
+        return dose_volume[frame]
+
+    if (z > np.amin(planes)) or (z < np.amax(planes)):
+        u_min = distances
+        l_min = u_min.copy()
+        ub = np.argmin(u_min)
+
+        l_min[ub] = np.amax(u_min)
+        lb = np.argmin(l_min)
+
+        # Fractional distance from bottom to top
+        # Plane is at upper plane if 1, lower plane if 0
+        fz = (z - planes[lb]) / (planes[ub] - planes[lb])
+
+        plane = fz * dose_volume[ub] \
+                + (1.0 - fz) * dose_volume[lb]
+
+        return plane
+
+    return np.array([])
+
+
+def find_isodose_boundaries(grids, thresholds):
+    """
+    Find the isodose boundaries of slices. The dose grid of each slice
+    is shared by every isodose level.
+
+    :param grids:       List of (slice index, dose grid of the slice)
+    :param thresholds:  Dictionary of the dose grid value of each
+                        isodose level
+    :return:            Dictionary keyed by slice index of dictionaries
+                        of the contours of each isodose level
+    """
+    boundaries = {}
+    for slice_id, grid in grids:
+        boundaries[slice_id] = {}
+        for item, threshold in thresholds.items():
+            if grid is not None and grid.size:
+                boundaries[slice_id][item] = \
+                    measure.find_contours(grid, threshold)
+            else:
+                boundaries[slice_id][item] = []
+    return boundaries
+
+
+def init_worker_dose(dose_volume, planes):
+    """
+    Load the dose volume of an RTDose when a worker process starts, so
+    that it is sent to the worker once rather than with every task.
+
+    :param dose_volume: Pixel array of the RTDose
+    :param planes:      Frame positions as returned by get_dose_planes(..)
+    """
+    global _worker_dose_volume, _worker_dose_planes
+    _worker_dose_volume = dose_volume
+    _worker_dose_planes = planes
+
+
+def find_worker_isodose_boundaries(slices, thresholds):
+    """
+    Find the isodose boundaries of slices in a worker process, from the
+    dose volume given to init_worker_dose(..)
+
+    :param slices:      List of (slice index, slice position in mm)
+    :param thresholds:  Dictionary of the dose grid value of each
+                        isodose level
+    :return:            See find_isodose_boundaries(..)
+    """
+    grids = [(slice_id, interpolate_dose_grid(_worker_dose_volume,
+                                              _worker_dose_planes, z))
+             for slice_id, z in slices]
+    return find_isodose_boundaries(grids, thresholds)
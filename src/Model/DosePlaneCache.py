@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+from src.constants import DOSE_PLANE_CACHE_SIZE
+from src.Model.DoseGrid import get_dose_planes, interpolate_dose_grid
+from src.Model.PatientDictContainer import PatientDictContainer
+
+
+class DosePlaneCache:
+    """
+    Cache of the dose grids of image slices, shared by everything that
+    displays or contours isodoses (the axial view, ISO2ROI, etc.).
+
+    The frame positions of the dose grid are calculated once. Dose grids
+    are calculated the first time a slice position is requested, and the
+    interpolated ones are kept until the cache is full, evicting the
+    least recently used first. Dose grids on a frame are views of the
+    dose volume, so they are not counted towards the size of the cache.
+    Cached dose grids are read-only. The cache can be used from worker
+    threads (e.g. by ISO2ROI) while the GUI thread uses it.
+    Example usage:
+    grid = get_dose_plane_cache().get_dose_grid(z)
+    """
+
+    def __init__(self, dataset_rtdose, cache_size=DOSE_PLANE_CACHE_SIZE):
+        """
+        :param dataset_rtdose: RTDOSE DICOM dataset object.
+        :param cache_size: Maximum number of bytes of interpolated dose
+            grids to keep.
+        """
+        self.dataset_rtdose = dataset_rtdose
+        self.cache_size = cache_size
+        self.planes = get_dose_planes(dataset_rtdose)
+        self._grids = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_dose_grid(self, z):
+        """
+        Get the dose grid of a slice position, with the same values as
+        Isodose.get_dose_grid(..)
+        :param z: Position of the slice in mm.
+        :return: Dose grid as a 2d numpy array, or None if the RTDose has
+            no GridFrameOffsetVector.
+        """
+        if self.planes is None:
+            return None
+
+        # Positions of the same slice may differ by rounding errors
+        key = round(float(z), 2)
+        with self._lock:
+            if key in self._grids:
+                self._grids.move_to_end(key)
+                return self._grids[key][0]
+
+        grid = interpolate_dose_grid(self.dataset_rtdose.pixel_array,
+                                     self.planes, z)
+        size = 0 if grid.base is not None else grid.nbytes
+        grid.setflags(write=False)
+
+        with self._lock:
+            if key not in self._grids:
+                self._grids[key] = (grid, size)
+                self._size += size
+            while self._size > self.cache_size and len(self._grids) > 1:
+                _, (_, evicted_size) = self._grids.popitem(last=False)
+                self._size -= evicted_size
+        return grid
+
+    def clear(self):
+        """
+        Remove every cached dose grid.
+        """
+        with self._lock:
+            self._grids.clear()
+            self._size = 0
+
+
+def get_dose_plane_cache(dict_container=None):
+    """
+    Get the dose plane cache of the RTDose of a patient, creating it if
+    it does not exist or if the RTDose has changed.
+    :param dict_container: PatientDictContainer or MovingDictContainer
+        holding the RTDose. Defaults to the PatientDictContainer.
+    :return: DosePlaneCache object.
+    """
+    if dict_container is None:
+        dict_container = PatientDictContainer()
+    dataset_rtdose = dict_container.dataset['rtdose']
+    cache = dict_container.get("dose_plane_cache")
+    if cache is None or cache.dataset_rtdose is not dataset_rtdose:
+        cache = DosePlaneCache(dataset_rtdose)
+        dict_container.set("dose_plane_cache", cache)
+    return cache
@@ -1,8 +1,9 @@
-from skimage import measure
+import numpy as np
 
 from src.Model import ImageLoading
 from src.Model import ROI
-from src.Model.Isodose import get_dose_grid
+from src.Model.DosePlaneCache import get_dose_plane_cache
+from src.Model.Isodose import calculate_isodose_boundaries
 from src.Model.PatientDictContainer import PatientDictContainer
 
 
@@ -35,13 +36,8 @@ class ISO2ROI:
 
         # Calculate dose boundaries
         progress_callback.emit(("Calculating Boundaries", 50))
-        boundaries = self.calculate_isodose_boundaries(isodose_levels)
-
-        # Return if boundaries could not be calculated
-        if not boundaries:
-            # TODO: convert print to logging
-            print("Boundaries could not be calculated.")
-            return
+        boundaries = self.calculate_isodose_boundaries(
+            isodose_levels, interrupt_flag, progress_callback)
 
         # Stop loading
         if interrupt_flag.is_set():
@@ -49,6 +45,12 @@ class ISO2ROI:
             print("Stopped ISO2ROI")
             return False
 
+        # Return if boundaries could not be calculated
+        if not boundaries:
+            # TODO: convert print to logging
+            print("Boundaries could not be calculated.")
+            return
+
         progress_callback.emit(("Generating ROIs", 75))
         self.generate_roi(boundaries, progress_callback)
         progress_callback.emit(("Reloading Window. Please Wait...", 95))
@@ -71,11 +73,16 @@ class ISO2ROI:
                                             int(items[0])]
         return isodose_levels
 
-    def calculate_isodose_boundaries(self, isodose_levels):
+    def calculate_isodose_boundaries(self, isodose_levels,
+                                     interrupt_flag=None,
+                                     progress_callback=None):
         """
         Calculates isodose boundaries for each isodose level.
+        :param interrupt_flag: interrupt flag to stop process
+        :param progress_callback: signal that receives the current
+                                  progress of the loading.
         :return: coutours, a list containing the countours for each
-                 isodose level.
+                 isodose level, or None if they could not be calculated.
         """
         # Initialise variables needed to find isodose levels
         patient_dict_container = PatientDictContainer()
@@ -90,29 +97,40 @@ class ISO2ROI:
         if not rt_dose_dose:
             return None
 
-        contours = {}
+        # Dose grid value of each isodose level
+        thresholds = {}
+        for item in isodose_levels:
+            if isodose_levels[item][0]:
+                thresholds[item] = isodose_levels[item][1] / \
+                                   (rt_plan_dose.DoseGridScaling * 100)
+            else:
+                thresholds[item] = isodose_levels[item][1] * \
+                                   rt_dose_dose / \
+                                   (rt_plan_dose.DoseGridScaling * 10000)
 
+        contours = {}
         for item in isodose_levels:
-            # Calculate boundaries for each isodose level for each slice
-            contours[item] = []
-            for slider_id in range(slider_min, slider_max):
-                contours[item].append([])
-                temp_ds = patient_dict_container.dataset[slider_id]
-                z = temp_ds.ImagePositionPatient[2]
-                grid = get_dose_grid(rt_plan_dose, float(z))
-
-                if not (grid == []):
-                    if isodose_levels[item][0]:
-                        dose_level = isodose_levels[item][1] / \
-                                     (rt_plan_dose.DoseGridScaling * 100)
-                        contours[item][slider_id] =\
-                            (measure.find_contours(grid, dose_level))
-                    else:
-                        dose_level = isodose_levels[item][1] * \
-                                     rt_dose_dose / \
-                                     (rt_plan_dose.DoseGridScaling * 10000)
-                        contours[item][slider_id] = \
-                            (measure.find_contours(grid, dose_level))
+            contours[item] = [[] for _ in range(slider_min, slider_max)]
+
+        # The dose grids are shared with the axial view
+        dose_plane_cache = get_dose_plane_cache(patient_dict_container)
+        if dose_plane_cache.planes is None:
+            return contours
+
+        # Calculate boundaries for each isodose level for each slice
+        slices = []
+        for slider_id in range(slider_min, slider_max):
+            temp_ds = patient_dict_container.dataset[slider_id]
+            slices.append((slider_id, float(temp_ds.ImagePositionPatient[2])))
+        boundaries = calculate_isodose_boundaries(
+            dose_plane_cache, slices, thresholds, interrupt_flag,
+            progress_callback)
+        if boundaries is None:
+            return None
+
+        for slider_id, slice_boundaries in boundaries.items():
+            for item, boundary in slice_boundaries.items():
+                contours[item][slider_id] = boundary
 
         # Return list of contours for each isodose level for each slice
         return contours
@@ -155,6 +173,7 @@ class ISO2ROI:
 
             # Calculate isodose ROI for each slice, skip if slice has no
             # contour data
+            roi_list = []
             for i in range(slider_min, slider_max):
                 if not len(contours[item][i]):
                     continue
@@ -168,36 +187,41 @@ class ISO2ROI:
                 dose_pixluts = patient_dict_container.get("dose_pixluts")
                 dose_pixluts = dose_pixluts[curr_slice_uid]
 
-                # Loop through each contour for each slice.
-                # Convert the pixel points to RCS points, append z value
-                single_array = []
-
-                # Loop through each contour
-                for j in range(len(contours[item][i])):
-                    single_array.append([])
-                    # Loop through every second point in the contour
-                    for point in contours[item][i][j][::2]:
-                        # Transform into dose pixel
-                        dose_pixels = [dose_pixluts[0][int(point[1])],
-                                       dose_pixluts[1][int(point[0])]]
-                        # Transform into RCS pixel
-                        rcs_pixels = ROI.pixel_to_rcs(pixlut,
-                                                      round(dose_pixels[0]),
-                                                      round(dose_pixels[1]))
-                        # Append point coordinates to the single array
-                        single_array[j].append(rcs_pixels[0])
-                        single_array[j].append(rcs_pixels[1])
-                        single_array[j].append(z_coord)
-
-                # Create the ROI(s)
-                for array in single_array:
-                    rtss = ROI.create_roi(dataset_rtss, item,
-                                          [{'coords': array, 'ds': dataset}],
-                                          "DOSE_REGION")
-
-                    # Save the updated rtss
-                    patient_dict_container.set("dataset_rtss", rtss)
-                    patient_dict_container.set("rois",
-                                               ImageLoading.get_roi_info(rtss))
+                # Convert the pixel points of each contour to RCS points
+                for contour in contours[item][i]:
+                    roi_list.append({
+                        'coords': self.calculate_contour_data(
+                            contour, dose_pixluts, pixlut, z_coord),
+                        'ds': dataset})
+
+            # Create the ROI from the contours of every slice at once
+            dataset_rtss = ROI.create_roi_from_contours(
+                dataset_rtss, item, roi_list, "DOSE_REGION")
+
+            # Save the updated rtss
+            patient_dict_container.set("dataset_rtss", dataset_rtss)
+            patient_dict_container.set(
+                "rois", ImageLoading.get_roi_info(dataset_rtss))
 
         progress_callback.emit(("Writing to RT Structure Set", 85))
+
+    @staticmethod
+    def calculate_contour_data(contour, dose_pixluts, pixlut, z_coord):
+        """
+        Convert an isodose contour into the ContourData of an ROI.
+        :param contour: (N, 2) array of the (row, column) points of the
+                        contour on the dose grid.
+        :param dose_pixluts: dose pixluts of the slice of the contour.
+        :param pixlut: pixluts of the slice of the contour.
+        :param z_coord: position of the slice.
+        :return: list of the x, y and z coordinates of every second
+                 point of the contour.
+        """
+        points = contour[::2].astype(int)
+        # Transform into dose pixels, then into RCS points
+        dose_x = np.round(np.asarray(dose_pixluts[0])[points[:, 1]])
+        dose_y = np.round(np.asarray(dose_pixluts[1])[points[:, 0]])
+        rcs_x = np.asarray(pixlut[0])[dose_x.astype(int) - 1]
+        rcs_y = np.asarray(pixlut[1])[dose_y.astype(int) - 1]
+        z = np.full(len(points), float(z_coord))
+        return np.column_stack((rcs_x, rcs_y, z)).ravel().tolist()
@@ -2,18 +2,23 @@ from PySide6 import QtCore, QtGui
 
 import numpy as np
 import SimpleITK as sitk
+import colorsys
 import datetime
 import pydicom
 import os
 
 from copy import deepcopy
+from functools import lru_cache
+from pydicom.errors import InvalidDicomError
 from pydicom.tag import Tag
 
+from src.constants import FUSION_COLOUR_ROTATION, REGISTRATION_ITERATIONS, \
+    REGISTRATION_SHRINK_FACTORS, REGISTRATION_SMOOTH_SIGMAS
+from src.Model.CalculateImages import LazyPixmaps
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.MovingDictContainer import MovingDictContainer
-from platipy.imaging.registration.linear import linear_registration
-from platipy.imaging.visualisation.utils import generate_comparison_colormix, \
-    return_slice
+from src.Model.TransformCache import TransformCache
+from src.Model.Windowing import apply_window
 
 
 # Utility Functions
@@ -305,177 +310,409 @@ def write_transform_to_dcm(affine_matrix):
     spatial_registration.save_as(filepath)
 
 
-def create_fused_model(old_images, new_image):
+def read_transform_from_dcm(filepath, fixed_dataset, moving_datasets):
     """
-    Performs the image fusion and stores fusion information
+    Read the transform of a REG file written by write_transform_to_dcm(..),
+    if it registers the moving series onto the fixed series.
+    :param filepath: Path of the REG file.
+    :param fixed_dataset: A dataset of the fixed series.
+    :param moving_datasets: Dictionary of the datasets of the moving
+        series.
+    :return: 4x4 numpy array of the transform, or None if the file does
+        not exist or is not a registration of the two series.
+    """
+    if not os.path.isfile(filepath):
+        return None
+
+    moving_uids = set()
+    for x in range(len(moving_datasets.keys())):
+        try:
+            moving_uids.add(moving_datasets[x].SOPInstanceUID)
+        except (KeyError, AttributeError):
+            continue
+
+    try:
+        spatial_registration = pydicom.dcmread(filepath)
+        if spatial_registration.get("Modality") != "REG":
+            return None
+        registration_sequence = spatial_registration.RegistrationSequence[0]
+        if (registration_sequence.get("FrameOfReferenceUID") or None) \
+                != (fixed_dataset.get("FrameOfReferenceUID") or None):
+            return None
+        referenced_uids = {
+            item.ReferencedSOPInstanceUID
+            for item in registration_sequence.ReferencedImageSequence}
+        if referenced_uids != moving_uids:
+            return None
+        matrix = registration_sequence.MatrixRegistrationSequence[0] \
+            .MatrixSequence[0].FrameOfReferenceTransformationMatrix
+        return np.array(matrix, dtype=float).reshape(4, 4)
+    except (InvalidDicomError, AttributeError, IndexError, ValueError):
+        return None
+
+
+def convert_matrix_to_affine_transform(affine_matrix):
+    """
+    Conversion of a 4x4 transformation matrix, as returned by
+    convert_combined_affine_to_matrix(..), back to an AffineTransform.
+    """
+    affine_matrix = np.asarray(affine_matrix, dtype=float)
+    affine_transform = sitk.AffineTransform(3)
+    affine_transform.SetMatrix(affine_matrix[0:3, 0:3].flatten().tolist())
+    affine_transform.SetTranslation(affine_matrix[0:3, 3].tolist())
+    return affine_transform
+
+
+def create_fused_model(old_images, new_image, interrupt_flag=None,
+                       progress_callback=None):
+    """
+    Performs the image fusion and stores fusion information. If the two
+    series have been registered before, the transform is taken from the
+    TransformCache or from the transform.dcm of the patient instead of
+    registering them again.
     :param old_images: Image set from Primary scan
     :param new_image: Image set from secondary (moving) scan
+    :param interrupt_flag: A threading.Event() object that stops the
+        registration when set.
+    :param progress_callback: A signal that receives the progress of the
+        registration.
+    :return: True if the images were registered, False if the
+        registration was interrupted.
     """
     patient_dict_container = PatientDictContainer()
-    fused_image = register_images(old_images, new_image)
-    patient_dict_container.set("fused_images", fused_image)
+    moving_dict_container = MovingDictContainer()
+    patient_dataset = patient_dict_container.dataset[0]
+    filepath = os.path.join(patient_dict_container.path, 'transform.dcm')
+
+    transform_cache = TransformCache()
+    key = TransformCache.get_key(
+        patient_dataset.SeriesInstanceUID,
+        moving_dict_container.dataset[0].SeriesInstanceUID,
+        REGISTRATION_SHRINK_FACTORS, REGISTRATION_SMOOTH_SIGMAS,
+        REGISTRATION_ITERATIONS)
+    affine_matrix = transform_cache.get_transform(key)
+    if affine_matrix is None:
+        affine_matrix = read_transform_from_dcm(
+            filepath, patient_dataset, moving_dict_container.dataset)
+        if affine_matrix is not None:
+            transform_cache.update_transform(key, affine_matrix)
+
+    if affine_matrix is not None:
+        if progress_callback is not None:
+            progress_callback.emit(("Applying saved registration...", 90))
+        tfm = convert_matrix_to_affine_transform(affine_matrix)
+        fused_images = (resample_moving_image(old_images, new_image, tfm),
+                        tfm)
+        patient_dict_container.set("fused_images", fused_images)
+        if not os.path.isfile(filepath):
+            write_transform_to_dcm(affine_matrix)
+        return True
+
+    fused_images = register_images(old_images, new_image,
+                                   interrupt_flag=interrupt_flag,
+                                   progress_callback=progress_callback)
+    if fused_images is None:
+        return False
+    patient_dict_container.set("fused_images", fused_images)
 
     # Throw Transform Object into function to write dcm file
-    combined_affine = convert_composite_to_affine_transform(fused_image[1])
-    # test = check_affine_conversion(fused_image[1], combined_affine)
+    combined_affine = convert_composite_to_affine_transform(fused_images[1])
+    # test = check_affine_conversion(fused_images[1], combined_affine)
     affine_matrix = convert_combined_affine_to_matrix(combined_affine)
+    transform_cache.update_transform(key, affine_matrix)
     write_transform_to_dcm(affine_matrix)
+    return True
+
+
+def create_sitk_image(volume, datasets):
+    """
+    Create a SimpleITK image from an image volume that has already been
+    loaded, rather than reading the series from disk again.
+    :param volume: 3D numpy array of the image volume, as returned by
+        get_volume(..), in the order (slices, rows, columns)
+    :param datasets: Dictionary of the datasets of the series, where
+        dataset[i] is the dataset of volume[i]
+    :return: sitk.Image with the origin, spacing and direction of the
+        series
+    """
+    first_slice = datasets[0]
+    row_cosine = np.array(first_slice.ImageOrientationPatient[:3],
+                          dtype=float)
+    column_cosine = np.array(first_slice.ImageOrientationPatient[3:],
+                             dtype=float)
+    normal = np.cross(row_cosine, column_cosine)
+
+    if len(volume) > 1:
+        # Slices are ordered as in the volume, which may be against the
+        # normal of the image orientation.
+        slice_spacing = np.dot(
+            np.array(datasets[len(volume) - 1].ImagePositionPatient,
+                     dtype=float)
+            - np.array(first_slice.ImagePositionPatient, dtype=float),
+            normal) / (len(volume) - 1)
+        if slice_spacing < 0:
+            normal = -normal
+            slice_spacing = -slice_spacing
+    else:
+        slice_spacing = float(first_slice.get("SliceThickness") or 1)
+
+    image = sitk.GetImageFromArray(volume)
+    image.SetOrigin([float(value)
+                     for value in first_slice.ImagePositionPatient])
+    image.SetSpacing([float(first_slice.PixelSpacing[1]),
+                      float(first_slice.PixelSpacing[0]),
+                      float(slice_spacing)])
+    image.SetDirection(np.column_stack(
+        (row_cosine, column_cosine, normal)).flatten().tolist())
+    return image
+
+
+def get_fused_volumes():
+    """
+    Get the fixed and registered moving images of the image fusion as
+    numpy arrays. The moving array is extracted from its SimpleITK image
+    once and kept in the PatientDictContainer until the fusion changes.
+    :return: Tuple (fixed_volume, moving_volume) of read-only numpy
+        arrays in the order (slices, rows, columns).
+    """
+    patient_dict_container = PatientDictContainer()
+    fused_images = patient_dict_container.get("fused_images")
+
+    # The fixed image is created from the volume of the patient, see
+    # create_sitk_image(..), so only the moving image is extracted.
+    fused_volumes = patient_dict_container.get("fused_volumes")
+    if fused_volumes is None or fused_volumes[0] is not fused_images[0]:
+        moving_volume = sitk.GetArrayFromImage(fused_images[0])
+        moving_volume.flags.writeable = False
+        fused_volumes = (fused_images[0], moving_volume)
+        patient_dict_container.set("fused_volumes", fused_volumes)
+    return patient_dict_container.volume, fused_volumes[1]
 
 
 def get_fused_window(level, window):
     """
-    generates the fused ismages with applied windows
+    Get the fused images with applied windows. Fused slices are only
+    rendered when they are displayed, see LazyFusedPixmaps.
     :param level: the level (midpoint) of windowing
     :param window: the window (range) of windowing
-    :return: axial, sagittal and coronal pixmaps with windowing
+    :return: axial, sagittal and coronal LazyFusedPixmaps, which can be
+        used like dictionaries of slice number to QPixmap
     """
-
     patient_dict_container = PatientDictContainer()
-    old_images = patient_dict_container.get("sitk_original")
-    fused_image = patient_dict_container.get("fused_images")
+    fixed_volume, moving_volume = get_fused_volumes()
+    pixmap_aspect = patient_dict_container.get("pixmap_aspect")
+    rescale = patient_dict_container.get("rescale") or (1, 0)
 
-    array = sitk.GetArrayFromImage(old_images).shape
+    color_axial, color_coronal, color_sagittal = get_fused_pixmaps(
+        fixed_volume, moving_volume, int(window), int(level), pixmap_aspect,
+        rescale)
+    return color_axial, color_sagittal, color_coronal
 
-    axial_slice_count = array[0]
-    coronal_slice_count = array[1]
-    sagittal_slice_count = array[1]
 
-    sp_plane, _, sp_slice = old_images.GetSpacing()
-    asp = (1.0 * sp_slice) / sp_plane
+def get_fused_pixmaps(fixed_volume, moving_volume, window, level,
+                      pixmap_aspect, rescale=(1, 0)):
+    """
+    Get the lazily rendered fused pixmaps of the 3 views, with the same
+    sizes as the pixmaps of get_pixmaps(..)
+    :param fixed_volume: 3D numpy array of the fixed image
+    :param moving_volume: 3D numpy array of the moving image, registered
+        onto the fixed image
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :param pixmap_aspect: Scaling ratio for axial, coronal, and sagittal
+        pixmaps
+    :param rescale: Tuple (slope, intercept) already applied to the
+        volumes
+    :return: Tuple of LazyFusedPixmaps for the axial, coronal and
+        sagittal views.
+    """
+    shape = fixed_volume.shape
+    sizes = {
+        "axial": scaled_size(shape[1] * pixmap_aspect["axial"], shape[2]),
+        "coronal": scaled_size(shape[1], shape[0] * pixmap_aspect["coronal"]),
+        "sagittal": scaled_size(shape[2] * pixmap_aspect["sagittal"],
+                                shape[0]),
+    }
+    return tuple(
+        LazyFusedPixmaps(fixed_volume, moving_volume, view, window, level,
+                         sizes[view][0], sizes[view][1], rescale)
+        for view in ("axial", "coronal", "sagittal"))
+
+
+def register_images(image_1, image_2,
+                    shrink_factors=REGISTRATION_SHRINK_FACTORS,
+                    smooth_sigmas=REGISTRATION_SMOOTH_SIGMAS,
+                    number_of_iterations=REGISTRATION_ITERATIONS,
+                    interrupt_flag=None, progress_callback=None):
+    """
+    Rigidly registers the moving image onto the fixed image with a
+    multi-resolution registration, from the coarsest level of the pyramid
+    to the finest. The registration can be stopped between iterations.
+    Args:
+        image_1 (Image Matrix): fixed image
+        image_2 (Image Matrix): moving image
+        shrink_factors (list(int)): shrink factor of each level of the
+            pyramid
+        smooth_sigmas (list(float)): smoothing sigma of each level of the
+            pyramid, in mm
+        number_of_iterations (int): maximum number of optimizer
+            iterations of each level
+        interrupt_flag (threading.Event): stops the registration when set
+        progress_callback (Signal): receives (text, percentage) tuples
+            with the metric value of each iteration
+    Return:
+        Tuple (img_ct (Image Matrix), tfm (sitk.CompositeTransform)), or
+        None if the registration was interrupted.
+    """
+    initial_transform = sitk.CenteredTransformInitializer(
+        image_1, image_2, sitk.Euler3DTransform(),
+        sitk.CenteredTransformInitializerFilter.GEOMETRY)
+    optimized_transform = sitk.VersorRigid3DTransform()
+    optimized_transform.SetCenter(initial_transform.GetCenter())
+
+    registration = sitk.ImageRegistrationMethod()
+    registration.SetShrinkFactorsPerLevel(list(shrink_factors))
+    registration.SetSmoothingSigmasPerLevel(list(smooth_sigmas))
+    registration.SmoothingSigmasAreSpecifiedInPhysicalUnitsOn()
+    registration.SetMetricAsMeanSquares()
+    registration.SetMetricSamplingStrategy(registration.REGULAR)
+    registration.SetMetricSamplingPercentage(0.25)
+    registration.SetInterpolator(sitk.sitkLinear)
+    registration.SetOptimizerAsGradientDescent(
+        learningRate=1.0, numberOfIterations=number_of_iterations,
+        convergenceMinimumValue=1e-6, convergenceWindowSize=10)
+    registration.SetOptimizerScalesFromPhysicalShift()
+    registration.SetMovingInitialTransform(initial_transform)
+    registration.SetInitialTransform(optimized_transform, inPlace=True)
+
+    levels = len(shrink_factors)
+
+    def on_iteration():
+        if interrupt_flag is not None and interrupt_flag.is_set():
+            registration.StopRegistration()
+            return
+        if progress_callback is not None:
+            level = registration.GetCurrentLevel()
+            iteration = registration.GetOptimizerIteration()
+            progress = (level + iteration / number_of_iterations) / levels
+            progress_callback.emit((
+                "Registering images (level %s/%s)...\nMetric: %.4f"
+                % (level + 1, levels, registration.GetMetricValue()),
+                85 + int(10 * min(progress, 1))))
+
+    registration.AddCommand(sitk.sitkIterationEvent, on_iteration)
+    registration.Execute(sitk.Cast(image_1, sitk.sitkFloat32),
+                         sitk.Cast(image_2, sitk.sitkFloat32))
+
+    if interrupt_flag is not None and interrupt_flag.is_set():
+        return None
+
+    tfm = sitk.CompositeTransform([initial_transform, optimized_transform])
+    return resample_moving_image(image_1, image_2, tfm), tfm
+
+
+def resample_moving_image(fixed_image, moving_image, transform):
+    """
+    Resample the moving image onto the grid of the fixed image.
+    :param fixed_image: fixed image
+    :param moving_image: moving image
+    :param transform: transform from the fixed image to the moving image
+    :return: the moving image registered onto the fixed image
+    """
+    default_value = float(sitk.GetArrayViewFromImage(moving_image).min())
+    return sitk.Resample(moving_image, fixed_image, transform,
+                         sitk.sitkLinear, default_value,
+                         moving_image.GetPixelID())
 
-    color_axial = {}
-    color_sagittal = {}
-    color_coronal = {}
 
-    windowing = (int(level), int(window))
+@lru_cache(maxsize=8)
+def get_colormix_luts(colour_rotation=FUSION_COLOUR_ROTATION):
+    """
+    Calculate the LUTs that colour the windowed fixed and moving images.
+    The fixed image is coloured with the hue colour_rotation and the
+    moving image with its complementary colour, so the sum of both is
+    grey wherever the images agree.
+    :param colour_rotation: Hue of the fixed image, between 0 and 1.
+    :return: Tuple (fixed_lut, moving_lut) of read-only (256, 3) uint8
+        numpy arrays. The sum of both LUTs never exceeds 255.
+    """
+    colour = np.array(colorsys.hsv_to_rgb(colour_rotation, 1, 1))
+    values = np.arange(256, dtype=np.float32)[:, None]
+    fixed_lut = np.floor(values * colour).astype(np.uint8)
+    moving_lut = np.floor(values * (1 - colour)).astype(np.uint8)
+    fixed_lut.flags.writeable = False
+    moving_lut.flags.writeable = False
+    return fixed_lut, moving_lut
 
-    for i in range(axial_slice_count):
-        color_axial[i] = \
-            get_fused_pixmap(old_images, fused_image[0], asp, i, "axial",
-                             windowing)
 
-    for i in range(sagittal_slice_count):
-        color_sagittal[i] = \
-            get_fused_pixmap(old_images, fused_image[0], asp, i, "sagittal",
-                             windowing)
+def fused_image(fixed_pixels, moving_pixels, window, level, width, height,
+                rescale=(1, 0)):
+    """
+    Blend a slice of the fixed and moving images into a colour QImage.
+    Like scaled_image(..), this is safe to call outside of the GUI thread.
+    :param fixed_pixels: 2D numpy array of the fixed image slice
+    :param moving_pixels: 2D numpy array of the moving image slice
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :param width: Pixel width of the window
+    :param height: Pixel height of the window
+    :param rescale: Tuple (slope, intercept) already applied to the pixels
+    :return: QImage of the slice
+    """
+    fixed_lut, moving_lut = get_colormix_luts()
+    pixel_array_color = \
+        fixed_lut[apply_window(fixed_pixels, window, level, rescale)]
+    pixel_array_color += \
+        moving_lut[apply_window(moving_pixels, window, level, rescale)]
 
-    for i in range(coronal_slice_count):
-        color_coronal[i] = \
-            get_fused_pixmap(old_images, fused_image[0], asp, i, "coronal",
-                             windowing)
+    qimage = QtGui.QImage(pixel_array_color,
+                          pixel_array_color.shape[1],
+                          pixel_array_color.shape[0],
+                          3 * pixel_array_color.shape[1],
+                          QtGui.QImage.Format_RGB888)
 
-    return color_axial, color_sagittal, color_coronal
+    # Scaling returns a new QImage which owns its pixel data.
+    return qimage.scaled(width, height, QtCore.Qt.IgnoreAspectRatio,
+                         QtCore.Qt.SmoothTransformation)
 
 
-# Can be expanded to peform all of platipy's registrations
-def register_images(image_1, image_2):
+class LazyFusedPixmaps(LazyPixmaps):
     """
-    Registers the moving and fixed image.
-    Args:
-        image_1 (Image Matrix)
-        image_2 (Image Matrix)
-    Return:
-        img_ct (Array)
-        tfm (sitk.CompositeTransform)
-    """
-    img_ct, tfm = linear_registration(
-        image_1,
-        image_2,
-        shrink_factors=[8],
-        smooth_sigmas=[10],
-        reg_method='rigid',
-        verbose=False
-    )
-    return img_ct, tfm
-
-
-def get_fused_pixmap(orig_image, fused_image, aspect,
-                     slice_num, view, windowing=(-250, 500)):
-    """
-    Get a color pixmap.
-    :param orig_image: original 3d image
-    :param fused_image: fused 3d image
-    :param aspect: scaled pixel spacing of first image
-    :param slice_num: number of slices
-    :param view: axial, sagittal or coronal
-    :param windowing: target level and window of the fused image
-    :return: color pixmap.
-    """
-    # Get dimension /could also input dimensions as parameters
-    image_array = sitk.GetArrayFromImage(orig_image)
-    if view == "sagittal":
-        image_slice = return_slice("x", slice_num)
-
-        pixel_array_color = \
-            np.array(generate_comparison_colormix(
-                [orig_image, fused_image],
-                arr_slice=image_slice, window=windowing))
-
-        # resize dimensions to stop image stretch
-        pixel_array_color = np.resize(pixel_array_color, (512, 345, 3))
-
-        # first adjusts rgb (0,1) scale to greyscale (0,255)
-        # then converts type and formats it to color.
-        qimage2 = \
-            QtGui.QImage(((255 * pixel_array_color).astype(np.uint8)),
-                         image_array.shape[1], image_array.shape[0],
-                         QtGui.QImage.Format_RGB888)
-
-        # Then continues to convert to pixmap just like in onko
-        pixmap = QtGui.QPixmap(qimage2)
-
-        pixmap = pixmap.scaled(512,
-                               512,
-                               QtCore.Qt.IgnoreAspectRatio,
-                               QtCore.Qt.SmoothTransformation)
-    elif view == "coronal":
-        image_slice = return_slice("y", slice_num)
-
-        pixel_array_color = np.array(generate_comparison_colormix(
-            [orig_image, fused_image],
-            arr_slice=image_slice, window=windowing))
-
-        # resize dimensions to stop image stretch
-        pixel_array_color = np.resize(pixel_array_color, (512, 345, 3))
-
-        # first adjusts rgb (0,1) scale to greyscale (0,255)
-        # then converts type and formats it to color.
-        qimage2 = QtGui.QImage(((255 * pixel_array_color).astype(np.uint8)),
-                               image_array.shape[1],
-                               image_array.shape[0],
-                               QtGui.QImage.Format_RGB888)
-
-        # Then continues to convert to pixmap just like in onko
-        pixmap = QtGui.QPixmap(qimage2)
-        pixmap = pixmap.scaled(512,
-                               512,
-                               QtCore.Qt.IgnoreAspectRatio,
-                               QtCore.Qt.SmoothTransformation)
-    else:
-        image_slice = return_slice("z", slice_num)
-
-        pixel_array_color = np.array(generate_comparison_colormix(
-            [orig_image, fused_image],
-            arr_slice=image_slice, window=windowing))
-
-        # first adjusts rgb (0,1) scale to greyscale (0,255)
-        # then converts type and formats it to color.
-        qimage = QtGui.QImage(((255 * pixel_array_color).astype(np.uint8)),
-                              image_array.shape[1],
-                              image_array.shape[1],
-                              QtGui.QImage.Format_RGB888)
-
-        # Then continues to convert to pixmap just like in onko
-        pixmap = QtGui.QPixmap(qimage)
-        pixmap = pixmap.scaled(512,
-                               512,
-                               QtCore.Qt.IgnoreAspectRatio,
-                               QtCore.Qt.SmoothTransformation)
-
-    # Generates an rgb color overlaid image,
-    # convert to contiguous array,
-    # and also flip the array if it is a coronal (y) or sagittal (x)
-    return pixmap
+    Read-only mapping of slice number to fused colour QPixmap for a
+    single view. Like LazyPixmaps, slices are blended when they are
+    requested, recently viewed slices are cached and the neighbours of
+    the requested slice are blended in the background.
+    """
+
+    def __init__(self, fixed_volume, moving_volume, slice_view, window,
+                 level, width, height, rescale=(1, 0)):
+        """
+        :param fixed_volume: 3D numpy array of the fixed image, in the
+            order (slices, rows, columns)
+        :param moving_volume: 3D numpy array of the moving image
+            registered onto the fixed image, with the same shape
+        :param slice_view: One of 'axial', 'coronal' or 'sagittal'
+        :param window: Window width of windowing function
+        :param level: Level value of windowing function
+        :param width: Pixel width of the rendered pixmaps
+        :param height: Pixel height of the rendered pixmaps
+        :param rescale: Tuple (slope, intercept) already applied to the
+            volumes
+        """
+        super().__init__(fixed_volume, slice_view, window, level, width,
+                         height, rescale)
+        self.moving_volume = moving_volume
+
+    def render_image(self, index):
+        """
+        Blend a single slice. Safe to call from any thread.
+        :param index: Slice number within this view.
+        :return: QImage of the slice scaled to the size of the view.
+        """
+        return fused_image(self.get_slice(index),
+                           self.get_slice(index, self.moving_volume),
+                           self.window, self.level, self.width, self.height,
+                           self.rescale)
 
 
 def scaled_size(width, height):
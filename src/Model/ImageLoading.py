@@ -18,16 +18,19 @@ function should not need to be added to. (Of course realistically this is
 not the case, however this alternative function promotes scalability and
 durability of the process).
 """
-import collections
 import math
 import re
-from multiprocessing import Queue, Process
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-from dicompylercore import dvhcalc
 from pydicom import dcmread
 from pydicom.errors import InvalidDicomError
 
+from src.Model.ContourStore import get_contour_store
+from src.Model.DVHCache import DVHCache
+from src.Model.DVHCalculationPool import DVHCalculationPool
+from src.Model.DVHEngine import DVHEngine
+
 allowed_classes = {
     # CT Image
     "1.2.840.10008.5.1.4.1.1.2": {
@@ -67,6 +70,11 @@ allowed_classes = {
 }
 
 
+# Values larger than this are not read by get_datasets(..) until they are
+# accessed, see pydicom.dcmread(defer_size=..)
+DEFER_SIZE = "16 KB"
+
+
 class NotRTSetError(Exception):
     pass
 
@@ -75,7 +83,7 @@ class NotAllowedClassError(Exception):
     pass
 
 
-def get_datasets(filepath_list):
+def get_datasets(filepath_list, progress_callback=None, max_workers=None):
     """
     This function generates two dictionaries: the dictionary of PyDicom
     datasets, and the dictionary of filepaths. These two dictionaries
@@ -85,19 +93,41 @@ def get_datasets(filepath_list):
     are PyDicom Dataset objects, and the values of the file_names_dict
     are filepaths pointing to the location of the .dcm file on the
     user's computer.
+    Files are read, and the pixel data of image slices decoded,
+    concurrently on a pool of threads.
     :param filepath_list: List of all files to be searched.
+    :param progress_callback: Optional signal that receives a tuple
+        (message, percentage) as each file is read.
+    :param max_workers: Maximum number of files read at the same time.
+        Defaults to the executor's default (based on the CPU count).
     :return: Tuple (read_data_dict, file_names_dict)
     """
     read_data_dict = {}
     file_names_dict = {}
 
-    slice_count = 0
-    for file in natural_sort(filepath_list):
-        try:
-            read_file = dcmread(file)
-        except InvalidDicomError:
-            pass
-        else:
+    sorted_filepath_list = natural_sort(filepath_list)
+    total_files = len(sorted_filepath_list)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(read_dataset, file)
+                   for file in sorted_filepath_list]
+
+        # Slice numbers are assigned in the order of the sorted file
+        # names, regardless of the order in which the files finish
+        # being read.
+        slice_count = 0
+        for files_read, (file, future) in \
+                enumerate(zip(sorted_filepath_list, futures), 1):
+            read_file = future.result()
+            if progress_callback is not None:
+                progress_callback.emit(
+                    ("Creating datasets... (%s/%s)" % (files_read,
+                                                      total_files),
+                     int(10 * files_read / total_files)))
+
+            if read_file is None:
+                continue
+
             if read_file.SOPClassUID in allowed_classes:
                 allowed_class = allowed_classes[read_file.SOPClassUID]
                 if allowed_class["sliceable"]:
@@ -109,6 +139,8 @@ def get_datasets(filepath_list):
                 read_data_dict[slice_name] = read_file
                 file_names_dict[slice_name] = file
             else:
+                for pending in futures:
+                    pending.cancel()
                 raise NotAllowedClassError
 
     sorted_read_data_dict, sorted_file_names_dict = \
@@ -117,6 +149,39 @@ def get_datasets(filepath_list):
     return sorted_read_data_dict, sorted_file_names_dict
 
 
+def read_dataset(file):
+    """
+    Reads a single file for get_datasets(..). Large values such as the
+    pixel data are only read from the file when they are accessed. The
+    compressed pixel data of image slices is decoded here as well, so
+    that decoding also happens concurrently rather than when the image
+    volume is built.
+    :param file: Path of the file to read.
+    :return: PyDicom dataset, or None if the file is not a DICOM file.
+    """
+    try:
+        read_file = dcmread(file, defer_size=DEFER_SIZE)
+    except InvalidDicomError:
+        return None
+
+    # Uncompressed pixel data is left in the file until the image volume
+    # is built, since there is nothing to decode.
+    allowed_class = allowed_classes.get(read_file.get("SOPClassUID"))
+    transfer_syntax = read_file.file_meta.get("TransferSyntaxUID") \
+        if hasattr(read_file, "file_meta") else None
+    if allowed_class is not None and allowed_class["sliceable"] \
+            and transfer_syntax is not None and transfer_syntax.is_compressed:
+        try:
+            read_file.convert_pixel_data()
+        except Exception:
+            # Any problem with the pixel data is raised again when the
+            # pixel data is next accessed, where it was raised before
+            # files were read concurrently.
+            pass
+
+    return read_file
+
+
 def img_stack_displacement(orientation, position):
     """
     Calculate the projection of the image position patient along the
@@ -273,14 +338,16 @@ def get_thickness_dict(dataset_rtss, read_data_dict):
         except AttributeError:
             pass
 
+    # Slice key of each SOPInstanceUID
+    slice_keys = {}
+    for key, ds in read_data_dict.items():
+        slice_keys[ds.SOPInstanceUID] = key
+
     dict_thickness = {}
     for roi_number, sop_instance_uid in single_contour_rois.items():
         # Get the slice numbers the slices before and after the slice
         # the ROI is positioned on.
-        slice_key = None
-        for key, ds in read_data_dict.items():
-            if ds.SOPInstanceUID == sop_instance_uid:
-                slice_key = key
+        slice_key = slice_keys.get(sop_instance_uid)
 
         # Get the Image Position (Patient) from the two slices.
         try:
@@ -336,61 +403,94 @@ def calc_dvhs(dataset_rtss, dataset_rtdose, rois, dict_thickness,
     :param dose_limit: Limit of dose for DVH calculation.
     :return: Dictionary of all the DVHs of all the ROIs of the patient.
     """
-    dict_dvh = {}
-    roi_list = []
-    for key in rois:
-        roi_list.append(key)
+    return DVHEngine(dataset_rtss, dataset_rtdose).calc_dvhs(
+        rois, dict_thickness, interrupt_flag, dose_limit)
 
-    for roi in roi_list:
-        thickness = None
-        if roi in dict_thickness:
-            thickness = dict_thickness[roi]
-        dict_dvh[roi] = dvhcalc.get_dvh(dataset_rtss, dataset_rtdose, roi,
-                                        dose_limit, thickness=thickness)
-        if interrupt_flag.is_set():  # Stop calculating at the next DVH.
-            return
 
-    return dict_dvh
+def multi_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                   interrupt_flag=None, dose_limit=None):
+    """
+    Multiprocessing variant of calc_dvhs. DVHs are taken from the DVH
+    cache where possible, and only the remaining ROIs are calculated as
+    tasks on worker processes by the DVHCalculationPool.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param rois: Dictionary of ROI information.
+    :param dict_thickness: Dictionary where the keys are ROI numbers and
+        the values are thicknesses of the ROI.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop calculation.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :return: Dictionary of all the DVHs of all the ROIs of the patient,
+        or None if the calculation was interrupted.
+    """
+    keys = DVHCache.get_keys(dataset_rtss, dataset_rtdose.SOPInstanceUID,
+                             rois, dict_thickness, dose_limit)
+    dict_dvh = get_cached_dvhs(keys, rois)
 
+    missing = [roi for roi in rois if roi not in dict_dvh]
+    if missing:
+        calculated = DVHCalculationPool().calc_dvhs(
+            dataset_rtss, dataset_rtdose, missing, dict_thickness,
+            interrupt_flag, dose_limit)
+        if calculated is None:
+            return None
+        DVHCache().update_dvhs(keys, calculated)
+        dict_dvh.update(calculated)
 
-def calc_dvh_worker(rtss, dose, roi, queue, thickness, dose_limit=None):
-    dvh = {}
-    dvh[roi] = \
-        dvhcalc.get_dvh(rtss, dose, roi, dose_limit, thickness=thickness)
-    queue.put(dvh)
+    return {roi: dict_dvh[roi] for roi in rois}
 
 
-def multi_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness,
-                   dose_limit=None):
+def get_cached_dvhs(keys, rois):
     """
-    Multiprocessing variant of calc_dvh for fork-based platforms.
+    :param keys: Dictionary of DVH cache keys, as returned by
+        DVHCache.get_keys(..)
+    :param rois: Dictionary of ROI information.
+    :return: Dictionary of the DVHs found in the DVH cache, named after
+        the current names of their ROIs.
     """
-    queue = Queue()
-    processes = []
-    dict_dvh = {}
-
-    roi_list = []
-    for key in rois:
-        roi_list.append(key)
+    dict_dvh = DVHCache().get_dvhs(keys)
+    if isinstance(rois, dict):
+        for roi, dvh in dict_dvh.items():
+            dvh.name = rois[roi]['name']
+    return dict_dvh
 
-    for i in range(len(roi_list)):
-        thickness = None
-        if roi_list[i] in dict_thickness:
-            thickness = dict_thickness[roi_list[i]]
-        p = Process(target=calc_dvh_worker,
-                    args=(dataset_rtss, dataset_rtdose, roi_list[i],
-                          queue, thickness, dose_limit,))
-        processes.append(p)
-        p.start()
 
-    for process in processes:
-        dvh = queue.get()
-        dict_dvh.update(dvh)
+def get_dirty_rois(rois, raw_dvh, dirty_rois):
+    """
+    :param rois: Dictionary of ROI information.
+    :param raw_dvh: Dictionary of the DVHs already calculated.
+    :param dirty_rois: Set of the numbers of ROIs that have been modified
+        since their DVHs were calculated.
+    :return: Dictionary of the information of the ROIs whose DVHs need
+        to be (re)calculated.
+    """
+    return {roi: info for roi, info in rois.items()
+            if roi in dirty_rois or roi not in raw_dvh}
 
-    for process in processes:
-        process.join()
 
-    return dict_dvh
+def merge_dvhs(rois, raw_dvh, dvh_x_y, calculated):
+    """
+    Merge recalculated DVHs into the existing ones. DVHs of ROIs that no
+    longer exist are dropped.
+    :param rois: Dictionary of ROI information.
+    :param raw_dvh: Dictionary of the DVHs already calculated.
+    :param dvh_x_y: Dictionary produced by converge_to_0_dvh(..) for
+        raw_dvh.
+    :param calculated: Dictionary of the recalculated DVHs.
+    :return: Tuple of the merged raw_dvh and dvh_x_y dictionaries.
+    """
+    calculated_x_y = converge_to_0_dvh(calculated)
+    merged_dvh = {}
+    merged_x_y = {}
+    for roi in rois:
+        if roi in calculated:
+            merged_dvh[roi] = calculated[roi]
+            merged_x_y[roi] = calculated_x_y[roi]
+        elif roi in raw_dvh:
+            merged_dvh[roi] = raw_dvh[roi]
+            merged_x_y[roi] = dvh_x_y[roi]
+    return merged_dvh, merged_x_y
 
 
 def converge_to_0_dvh(raw_dvh):
@@ -436,45 +536,25 @@ def get_raw_contour_data(dataset_rtss):
     """
     :param dataset_rtss: RTSTRUCT DICOM dataset object.
     :return: Tuple (dict_roi, dict_numpoints) raw contour data of the
-        ROIs.
+        ROIs. The contours of each ROI are parsed once into an
+        ROIContours object.
     """
-    dict_id = {}
-    for i, elem in enumerate(dataset_rtss.StructureSetROISequence):
-        roi_number = elem.ROINumber
-        roi_name = elem.ROIName
-        dict_id[roi_number] = roi_name
-
-    dict_roi = {}
-    dict_numpoints = {}
-    for roi in dataset_rtss.ROIContourSequence:
-        referenced_roi_number = roi.ReferencedROINumber
-        roi_name = dict_id[referenced_roi_number]
-        dict_contour = collections.defaultdict(list)
-        roi_points_count = 0
-        if 'ContourSequence' in roi:
-            for roi_slice in roi.ContourSequence:
-                if 'ContourImageSequence' in roi_slice:
-                    for contour_img in roi_slice.ContourImageSequence:
-                        referenced_sop_instance_uid = \
-                            contour_img.ReferencedSOPInstanceUID
-                    contour_geometric_type = roi_slice.ContourGeometricType
-                    number_of_contour_points = roi_slice.NumberOfContourPoints
-                    roi_points_count += int(number_of_contour_points)
-                    contour_data = roi_slice.ContourData
-                    dict_contour[
-                        referenced_sop_instance_uid].append(contour_data)
-        dict_roi[roi_name] = dict_contour
-        dict_numpoints[roi_name] = roi_points_count
-
-    return dict_roi, dict_numpoints
+    return get_contour_store(dataset_rtss)
 
 
 def calculate_matrix(img_ds):
+    """
+    Calculate the pixel LUT of an image slice: the patient x coordinate
+    of every column and the patient y coordinate of every row.
+    :param img_ds: DICOM(image) dataset
+    :return: pair of numpy arrays (x, y) of the column and row
+        coordinates
+    """
     # Physical distance (in mm) between the center of each image pixel,
     # specified by a numeric pair
     # - adjacent row spacing (delimiter) adjacent column spacing.
-    dist_row = img_ds.PixelSpacing[0]
-    dist_col = img_ds.PixelSpacing[1]
+    dist_row = float(img_ds.PixelSpacing[0])
+    dist_col = float(img_ds.PixelSpacing[1])
     # The direction cosines of the first row and the first column
     # with respect to the patient.
     # 6 values inside: [Xx, Xy, Xz, Yx, Yy, Yz]
@@ -486,40 +566,59 @@ def calculate_matrix(img_ds):
 
     # Equation C.7.6.2.1-1.
     # https://dicom.innolitics.com/ciods/rt-structure-set/roi-contour/30060039/30060040/30060050
-    matrix_m = np.matrix(
-        [[orientation[0] * dist_row, orientation[3] * dist_col, 0,
-          position[0]],
-         [orientation[1] * dist_row, orientation[4] * dist_col, 0,
-          position[1]],
-         [orientation[2] * dist_row, orientation[5] * dist_col, 0,
-          position[2]],
-         [0, 0, 0, 1]]
-    )
-    x = []
-    y = []
-    for i in range(0, img_ds.Columns):
-        i_mat = matrix_m * np.matrix([[i], [0], [0], [1]])
-        x.append(float(i_mat[0]))
-
-    for j in range(0, img_ds.Rows):
-        j_mat = matrix_m * np.matrix([[0], [j], [0], [1]])
-        y.append(float(j_mat[1]))
-
-    return np.array(x), np.array(y)
+    # Only the x coordinate of the pixels in the first row, and the y
+    # coordinate of the pixels in the first column, are needed, so the
+    # matrix product reduces to a scale and offset of the pixel indices.
+    return calculate_lut(float(orientation[0]) * dist_row,
+                         float(position[0]), img_ds.Columns), \
+        calculate_lut(float(orientation[4]) * dist_col,
+                      float(position[1]), img_ds.Rows)
+
+
+def calculate_lut(step, offset, length):
+    """
+    :param step: Distance (in mm) between the centers of adjacent pixels
+        along the axis.
+    :param offset: Coordinate (in mm) of the center of the first pixel.
+    :param length: Number of pixels.
+    :return: Numpy array of the coordinate of every pixel.
+    """
+    return np.arange(length, dtype=float) * step + offset
 
 
 def get_pixluts(read_data_dict):
     """
+    Calculate the pixluts of every image slice. Slices in a series
+    usually share their orientation, spacing and in-plane position, so
+    each distinct LUT is only calculated once and is shared between all
+    slices it belongs to. The shared arrays are read-only.
     :param read_data_dict: Dictionary of all DICOM dataset objects.
     :return: Dictionary of pixluts for the transformation from 3D to 2D.
     """
     dict_pixluts = {}
+    luts = {}
     non_img_type = ['rtdose', 'rtplan', 'rtss', 'rtimage']
     for ds in read_data_dict:
         if ds not in non_img_type:
             img_ds = read_data_dict[ds]
-            pixlut = calculate_matrix(img_ds)
-            dict_pixluts[img_ds.SOPInstanceUID] = pixlut
+            dist_row = float(img_ds.PixelSpacing[0])
+            dist_col = float(img_ds.PixelSpacing[1])
+            orientation = img_ds.ImageOrientationPatient
+            position = img_ds.ImagePositionPatient
+            lut_keys = (
+                (float(orientation[0]) * dist_row, float(position[0]),
+                 int(img_ds.Columns)),
+                (float(orientation[4]) * dist_col, float(position[1]),
+                 int(img_ds.Rows)))
+
+            pixlut = []
+            for lut_key in lut_keys:
+                if lut_key not in luts:
+                    lut = calculate_lut(*lut_key)
+                    lut.flags.writeable = False
+                    luts[lut_key] = lut
+                pixlut.append(luts[lut_key])
+            dict_pixluts[img_ds.SOPInstanceUID] = tuple(pixlut)
 
     return dict_pixluts
 
@@ -1,6 +1,6 @@
 import os
 import pydicom
-from src.Model.CalculateImages import convert_raw_data, get_pixmaps
+from src.Model.CalculateImages import get_volume, get_pixmaps
 from src.Model.GetPatientInfo import get_basic_info, DicomTree, \
     dict_instance_uid
 from src.Model.Isodose import get_dose_pixluts, calculate_rx_dose_in_cgray
@@ -68,7 +68,8 @@ def create_initial_model():
 
     patient_dict_container.set("dict_windowing", dict_windowing)
 
-    pixel_values = convert_raw_data(dataset)
+    volume, rescale = get_volume(dataset)
+    patient_dict_container.set_volume(volume)
     # Calculate the ratio between x axis and y axis of 3 views
     pixmap_aspect = {}
     pixel_spacing = dataset[0].PixelSpacing
@@ -77,12 +78,12 @@ def create_initial_model():
     pixmap_aspect["sagittal"] = pixel_spacing[1] / slice_thickness
     pixmap_aspect["coronal"] = slice_thickness / pixel_spacing[0]
     pixmaps_axial, pixmaps_coronal, pixmaps_sagittal = \
-        get_pixmaps(pixel_values, window, level, pixmap_aspect)
+        get_pixmaps(volume, window, level, pixmap_aspect, rescale)
 
     patient_dict_container.set("pixmaps_axial", pixmaps_axial)
     patient_dict_container.set("pixmaps_coronal", pixmaps_coronal)
     patient_dict_container.set("pixmaps_sagittal", pixmaps_sagittal)
-    patient_dict_container.set("pixel_values", pixel_values)
+    patient_dict_container.set("rescale", rescale)
     patient_dict_container.set("pixmap_aspect", pixmap_aspect)
 
     basic_info = get_basic_info(dataset[0])
@@ -1,8 +1,16 @@
 """ Contains functions required for isodose display """
 
+
+import os
+
 import numpy as np
 
-from src.Model.ROI import calculate_matrix
+from src.constants import ISODOSE_SLICES_PER_TASK
+from src.Model.DoseGrid import find_isodose_boundaries, \
+    find_worker_isodose_boundaries, get_dose_planes, init_worker_dose, \
+    interpolate_dose_grid
+from src.Model.ROI import calculate_matrix, get_pixluts
+from src.Model.WorkerProcessPool import WorkerProcessPool
 
 
 def get_dose_pixels(pixlut, doselut, img_ds):
@@ -48,10 +56,11 @@ def get_dose_pixluts(dict_ds):
     dict_dose_pixluts = {}
     non_img_type = ['rtdose', 'rtplan', 'rtss', 'rtimage']
     dose_data = calculate_matrix(dict_ds['rtdose'])
+    dict_pixluts = get_pixluts(dict_ds)
     for ds in dict_ds:
         if ds not in non_img_type:
             img_ds = dict_ds[ds]
-            pixlut = calculate_matrix(img_ds)
+            pixlut = dict_pixluts[img_ds.SOPInstanceUID]
             dose_pixlut = get_dose_pixels(pixlut, dose_data, img_ds)
             dict_dose_pixluts[img_ds.SOPInstanceUID] = dose_pixlut
     return dict_dose_pixluts
@@ -62,42 +71,67 @@ def get_dose_grid(rtd, z=0):
     Return the 2d dose grid for the given slice position (mm). 
     Based on the function GetDoseGrid in dicompyler-core
     (https://github.com/dicompyler/dicompyler-core/blob/master/dicompylercore/dicomparser.py)
+    Use DosePlaneCache to get the dose grids of slices that are displayed
+    repeatedly.
 
     :param rtd:     Data from RTDose file
     :param z:       Position of slice in mm
     :return:        Dose grid as a 2d numpy array
     """
+    planes = get_dose_planes(rtd)
+    if planes is not None:
+        return interpolate_dose_grid(rtd.pixel_array, planes, z)
 
-    if 'GridFrameOffsetVector' in rtd:
-        z = float(z)
-
-        planes = rtd.ImageOrientationPatient[0] \
-                 * np.array(rtd.GridFrameOffsetVector) \
-                 + rtd.ImagePositionPatient[2]
-        frame = -1
-
-        if np.amin(np.fabs(planes - z)) < 0.5:
-            frame = np.argmin(np.fabs(planes - z))
-            return rtd.pixel_array[frame]
-
-        if (z > np.amin(planes)) or (z < np.amax(planes)):
-            u_min = np.fabs(planes - z)
-            l_min = u_min.copy()
-            ub = np.argmin(u_min)
-
-            l_min[ub] = np.amax(u_min)
-            lb = np.argmin(l_min)
 
-            # Fractional distance from bottom to top
-            # Plane is at upper plane if 1, lower plane if 0
-            fz = (z - planes[lb]) / (planes[ub] - planes[lb])
-
-            plane = fz * rtd.pixel_array[ub] \
-                    + (1.0 - fz) * rtd.pixel_array[lb]
-
-            return plane
-
-        return np.array([])
+def calculate_isodose_boundaries(dose_plane_cache, slices, thresholds,
+                                 interrupt_flag=None,
+                                 progress_callback=None):
+    """
+    Find the isodose boundaries of slices on a WorkerProcessPool. The
+    dose volume and the frame positions of the dose plane cache are sent
+    to each worker process once, when it starts, and the workers
+    interpolate the dose grids of their slices. Each task finds the
+    boundaries of ISODOSE_SLICES_PER_TASK slices.
+
+    :param dose_plane_cache:    DosePlaneCache of the RTDose
+    :param slices:              List of (slice index, slice position in
+                                mm)
+    :param thresholds:          Dictionary of the dose grid value of each
+                                isodose level
+    :param interrupt_flag:      A threading.Event() object that tells the
+                                function to stop calculation
+    :param progress_callback:   Signal that receives the progress of the
+                                calculation, from 50 to 75
+    :return:                    See find_isodose_boundaries(..), or None
+                                if the calculation was interrupted
+    """
+    chunks = [(slices[i:i + ISODOSE_SLICES_PER_TASK], thresholds)
+              for i in range(0, len(slices), ISODOSE_SLICES_PER_TASK)]
+
+    def on_progress(finished, total):
+        if progress_callback is not None:
+            progress_callback.emit(("Calculating Boundaries",
+                                    50 + 25 * finished // total))
+
+    # The workers only live for this calculation, so that they do not
+    # keep the dose volume in memory afterwards.
+    pool = WorkerProcessPool(
+        init_worker_dose, (dose_plane_cache.dataset_rtdose.pixel_array,
+                           dose_plane_cache.planes),
+        min(os.cpu_count() or 1, len(chunks)))
+    try:
+        results = pool.run_tasks(find_worker_isodose_boundaries, chunks,
+                                 interrupt_flag=interrupt_flag,
+                                 progress_callback=on_progress)
+    finally:
+        pool.shutdown()
+    if results is None:
+        return None
+
+    boundaries = {}
+    for result in results:
+        boundaries.update(result)
+    return boundaries
 
 
 def calculate_rx_dose_in_cgray(rtplan):
@@ -0,0 +1,183 @@
+import threading
+from collections import OrderedDict
+
+from PySide6 import QtCore, QtGui
+from skimage import measure
+
+from src.constants import ISODOSE_CACHE_SIZE, ISODOSE_PREFETCH_RADIUS
+from src.Model.DosePlaneCache import get_dose_plane_cache
+from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.Worker import Worker
+
+
+def calc_dose_polygons(dose_pixluts, contours):
+    """
+    Calculate a list of polygons to display for a given isodose.
+    :param dose_pixluts: lookup table (LUT) to get the image pixel values
+    :param contours: trace outline of the isodose to be displayed
+    :return: List of polygons of type QPolygonF.
+    """
+    list_polygons = []
+    for contour in contours:
+        # Slicing controls how many points considered for visualization
+        # Essentially affects sharpness of edges, fewer points equals
+        # "smoother" edges
+        points = contour[::2].astype(int)
+        x = dose_pixluts[0][points[:, 1]]
+        y = dose_pixluts[1][points[:, 0]]
+        list_polygons.append(QtGui.QPolygonF(
+            [QtCore.QPoint(x[i], y[i]) for i in range(len(points))]))
+    return list_polygons
+
+
+class IsodoseCache:
+    """
+    Cache of the isodose polygons displayed on the axial view, keyed by
+    (slice, isodose level, prescription dose). Polygons are calculated
+    the first time a slice is displayed, and the polygons of the
+    neighbouring slices are calculated in the background so that
+    scrolling through the slices does not have to wait for them.
+
+    The cache is bounded by the number of (slice, level) entries it
+    holds, evicting the least recently used first.
+    Example usage:
+    polygons = get_isodose_cache().get_polygons(slice_id, 50, rx_dose)
+    """
+
+    def __init__(self, dict_container, cache_size=ISODOSE_CACHE_SIZE,
+                 prefetch_radius=ISODOSE_PREFETCH_RADIUS):
+        """
+        :param dict_container: PatientDictContainer or MovingDictContainer
+            holding the image datasets, the RTDose and the dose pixluts.
+        :param cache_size: Maximum number of (slice, level) entries to
+            keep.
+        :param prefetch_radius: Number of slices either side of the
+            displayed slice to calculate in the background.
+        """
+        self.dict_container = dict_container
+        self.dataset_rtdose = dict_container.dataset['rtdose']
+        self.cache_size = cache_size
+        self.prefetch_radius = prefetch_radius
+
+        self._polygons = OrderedDict()
+        self._lock = threading.Lock()
+        self._prefetch_target = None
+
+        # Prefetching is done one slice at a time so that a burst of
+        # slider movements does not flood the global thread pool.
+        self._threadpool = QtCore.QThreadPool()
+        self._threadpool.setMaxThreadCount(1)
+
+    def get_polygons(self, slice_id, dose_level, rx_dose):
+        """
+        Get the polygons of an isodose level on a slice, calculating
+        them if they are not cached.
+        :param slice_id: Index of the axial slice.
+        :param dose_level: Isodose level, as a percentage of the
+            prescription dose.
+        :param rx_dose: Prescription dose in cGy.
+        :return: List of QPolygonF.
+        """
+        key = (slice_id, dose_level, rx_dose)
+        with self._lock:
+            if key in self._polygons:
+                self._polygons.move_to_end(key)
+                return self._polygons[key]
+
+        polygons = self.calculate_polygons(slice_id, [dose_level],
+                                           rx_dose)[dose_level]
+        self._store(key, polygons)
+        return polygons
+
+    def calculate_polygons(self, slice_id, dose_levels, rx_dose):
+        """
+        Calculate the polygons of isodose levels on a slice. The dose
+        grid of the slice is shared by every level. Safe to call from
+        any thread.
+        :param slice_id: Index of the axial slice.
+        :param dose_levels: Iterable of isodose levels, as percentages of
+            the prescription dose.
+        :param rx_dose: Prescription dose in cGy.
+        :return: Dictionary of lists of QPolygonF keyed by isodose level.
+        """
+        dict_polygons = {level: [] for level in dose_levels}
+        dataset = self.dict_container.dataset[slice_id]
+        z = dataset.ImagePositionPatient[2]
+        grid = get_dose_plane_cache(self.dict_container).get_dose_grid(z)
+        if grid is None or not grid.size:
+            return dict_polygons
+
+        dose_pixluts = \
+            self.dict_container.get("dose_pixluts")[dataset.SOPInstanceUID]
+        for level in dose_levels:
+            threshold = level * rx_dose / \
+                (self.dataset_rtdose.DoseGridScaling * 10000)
+            contours = measure.find_contours(grid, threshold)
+            dict_polygons[level] = calc_dose_polygons(dose_pixluts, contours)
+        return dict_polygons
+
+    def _store(self, key, polygons):
+        with self._lock:
+            self._polygons[key] = polygons
+            while len(self._polygons) > self.cache_size:
+                self._polygons.popitem(last=False)
+
+    def prefetch(self, slice_id, dose_levels, rx_dose):
+        """
+        Calculate the polygons of the neighbours of the given slice in
+        the background.
+        :param slice_id: Index of the slice the user is viewing.
+        :param dose_levels: Isodose levels being displayed.
+        :param rx_dose: Prescription dose in cGy.
+        """
+        if self.prefetch_radius <= 0:
+            return
+        target = (slice_id, tuple(dose_levels), rx_dose)
+        with self._lock:
+            self._prefetch_target = target
+        self._threadpool.start(Worker(self._prefetch_neighbours, target))
+
+    def _prefetch_neighbours(self, target):
+        slice_id, dose_levels, rx_dose = target
+        num_slices = len(self.dict_container.get("dict_uid"))
+        for offset in range(1, self.prefetch_radius + 1):
+            for neighbour in (slice_id + offset, slice_id - offset):
+                with self._lock:
+                    if self._prefetch_target != target:
+                        # The user has moved on to a different slice.
+                        return
+                    missing = [level for level in dose_levels
+                               if (neighbour, level, rx_dose)
+                               not in self._polygons]
+                if not 0 <= neighbour < num_slices or not missing:
+                    continue
+                dict_polygons = self.calculate_polygons(neighbour, missing,
+                                                        rx_dose)
+                for level, polygons in dict_polygons.items():
+                    self._store((neighbour, level, rx_dose), polygons)
+
+    def clear(self):
+        """
+        Remove every cached polygon.
+        """
+        with self._lock:
+            self._prefetch_target = None
+            self._polygons.clear()
+
+
+def get_isodose_cache(dict_container=None):
+    """
+    Get the isodose cache of a patient, creating it if it does not exist
+    or if the RTDose has changed.
+    :param dict_container: PatientDictContainer or MovingDictContainer
+        holding the RTDose. Defaults to the PatientDictContainer.
+    :return: IsodoseCache object.
+    """
+    if dict_container is None:
+        dict_container = PatientDictContainer()
+    cache = dict_container.get("isodose_cache")
+    if cache is None \
+            or cache.dataset_rtdose is not dict_container.dataset['rtdose']:
+        cache = IsodoseCache(dict_container)
+        dict_container.set("isodose_cache", cache)
+    return cache
@@ -25,6 +25,7 @@ class MovingDictContainer(metaclass=Singleton):
         self.path = None        # The path of the loaded directory.
         self.dataset = None     # Dictionary of PyDicom dataset objects.
         self.filepaths = None           # Dictionary of filepaths.
+        self._volume = None     # 3D numpy array of the image pixel data.
 
         # Any additional values that are required (e.g. rois, raw_dvh,
         # raw_contour, etc)
@@ -54,14 +55,33 @@ class MovingDictContainer(metaclass=Singleton):
         self.path = None
         self.dataset = None
         self.filepaths = None
+        self._volume = None
         self.additional_data = None
 
+    @property
+    def volume(self):
+        """
+        Read-only 3D numpy array of the pixel data of all image slices,
+        in the order (slices, rows, columns), with the rescale slope and
+        intercept applied. volume[i] is a view of slice i, not a copy.
+        """
+        return self._volume
+
+    def set_volume(self, volume):
+        """
+        Sets the image volume. The volume is made read-only so that it
+        can be safely shared by every view without being copied.
+        :param volume: 3D numpy array of the image pixel data.
+        """
+        volume.flags.writeable = False
+        self._volume = volume
+
     def is_empty(self):
         """
         :return: True if class is empty
         """
         if self.path is not None or self.dataset is not None \
-                or self.filepaths is not None \
+                or self.filepaths is not None or self._volume is not None \
                 or self.additional_data is not None:
             return False
 
@@ -1,8 +1,7 @@
 import os
-import SimpleITK as sitk
 import pydicom
 
-from src.Model.CalculateImages import convert_raw_data, get_pixmaps
+from src.Model.CalculateImages import get_volume, get_pixmaps
 from src.Model.GetPatientInfo import get_basic_info, DicomTree, \
     dict_instance_uid
 from src.Model.Isodose import get_dose_pixluts, calculate_rx_dose_in_cgray
@@ -13,7 +12,8 @@ from src.Model.MovingDictContainer import MovingDictContainer
 from src.Model.ROI import ordered_list_rois
 from src.Controller.PathHandler import resource_path
 
-from src.Model.ImageFusion import create_fused_model, get_fused_window
+from src.Model.ImageFusion import create_fused_model, create_sitk_image, \
+    get_fused_window
 
 
 def create_moving_model():
@@ -76,7 +76,8 @@ def create_moving_model():
 
     moving_dict_container.set("dict_windowing_moving", dict_windowing)
 
-    pixel_values = convert_raw_data(dataset)
+    volume, rescale = get_volume(dataset)
+    moving_dict_container.set_volume(volume)
     # Calculate the ratio between x axis and y axis of 3 views
     pixmap_aspect = {}
     pixel_spacing = dataset[0].PixelSpacing
@@ -85,12 +86,12 @@ def create_moving_model():
     pixmap_aspect["sagittal"] = pixel_spacing[1] / slice_thickness
     pixmap_aspect["coronal"] = slice_thickness / pixel_spacing[0]
     pixmaps_axial, pixmaps_coronal, pixmaps_sagittal = \
-        get_pixmaps(pixel_values, window, level, pixmap_aspect)
+        get_pixmaps(volume, window, level, pixmap_aspect, rescale)
 
     moving_dict_container.set("pixmaps_axial", pixmaps_axial)
     moving_dict_container.set("pixmaps_coronal", pixmaps_coronal)
     moving_dict_container.set("pixmaps_sagittal", pixmaps_sagittal)
-    moving_dict_container.set("pixel_values", pixel_values)
+    moving_dict_container.set("rescale", rescale)
     moving_dict_container.set("pixmap_aspect", pixmap_aspect)
 
     basic_info = get_basic_info(dataset[0])
@@ -134,14 +135,22 @@ def create_moving_model():
                                   dicom_tree_rtplan.dict)
 
 
-def read_images_for_fusion(level=0, window=0):
+def read_images_for_fusion(level=0, window=0, interrupt_flag=None,
+                           progress_callback=None):
     """
     Performs initial image fusion, this is by converting the old and
     new images for transformations, then creating the fusion object,
     then using the fusion object to generate a comparison color map and
-    storing the color map
+    storing the color map. This can take some time, so it should be
+    called on a worker thread.
     :param level: the level (midpoint) of windowing
     :param window: the window (range) of windowing
+    :param interrupt_flag: A threading.Event() object that stops the
+        registration when set.
+    :param progress_callback: A signal that receives the progress of the
+        registration.
+    :return: True if the images were fused, False if the registration was
+        interrupted.
     """
     patient_dict_container = PatientDictContainer()
     moving_dict_container = MovingDictContainer()
@@ -149,33 +158,21 @@ def read_images_for_fusion(level=0, window=0):
         level = patient_dict_container.get("level")
         window = patient_dict_container.get("window")
 
-    amount = len(patient_dict_container.filepaths)
-    orig_fusion_list = []
+    # Both series have already been read, so the images are created from
+    # their volumes rather than being read from disk again.
+    orig_image = create_sitk_image(patient_dict_container.volume,
+                                   patient_dict_container.dataset)
 
-    for i in range(amount):
-        try:
-            orig_fusion_list.append(patient_dict_container.filepaths[i])
-        except KeyError:
-            continue
+    new_image = create_sitk_image(moving_dict_container.volume,
+                                  moving_dict_container.dataset)
 
-    orig_image = sitk.ReadImage(orig_fusion_list)
-    patient_dict_container.set("sitk_original", orig_image)
-
-    amount = len(moving_dict_container.filepaths)
-    new_fusion_list = []
-
-    for i in range(amount):
-        try:
-            new_fusion_list.append(moving_dict_container.filepaths[i])
-        except KeyError:
-            continue
-
-    new_image = sitk.ReadImage(new_fusion_list)
-
-    create_fused_model(orig_image, new_image)
+    if not create_fused_model(orig_image, new_image, interrupt_flag,
+                              progress_callback):
+        return False
     color_axial, color_sagittal, color_coronal = \
         get_fused_window(level, window)
 
     patient_dict_container.set("color_axial", color_axial)
     patient_dict_container.set("color_sagittal", color_sagittal)
     patient_dict_container.set("color_coronal", color_coronal)
+    return True
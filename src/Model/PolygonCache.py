@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from src.constants import POLYGON_CACHE_SIZE
+from src.Model.ROI import calc_roi_polygon, calculate_roi_slice_pixels, \
+    get_roi_contour_pixel, transform_rois_contours
+
+
+class PolygonCache:
+    """
+    Cache of the polygons used to display ROIs, keyed by
+    (ROI number, plane, slice, pixmap aspect). Polygons are calculated
+    the first time a slice is displayed, and are kept when the ROI is
+    hidden so that displaying it again does not recalculate them.
+
+    The cache is bounded by the total number of polygon points it holds,
+    evicting the least recently used slices first. Entries of an ROI are
+    only invalidated when the contour data of that ROI changes.
+    """
+
+    def __init__(self, dict_container, cache_size=POLYGON_CACHE_SIZE):
+        """
+        :param dict_container: PatientDictContainer or MovingDictContainer
+            holding the ROIs, their contour data and the pixluts.
+        :param cache_size: Maximum number of polygon points to keep.
+        """
+        self.dict_container = dict_container
+        self.cache_size = cache_size
+        self._polygons = OrderedDict()
+        self._points = 0
+        # Coronal and sagittal contours of each ROI, which are calculated
+        # from the contours of every axial slice at once.
+        self._contours = {}
+        # Raw contour data each ROI was calculated from.
+        self._sources = {}
+
+    def get_polygons(self, roi_id, plane, slice_id, aspect=1):
+        """
+        Get the polygons of an ROI on a slice, calculating them if they
+        are not cached.
+        :param roi_id: ROI number
+        :param plane: 'axial', 'coronal' or 'sagittal'
+        :param slice_id: SOPInstanceUID of an axial slice, or the index
+            of a coronal or sagittal slice.
+        :param aspect: the scaling ratio of the plane
+        :return: List of polygons of type QPolygonF.
+        """
+        key = (roi_id, plane, slice_id, aspect)
+        if key in self._polygons:
+            self._polygons.move_to_end(key)
+            return self._polygons[key][0]
+
+        polygons = self.calculate_polygons(roi_id, plane, slice_id, aspect)
+        points = sum(polygon.size() for polygon in polygons)
+        self._polygons[key] = (polygons, points)
+        self._points += points
+        while self._points > self.cache_size and len(self._polygons) > 1:
+            _, (_, evicted_points) = self._polygons.popitem(last=False)
+            self._points -= evicted_points
+        return polygons
+
+    def calculate_polygons(self, roi_id, plane, slice_id, aspect=1):
+        """
+        Calculate the polygons of an ROI on a slice.
+        :param roi_id: ROI number
+        :param plane: 'axial', 'coronal' or 'sagittal'
+        :param slice_id: SOPInstanceUID of an axial slice, or the index
+            of a coronal or sagittal slice.
+        :param aspect: the scaling ratio of the plane
+        :return: List of polygons of type QPolygonF.
+        """
+        roi_name = self.dict_container.get("rois")[roi_id]['name']
+        raw_contour = self.dict_container.get("raw_contour")[roi_name]
+        self._sources[roi_id] = raw_contour
+
+        if plane == 'axial':
+            # Only the contours on this slice need to be converted.
+            if slice_id not in raw_contour:
+                return []
+            pixlut = self.dict_container.get("pixluts")[slice_id]
+            dict_rois_contours = {roi_name: {
+                slice_id: calculate_roi_slice_pixels(pixlut, raw_contour,
+                                                     slice_id)}}
+        else:
+            if roi_id not in self._contours:
+                dict_rois_contours_axial = get_roi_contour_pixel(
+                    self.dict_container.get("raw_contour"), [roi_name],
+                    self.dict_container.get("pixluts"))
+                self._contours[roi_id] = \
+                    transform_rois_contours(dict_rois_contours_axial)
+            dict_rois_contours_coronal, dict_rois_contours_sagittal = \
+                self._contours[roi_id]
+            if plane == 'coronal':
+                dict_rois_contours = dict_rois_contours_coronal
+            else:
+                dict_rois_contours = dict_rois_contours_sagittal
+
+        return calc_roi_polygon(roi_name, slice_id, dict_rois_contours,
+                                aspect)
+
+    def invalidate(self, roi_ids):
+        """
+        Remove every cached polygon of the given ROIs.
+        :param roi_ids: Iterable of ROI numbers
+        """
+        roi_ids = set(roi_ids)
+        for key in [key for key in self._polygons if key[0] in roi_ids]:
+            self._points -= self._polygons.pop(key)[1]
+        for roi_id in roi_ids:
+            self._contours.pop(roi_id, None)
+            self._sources.pop(roi_id, None)
+
+    def invalidate_changed(self):
+        """
+        Remove the cached polygons of every ROI that has been deleted,
+        or whose contour data has changed, since they were calculated.
+        Called after the RTSS has been modified.
+        """
+        rois = self.dict_container.get("rois")
+        raw_contour = self.dict_container.get("raw_contour")
+        changed = []
+        for roi_id, source in self._sources.items():
+            if roi_id not in rois or \
+                    raw_contour.get(rois[roi_id]['name']) != source:
+                changed.append(roi_id)
+        self.invalidate(changed)
+
+    def clear(self):
+        """
+        Remove every cached polygon.
+        """
+        self._polygons.clear()
+        self._points = 0
+        self._contours.clear()
+        self._sources.clear()
+
+
+class ROIPolygons(Mapping):
+    """
+    Read-only mapping of slice to the polygons of an ROI on that slice,
+    in one plane. Polygons are taken from a PolygonCache when a slice is
+    accessed.
+    """
+
+    def __init__(self, polygon_cache, roi_id, plane, slices, aspect=1):
+        """
+        :param polygon_cache: PolygonCache to take the polygons from
+        :param roi_id: ROI number
+        :param plane: 'axial', 'coronal' or 'sagittal'
+        :param slices: Iterable of the slices of the plane
+        :param aspect: the scaling ratio of the plane
+        """
+        self.polygon_cache = polygon_cache
+        self.roi_id = roi_id
+        self.plane = plane
+        self.slices = list(slices)
+        self._slice_set = set(self.slices)
+        self.aspect = aspect
+
+    def __len__(self):
+        return len(self.slices)
+
+    def __iter__(self):
+        return iter(self.slices)
+
+    def __contains__(self, slice_id):
+        return slice_id in self._slice_set
+
+    def __getitem__(self, slice_id):
+        if slice_id not in self._slice_set:
+            raise KeyError(slice_id)
+        return self.polygon_cache.get_polygons(self.roi_id, self.plane,
+                                               slice_id, self.aspect)
@@ -9,8 +9,10 @@ from pydicom import Dataset, Sequence
 from pydicom.dataset import FileMetaDataset, validate_file_meta
 from pydicom.tag import Tag
 from pydicom.uid import generate_uid, ImplicitVRLittleEndian
+from src.Model import ImageLoading
 from src.Model.CalculateImages import *
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.RTSSIndex import get_rtss_index
 from src.constants import DEFAULT_WINDOW_SIZE
 
 from src.Model.Transform import inv_linear_transform
@@ -25,13 +27,27 @@ def rename_roi(rtss, roi_id, new_name):
         ImageLoading.get_rois(..)
     :param new_name: The structure's new name
     """
-    for sequence in rtss.StructureSetROISequence:
-        if sequence.ROINumber == roi_id:
-            sequence.ROIName = new_name
+    rtss_index = get_rtss_index(rtss)
+    if rtss_index.get_structure_set(roi_id) is not None:
+        rtss_index.rename_roi(roi_id, new_name)
+        mark_rois_modified(roi_id)
 
     return rtss
 
 
+def mark_rois_modified(*roi_numbers):
+    """
+    Record that ROIs have been created, modified, renamed or deleted
+    since their DVHs were calculated, so that only the DVHs of these
+    ROIs have to be recalculated.
+    :param roi_numbers: ROI numbers of the modified ROIs.
+    """
+    patient_dict_container = PatientDictContainer()
+    dirty_rois = patient_dict_container.get("dvh_dirty_rois") or set()
+    dirty_rois.update(int(roi_number) for roi_number in roi_numbers)
+    patient_dict_container.set("dvh_dirty_rois", dirty_rois)
+
+
 def delete_list_of_rois(rtss, rois_to_delete):
     """
     Call the delete_roi function for each ROI in the given list.
@@ -52,23 +68,13 @@ def delete_roi(rtss, roi_name):
     :param roi_name: ROIName
     :return: rtss, updated rtss dataset
     """
-    # ROINumber
-    roi_number = -1
-    # Delete related StructureSetROISequence element
-    for i, elem in enumerate(rtss.StructureSetROISequence):
-        if elem.ROIName == roi_name:
-            roi_number = rtss.StructureSetROISequence[i].ROINumber
-            del rtss.StructureSetROISequence[i]
-
-    # Delete related ROIContourSequence element
-    for i, elem in enumerate(rtss.ROIContourSequence):
-        if elem.ReferencedROINumber == roi_number:
-            del rtss.ROIContourSequence[i]
-
-    # Delete related RTROIObservationsSequence element
-    for i, elem in enumerate(rtss.RTROIObservationsSequence):
-        if elem.ReferencedROINumber == roi_number:
-            del rtss.RTROIObservationsSequence[i]
+    # Delete the related StructureSetROISequence, ROIContourSequence and
+    # RTROIObservationsSequence elements
+    rtss_index = get_rtss_index(rtss)
+    roi_number = rtss_index.get_roi_number(roi_name)
+    if roi_number is not None:
+        rtss_index.remove_roi(roi_number)
+        mark_rois_modified(roi_number)
 
     return rtss
 
@@ -83,57 +89,14 @@ def add_to_roi(rtss, roi_name, roi_coordinates, data_set):
         :return: rtss, with added ROI
     """
 
-    # Creating a new ROIContourSequence, ContourSequence,
-    # ContourImageSequence
-    contour_sequence = Sequence([Dataset()])
-    contour_image_sequence = Sequence([Dataset()])
-
-    number_of_contour_points = len(roi_coordinates) / 3
-    referenced_sop_class_uid = data_set.SOPClassUID
-    referenced_sop_instance_uid = data_set.SOPInstanceUID
-
-    existing_roi_number = None
-    for item in rtss["StructureSetROISequence"]:
-        if item.ROIName == roi_name:
-            existing_roi_number = item.ROINumber
-
-    position = None
-
-    # Get the index of the ROI
-    for index, contour in enumerate(rtss.ROIContourSequence):
-        if contour.ReferencedROINumber == existing_roi_number:
-            position = index
-
-    new_contour_number = len(
-        rtss.ROIContourSequence[position].ContourSequence) + 1
-
-    # ROI Sequence
-    for contour in contour_sequence:
-        # if data_set.get("ReferencedImageSequence"):
-        contour.add_new(Tag("ContourImageSequence"),
-                        "SQ", contour_image_sequence)
-
-        # Contour Sequence
-        for contour_image in contour_image_sequence:
-            # CT Image Storage
-            contour_image.add_new(Tag("ReferencedSOPClassUID"), "UI",
-                                  referenced_sop_class_uid)
-            contour_image.add_new(Tag("ReferencedSOPInstanceUID"), "UI",
-                                  referenced_sop_instance_uid)
-
-        contour.add_new(Tag("ContourNumber"), "IS", new_contour_number)
-        if not _is_closed_contour(roi_coordinates):
-            contour.add_new(Tag("ContourGeometricType"), "CS", "OPEN_PLANAR")
-            contour.add_new(Tag("NumberOfContourPoints"), "IS",
-                            number_of_contour_points)
-            contour.add_new(Tag("ContourData"), "DS", roi_coordinates)
-        else:
-            contour.add_new(Tag("ContourGeometricType"), "CS", "CLOSED_PLANAR")
-            contour.add_new(Tag("NumberOfContourPoints"), "IS",
-                            number_of_contour_points - 1)
-            contour.add_new(Tag("ContourData"), "DS", roi_coordinates[0:-3])
+    # Get the ROIContourSequence element of the ROI
+    rtss_index = get_rtss_index(rtss)
+    existing_roi_number = rtss_index.get_roi_number(roi_name)
+    roi_contour = rtss_index.get_roi_contour(existing_roi_number)
 
-    rtss.ROIContourSequence[position].ContourSequence.extend(contour_sequence)
+    new_contour_number = len(roi_contour.ContourSequence) + 1
+    roi_contour.ContourSequence.append(
+        create_contour(roi_coordinates, data_set, new_contour_number))
 
     return rtss
 
@@ -172,9 +135,85 @@ def create_roi(rtss, roi_name, roi_list,
             # Add contour image data to existing ROI
             rtss = add_to_roi(rtss, roi_name, roi_coordinates, data_set)
 
+    if roi_list:
+        mark_rois_modified(get_rtss_index(rtss).get_roi_number(roi_name))
+
     return rtss
 
 
+def create_roi_from_contours(rtss, roi_name, roi_list,
+                             rt_roi_interpreted_type="ORGAN"):
+    """
+    Create an ROI from many contours at once. Unlike create_roi, the
+    sequences of the rtss are only searched once, and every contour is
+    added to the ROIContourSequence item of the ROI in a single step.
+    :param rtss: dataset of RTSS
+    :param roi_name: ROIName
+    :param roi_list: the list of contours to be added to the rtss.
+        Each element consists of coordinates of pixels for new
+        contour and data set of selected DICOM image file.
+    :param rt_roi_interpreted_type: the interpreted type
+        of the new ROI
+    :return: rtss, with added ROI
+    """
+    if not roi_list:
+        return rtss
+
+    rtss_index = get_rtss_index(rtss)
+    roi_number = rtss_index.get_roi_number(roi_name)
+
+    remaining = roi_list
+    if roi_number is None:
+        rtss = add_new_roi(rtss, roi_name, roi_list[0]['coords'],
+                           roi_list[0]['ds'], rt_roi_interpreted_type)
+        roi_number = rtss_index.get_roi_number(roi_name)
+        remaining = roi_list[1:]
+
+    roi_contour = rtss_index.get_roi_contour(roi_number)
+
+    first_contour_number = len(roi_contour.ContourSequence) + 1
+    roi_contour.ContourSequence.extend(
+        create_contour(roi_info['coords'], roi_info['ds'],
+                       first_contour_number + i)
+        for i, roi_info in enumerate(remaining))
+
+    mark_rois_modified(roi_number)
+    return rtss
+
+
+def create_contour(roi_coordinates, data_set, contour_number):
+    """
+    Create an item of the ContourSequence of an ROI.
+    :param roi_coordinates: Coordinates of pixels of the contour
+    :param data_set: Data Set of the DICOM image file of the contour
+    :param contour_number: ContourNumber of the contour
+    :return: Dataset of the contour
+    """
+    number_of_contour_points = len(roi_coordinates) / 3
+
+    contour_image = Dataset()
+    contour_image.add_new(Tag("ReferencedSOPClassUID"), "UI",
+                          data_set.SOPClassUID)
+    contour_image.add_new(Tag("ReferencedSOPInstanceUID"), "UI",
+                          data_set.SOPInstanceUID)
+
+    contour = Dataset()
+    contour.add_new(Tag("ContourImageSequence"), "SQ",
+                    Sequence([contour_image]))
+    contour.add_new(Tag("ContourNumber"), "IS", contour_number)
+    if not _is_closed_contour(roi_coordinates):
+        contour.add_new(Tag("ContourGeometricType"), "CS", "OPEN_PLANAR")
+        contour.add_new(Tag("NumberOfContourPoints"), "IS",
+                        number_of_contour_points)
+        contour.add_new(Tag("ContourData"), "DS", roi_coordinates)
+    else:
+        contour.add_new(Tag("ContourGeometricType"), "CS", "CLOSED_PLANAR")
+        contour.add_new(Tag("NumberOfContourPoints"), "IS",
+                        number_of_contour_points - 1)
+        contour.add_new(Tag("ContourData"), "DS", roi_coordinates[0:-3])
+    return contour
+
+
 def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
                 rt_roi_interpreted_type):
     """
@@ -187,9 +226,7 @@ def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
                 of the new ROI
             :return: rtss, with added ROI
             """
-    number_of_contour_points = len(roi_coordinates) / 3
-    referenced_sop_class_uid = data_set.SOPClassUID
-    referenced_sop_instance_uid = data_set.SOPInstanceUID
+    rtss_index = get_rtss_index(rtss)
 
     # Check if there is any ROIs in rtss
     if not len(rtss["StructureSetROISequence"].value):
@@ -225,11 +262,10 @@ def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
     rtss.add_new(Tag("StructureSetROISequence"), "SQ",
                  original_structure_set)
 
-    # Saving a new ROIContourSequence, ContourSequence,
-    # ContourImageSequence
+    # Saving a new ROIContourSequence and ContourSequence
     roi_contour_sequence = Sequence([Dataset()])
-    contour_sequence = Sequence([Dataset()])
-    contour_image_sequence = Sequence([Dataset()])
+    contour_sequence = Sequence([
+        create_contour(roi_coordinates, data_set, 1)])
 
     # Original File
     original_roi_contour = rtss.ROIContourSequence
@@ -238,36 +274,6 @@ def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
     for roi_contour in roi_contour_sequence:
         roi_contour.add_new(Tag("ROIDisplayColor"), "IS", rgb)
         roi_contour.add_new(Tag("ContourSequence"), "SQ", contour_sequence)
-
-        # ROI Sequence
-        for contour in contour_sequence:
-            # if data_set.get("ReferencedImageSequence"):
-            contour.add_new(Tag("ContourImageSequence"), "SQ",
-                            contour_image_sequence)
-
-            # Contour Sequence
-            for contour_image in contour_image_sequence:
-                contour_image.add_new(
-                    Tag("ReferencedSOPClassUID"), "UI",
-                    referenced_sop_class_uid)  # CT Image Storage
-                contour_image.add_new(Tag("ReferencedSOPInstanceUID"),
-                                      "UI", referenced_sop_instance_uid)
-
-            contour.add_new(Tag("ContourNumber"), "IS", 1)
-            if not _is_closed_contour(roi_coordinates):
-                contour.add_new(Tag("ContourGeometricType"), "CS",
-                                "OPEN_PLANAR")
-                contour.add_new(Tag("NumberOfContourPoints"), "IS",
-                                number_of_contour_points)
-                contour.add_new(Tag("ContourData"), "DS", roi_coordinates)
-            else:
-                contour.add_new(Tag("ContourGeometricType"), "CS",
-                                "CLOSED_PLANAR")
-                contour.add_new(Tag("NumberOfContourPoints"), "IS",
-                                number_of_contour_points - 1)
-                contour.add_new(Tag("ContourData"), "DS",
-                                roi_coordinates[0:-3])
-
         roi_contour.add_new(Tag("ReferencedROINumber"), "IS", roi_number)
 
     # Combine original ROIContourSequence with new
@@ -296,6 +302,9 @@ def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
     original_roi_observation_sequence.extend(rt_roi_observations_sequence)
     rtss.add_new(Tag("RTROIObservationsSequence"), "SQ",
                  original_roi_observation_sequence)
+
+    rtss_index.add_roi(structure_set_sequence[0], roi_contour_sequence[0],
+                       rt_roi_observations_sequence[0])
     return rtss
 
 
@@ -319,35 +328,10 @@ def get_raw_contour_data(rtss):
     """
     Get raw contour data of ROI in RT Structure Set
     :param rtss: RTSS dataset
-    :return: dict_roi, a dictionary of ROI contours; dict_num_points,
-        number of points of contours.
-    """
-    # Retrieve a dictionary of roi_name & ROINumber pairs
-    dict_id = {}
-    for i, elem in enumerate(rtss.StructureSetROISequence):
-        roi_number = elem.ROINumber
-        roi_name = elem.ROIName
-        dict_id[roi_number] = roi_name
-
-    dict_roi = {}
-    dict_num_points = {}
-    for roi in rtss.ROIContourSequence:
-        referenced_roi_number = roi.ReferencedROINumber
-        roi_name = dict_id[referenced_roi_number]
-        dict_contour = collections.defaultdict(list)
-        roi_points_count = 0
-        for roi_slice in roi.ContourSequence:
-            referenced_sop_instance_uid = None
-            for contour_img in roi_slice.ContourImageSequence:
-                referenced_sop_instance_uid = \
-                    contour_img.ReferencedSOPInstanceUID
-            number_of_contour_points = roi_slice.NumberOfContourPoints
-            roi_points_count += int(number_of_contour_points)
-            contour_data = roi_slice.ContourData
-            dict_contour[referenced_sop_instance_uid].append(contour_data)
-        dict_roi[roi_name] = dict_contour
-        dict_num_points[roi_name] = roi_points_count
-    return dict_roi, dict_num_points
+    :return: dict_roi, a dictionary of ROI contours (ROIContours objects);
+        dict_num_points, number of points of contours.
+    """
+    return ImageLoading.get_raw_contour_data(rtss)
 
 
 def calculate_matrix(img_ds):
@@ -357,61 +341,7 @@ def calculate_matrix(img_ds):
     :return: pair of numpy arrays that represents the transformation
         matrix
     """
-    # Physical distance (in mm) between the center of each image pixel,
-    # specified by a numeric pair
-    # - adjacent row spacing (delimiter) adjacent column spacing.
-    dist_row = img_ds.PixelSpacing[0]
-    dist_col = img_ds.PixelSpacing[1]
-    # The direction cosines of the first row and the first column with
-    # respect to the patient.
-    # 6 values inside: [Xx, Xy, Xz, Yx, Yy, Yz]
-    orientation = img_ds.ImageOrientationPatient
-    # The x, y, and z coordinates of the upper left hand corner
-    # (center of the first voxel transmitted) of the image, in mm.
-    # 3 values: [Sx, Sy, Sz]
-    position = img_ds.ImagePositionPatient
-
-    # Equation C.7.6.2.1-1.
-    # https://dicom.innolitics.com/ciods/rt-structure-set/roi-contour/30060039/30060040/30060050
-    matrix_m = np.ndarray(
-        shape=(4, 4),
-        buffer=np.array(
-            [
-                [orientation[0] * dist_row, orientation[3] * dist_col, 0,
-                 position[0]],
-                [orientation[1] * dist_row, orientation[4] * dist_col, 0,
-                 position[1]],
-                [orientation[2] * dist_row, orientation[5] * dist_col, 0,
-                 position[2]],
-                [0, 0, 0, 1],
-            ],
-            dtype=float,
-        ),
-    )
-
-    x = []
-    y = []
-    for i in range(0, img_ds.Columns):
-        i_mat = np.matmul(
-            matrix_m,
-            np.ndarray(
-                shape=(4, 1),
-                buffer=np.array([[i], [0], [0], [1]], dtype=float)
-            ),
-        )
-        x.append(float(i_mat[0]))
-
-    for j in range(0, img_ds.Rows):
-        j_mat = np.matmul(
-            matrix_m,
-            np.ndarray(
-                shape=(4, 1),
-                buffer=np.array([[0], [j], [0], [1]], dtype=float)
-            ),
-        )
-        y.append(float(j_mat[1]))
-
-    return np.array(x), np.array(y)
+    return ImageLoading.calculate_matrix(img_ds)
 
 
 def get_pixluts(dict_ds):
@@ -420,14 +350,60 @@ def get_pixluts(dict_ds):
     :param dict_ds: a dictionary of all the datasets
     :return: a dictionary of transformation matrices
     """
-    dict_pixluts = {}
-    non_img_type = ["rtdose", "rtplan", "rtss"]
-    for ds in dict_ds:
-        if ds not in non_img_type:
-            img_ds = dict_ds[ds]
-            pixlut = calculate_matrix(img_ds)
-            dict_pixluts[img_ds.SOPInstanceUID] = pixlut
-    return dict_pixluts
+    return ImageLoading.get_pixluts(dict_ds)
+
+
+def contour_to_points(contour):
+    """
+    Reshape raw contour data into an array of points.
+    :param contour: raw contour data (3D), a flat sequence of
+        x, y, z triplets
+    :return: numpy array of shape (N, 3)
+    """
+    return np.asarray(contour, dtype=float).reshape(-1, 3)
+
+
+def lut_indices(lut, values, inclusive=False):
+    """
+    Find, for every value, the index of the first entry of a LUT that is
+    greater than (or equal to, if inclusive) the value. Values past the
+    end of the LUT are mapped to 0.
+    :param lut: one dimensional LUT of coordinates
+    :param values: numpy array of coordinates to look up
+    :param inclusive: compare using >= instead of >
+    :return: numpy array of indices
+    """
+    lut = np.asarray(lut, dtype=float)
+    if len(lut) == 0:
+        return np.zeros(len(values), dtype=int)
+    if np.all(lut[1:] >= lut[:-1]):
+        # Pixluts are ascending for head first supine images, so every
+        # value can be looked up with a binary search.
+        indices = np.searchsorted(lut, values,
+                                  side='left' if inclusive else 'right')
+        indices[indices == len(lut)] = 0
+        return indices
+    if inclusive:
+        mask = lut[np.newaxis, :] >= values[:, np.newaxis]
+    else:
+        mask = lut[np.newaxis, :] > values[:, np.newaxis]
+    return np.argmax(mask, axis=1)
+
+
+def points_to_pixels(pixlut, points, prone=False, feetfirst=False):
+    """
+    Calculate (Convert) an array of contour points to pixels at once.
+    :param pixlut: transformation matrix
+    :param points: numpy array of shape (N, 3) of contour points
+    :param prone: label of prone
+    :param feetfirst: label of feetfirst or head first
+    :return: numpy array of shape (N, 2) of contour pixels
+    """
+    pixels = np.empty((len(points), 2), dtype=int)
+    pixels[:, 0] = lut_indices(pixlut[0], points[:, 0],
+                               inclusive=feetfirst or prone)
+    pixels[:, 1] = lut_indices(pixlut[1], points[:, 1], inclusive=prone)
+    return pixels
 
 
 def calculate_pixels(pixlut, contour, prone=False, feetfirst=False):
@@ -439,33 +415,8 @@ def calculate_pixels(pixlut, contour, prone=False, feetfirst=False):
     :param feetfirst: label of feetfirst or head first
     :return: contour pixels
     """
-    pixels = []
-
-    np_x = np.array(pixlut[0])
-    np_y = np.array(pixlut[1])
-    if not feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmax(np_x > con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmin(np_y < con_y)
-            pixels.append([x, y])
-
-    return pixels
+    return points_to_pixels(pixlut, contour_to_points(contour),
+                            prone, feetfirst).tolist()
 
 
 def calculate_pixels_sagittal(pixlut, contour, prone=False, feetfirst=False):
@@ -476,35 +427,50 @@ def calculate_pixels_sagittal(pixlut, contour, prone=False, feetfirst=False):
     :param prone: label of prone
     :param feetfirst: label of feetfirst or head first
     :return: contour pixels
-    Parameters
-    ----------
-    contour : object
     """
-    pixels = []
-    np_x = np.array(pixlut[0])
-    np_y = np.array(pixlut[1])
-    if not feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmax(np_x > con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmin(np_y < con_y)
-            pixels.append([x, y])
-    return pixels
+    return calculate_pixels(pixlut, contour, prone, feetfirst)
+
+
+def calculate_slice_pixels(pixlut, contours, prone=False, feetfirst=False):
+    """
+    Calculate (Convert) all contours of a slice with a single lookup.
+    :param pixlut: transformation matrix
+    :param contours: list of raw contour data (3D)
+    :param prone: label of prone
+    :param feetfirst: label of feetfirst or head first
+    :return: list of contour pixels, one per contour
+    """
+    if not contours:
+        return []
+    points = [contour_to_points(contour) for contour in contours]
+    pixels = points_to_pixels(pixlut, np.concatenate(points),
+                              prone, feetfirst).tolist()
+    contour_pixels = []
+    start = 0
+    for contour_points in points:
+        contour_pixels.append(pixels[start:start + len(contour_points)])
+        start += len(contour_points)
+    return contour_pixels
+
+
+def calculate_roi_slice_pixels(pixlut, roi_contours, slice_uid, prone=False,
+                               feetfirst=False):
+    """
+    Calculate (Convert) all contours of an ROI on a slice with a single
+    lookup, reading the points straight from the contour store.
+    :param pixlut: transformation matrix
+    :param roi_contours: ROIContours of the ROI
+    :param slice_uid: SOPInstanceUID of the slice
+    :param prone: label of prone
+    :param feetfirst: label of feetfirst or head first
+    :return: list of contour pixels, one per contour
+    """
+    points, offsets = roi_contours.get_slice_points(slice_uid)
+    if not len(points):
+        return []
+    pixels = points_to_pixels(pixlut, points, prone, feetfirst).tolist()
+    return [pixels[offsets[i]:offsets[i + 1]]
+            for i in range(len(offsets) - 1)]
 
 
 def pixel_to_rcs(pixlut, x, y):
@@ -553,12 +519,9 @@ def get_contour_pixel(
         # slice
         dict_pixels_of_roi = collections.defaultdict(list)
         raw_contours = dict_raw_contour_data[roi]
-        number_of_contours = len(raw_contours[curr_slice])
-        for i in range(number_of_contours):
-            contour_pixels = calculate_pixels(
-                pixlut, raw_contours[curr_slice][i], prone, feetfirst
-            )
-            dict_pixels_of_roi[curr_slice].append(contour_pixels)
+        if curr_slice in raw_contours:
+            dict_pixels_of_roi[curr_slice] = calculate_roi_slice_pixels(
+                pixlut, raw_contours, curr_slice, prone, feetfirst)
         dict_pixels[roi] = dict_pixels_of_roi
 
     return dict_pixels
@@ -579,11 +542,8 @@ def get_roi_contour_pixel(dict_raw_contour_data, roi_list, dict_pixluts):
         raw_contour = dict_raw_contour_data[roi]
         for roi_slice in raw_contour:
             pixlut = dict_pixluts[roi_slice]
-            number_of_contours = len(raw_contour[roi_slice])
-            for i in range(number_of_contours):
-                contour_pixels = calculate_pixels(pixlut,
-                                                  raw_contour[roi_slice][i])
-                dict_pixels_of_roi[roi_slice].append(contour_pixels)
+            dict_pixels_of_roi[roi_slice] = calculate_roi_slice_pixels(
+                pixlut, raw_contour, roi_slice)
         dict_pixels[roi] = dict_pixels_of_roi
     return dict_pixels
 
@@ -591,7 +551,8 @@ def get_roi_contour_pixel(dict_raw_contour_data, roi_list, dict_pixluts):
 def transform_rois_contours(axial_rois_contours):
     """
        Transform the axial ROI contours into coronal and sagittal
-       contours
+       contours. Each coronal (sagittal) contour is the outline of the
+       intersection of the ROI with a row (column) of the axial slices.
        :param axial_rois_contours: the dictionary of axial ROI contours
        :return: Tuple of coronal and sagittal ROI contours
     """
@@ -600,30 +561,147 @@ def transform_rois_contours(axial_rois_contours):
     slice_ids = dict((v, k) for k, v
                      in PatientDictContainer().get("dict_uid").items())
     for name in axial_rois_contours.keys():
-        coronal_rois_contours[name] = {}
-        sagittal_rois_contours[name] = {}
-        for slice_id in slice_ids:
-            contours = axial_rois_contours[name][slice_id]
+        edges = []
+        for slice_uid, contours in axial_rois_contours[name].items():
+            if slice_uid not in slice_ids:
+                continue
             for contour in contours:
-                for i in range(len(contour)):
-                    if contour[i][1] in coronal_rois_contours[name]:
-                        coronal_rois_contours[name][contour[i][1]][0]\
-                            .append([contour[i][0], slice_ids[slice_id]])
-                    else:
-                        coronal_rois_contours[name][contour[i][1]] = [[]]
-                        coronal_rois_contours[name][contour[i][1]][0]\
-                            .append([contour[i][0], slice_ids[slice_id]])
-
-                    if contour[i][0] in sagittal_rois_contours[name]:
-                        sagittal_rois_contours[name][contour[i][0]][0]\
-                            .append([contour[i][1], slice_ids[slice_id]])
-                    else:
-                        sagittal_rois_contours[name][contour[i][0]] = [[]]
-                        sagittal_rois_contours[name][contour[i][0]][0]\
-                            .append([contour[i][1], slice_ids[slice_id]])
+                edges.append(get_contour_edges(contour,
+                                               slice_ids[slice_uid]))
+        if edges:
+            edges = np.concatenate(edges)
+        else:
+            edges = np.empty((0, 5))
+        coronal_rois_contours[name] = reslice_contours(edges, 1)
+        sagittal_rois_contours[name] = reslice_contours(edges, 0)
     return coronal_rois_contours, sagittal_rois_contours
 
 
+def get_contour_edges(contour, slice_index):
+    """
+    Get the edges of a closed contour.
+    :param contour: list of [x, y] pixels of an axial contour
+    :param slice_index: index of the axial slice of the contour
+    :return: numpy array of shape (N, 5) of the x, y of the start, the
+        x, y of the end and the slice index of each edge
+    """
+    points = np.asarray(contour, dtype=float).reshape(-1, 2)
+    if len(points) < 2:
+        return np.empty((0, 5))
+    ends = np.roll(points, -1, axis=0)
+    return np.column_stack(
+        (points, ends, np.full(len(points), slice_index, dtype=float)))
+
+
+def reslice_contours(edges, axis):
+    """
+    Intersect the edges of axial contours with the coronal or sagittal
+    planes, and build the outlines of the intersections.
+    :param edges: numpy array of edges as returned by
+        get_contour_edges(..)
+    :param axis: 1 to intersect with rows (coronal planes), 0 to
+        intersect with columns (sagittal planes)
+    :return: dictionary where keys are plane indices and values are
+        lists of outlines, each a list of [position, slice index] points
+    """
+    a_start, a_end = edges[:, axis], edges[:, 2 + axis]
+    b_start, b_end = edges[:, 1 - axis], edges[:, 3 - axis]
+
+    # An edge crosses every plane in [min, max) of its coordinates, so
+    # that a vertex shared by two edges is only counted once.
+    first = np.ceil(np.minimum(a_start, a_end)).astype(int)
+    last = np.ceil(np.maximum(a_start, a_end)).astype(int)
+    counts = np.maximum(last - first, 0)
+    total = int(counts.sum())
+    if not total:
+        return {}
+    edge_index = np.repeat(np.arange(len(edges)), counts)
+    planes = np.repeat(first, counts) + np.arange(total) \
+        - np.repeat(np.cumsum(counts) - counts, counts)
+    fraction = (planes - a_start[edge_index]) \
+        / (a_end - a_start)[edge_index]
+    positions = b_start[edge_index] \
+        + fraction * (b_end - b_start)[edge_index]
+    slices = edges[edge_index, 4].astype(int)
+
+    # Sort the crossings by plane, slice and position, so that the
+    # crossings of a plane and slice pair up into the intervals that are
+    # inside the contours.
+    order = np.lexsort((positions, slices, planes))
+    planes, slices, positions = \
+        planes[order], slices[order], positions[order]
+    new_group = np.ones(total, dtype=bool)
+    new_group[1:] = (planes[1:] != planes[:-1]) | (slices[1:] != slices[:-1])
+    group_start = np.maximum.accumulate(
+        np.where(new_group, np.arange(total), 0))
+    group_end = np.append(np.flatnonzero(new_group)[1:], total)
+    group_end = group_end[np.cumsum(new_group) - 1]
+    rank = np.arange(total) - group_start
+    starts = np.flatnonzero((rank % 2 == 0) & (np.arange(total) + 1
+                                                < group_end))
+
+    if not len(starts):
+        return {}
+
+    positions = np.rint(positions).astype(int)
+    plane_boundaries = np.flatnonzero(
+        np.diff(planes[starts], prepend=planes[starts][0] - 1))
+    dict_contours = {}
+    for i, boundary in enumerate(plane_boundaries):
+        end = plane_boundaries[i + 1] if i + 1 < len(plane_boundaries) \
+            else len(starts)
+        interval_starts = starts[boundary:end]
+        dict_contours[int(planes[interval_starts[0]])] = build_outlines(
+            slices[interval_starts].tolist(),
+            positions[interval_starts].tolist(),
+            positions[interval_starts + 1].tolist())
+    return dict_contours
+
+
+def build_outlines(slices, starts, ends):
+    """
+    Join the intervals of a plane on consecutive slices into outlines.
+    Intervals on consecutive slices that overlap belong to the same
+    outline.
+    :param slices: slice index of each interval, in ascending order
+    :param starts: start position of each interval
+    :param ends: end position of each interval
+    :return: list of outlines, each a list of [position, slice index]
+        points going up the starts and back down the ends
+    """
+    chains = []
+    previous = []
+    current = []
+    current_slice = None
+    for slice_index, start, end in zip(slices, starts, ends):
+        if slice_index != current_slice:
+            if current_slice is not None \
+                    and slice_index == current_slice + 1:
+                previous = current
+            else:
+                previous = []
+            current = []
+            current_slice = slice_index
+        for chain in previous:
+            _, last_start, last_end = chain[-1]
+            if start <= last_end and end >= last_start:
+                previous.remove(chain)
+                break
+        else:
+            chain = []
+            chains.append(chain)
+        chain.append((slice_index, start, end))
+        current.append(chain)
+
+    outlines = []
+    for chain in chains:
+        outline = [[start, slice_index] for slice_index, start, _ in chain]
+        outline.extend([end, slice_index]
+                       for slice_index, _, end in reversed(chain))
+        outlines.append(outline)
+    return outlines
+
+
 def calc_roi_polygon(curr_roi, curr_slice, dict_rois_contours,
                      pixmap_aspect=1):
     """
@@ -872,25 +950,12 @@ def merge_rtss(old_rtss, new_rtss, duplicated_names):
     new_roi_contour = new_rtss.ROIContourSequence
     new_roi_observation_sequence = new_rtss.RTROIObservationsSequence
 
-    # Get the indexes of duplicated ROIs
-    old_duplicated_roi_indexes = {}
-    index = 0
-    for structure_set in original_structure_set:
-        if structure_set.ROIName in duplicated_names:
-            old_duplicated_roi_indexes[structure_set.ROIName] = index
-        index += 1
-
-    # Remove old values out of the original sequences
-    rm_indices = [old_duplicated_roi_indexes[name]
-                  for name in duplicated_names]
-    for index in sorted(rm_indices, reverse=True):
-        # Remove the old value out of the original structure set
-        # sequence
-        original_structure_set.pop(index)
-        # Remove the old value out of the original contour sequence
-        original_roi_contour.pop(index)
-        # Remove the old value out of the original observation sequence
-        original_roi_observation_sequence.pop(index)
+    # Remove the duplicated ROIs out of the original sequences
+    rtss_index = get_rtss_index(old_rtss)
+    for name in duplicated_names:
+        roi_number = rtss_index.get_roi_number(name)
+        if roi_number is not None:
+            rtss_index.remove_roi(roi_number)
 
     # Merge the original sequences with the new sequences
     original_structure_set.extend(new_structure_set)
@@ -910,6 +975,9 @@ def merge_rtss(old_rtss, new_rtss, duplicated_names):
     old_rtss.add_new(Tag("RTROIObservationsSequence"), "SQ",
                      original_roi_observation_sequence)
 
+    # ROIs have been renumbered
+    rtss_index.rebuild()
+
     return old_rtss
 
 
@@ -0,0 +1,158 @@
+from src.Model.PatientDictContainer import PatientDictContainer
+
+
+class RTSSIndex:
+    """
+    Index of the ROIs of an RTSTRUCT dataset, so that the items of the
+    StructureSetROISequence, ROIContourSequence and
+    RTROIObservationsSequence of an ROI can be found by ROI number or
+    name without searching the sequences.
+
+    The index is kept in sync by the functions of ROI that add, rename
+    and delete ROIs. If the number of items of a sequence no longer
+    matches the index (e.g. the dataset was changed elsewhere), the index
+    is rebuilt the next time it is requested through get_rtss_index(..)
+    Example usage:
+    roi_contour = get_rtss_index(rtss).get_roi_contour(roi_number)
+    """
+
+    def __init__(self, rtss):
+        """
+        :param rtss: RTSTRUCT DICOM dataset object.
+        """
+        self.rtss = rtss
+        self.structure_sets = {}
+        self.roi_contours = {}
+        self.observations = {}
+        self.numbers = {}
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Index every ROI of the dataset.
+        """
+        self.structure_sets.clear()
+        self.roi_contours.clear()
+        self.observations.clear()
+        self.numbers.clear()
+        for item in self.rtss.get("StructureSetROISequence", []):
+            self.structure_sets[int(item.ROINumber)] = item
+            self.numbers[item.ROIName] = int(item.ROINumber)
+        for item in self.rtss.get("ROIContourSequence", []):
+            self.roi_contours[int(item.ReferencedROINumber)] = item
+        for item in self.rtss.get("RTROIObservationsSequence", []):
+            self.observations[int(item.ReferencedROINumber)] = item
+
+    def is_valid(self):
+        """
+        :return: True if the number of items in each sequence of the
+            dataset matches the index.
+        """
+        return len(self.rtss.get("StructureSetROISequence", [])) \
+            == len(self.structure_sets) \
+            and len(self.rtss.get("ROIContourSequence", [])) \
+            == len(self.roi_contours) \
+            and len(self.rtss.get("RTROIObservationsSequence", [])) \
+            == len(self.observations)
+
+    def get_roi_number(self, roi_name):
+        """
+        :param roi_name: ROIName
+        :return: ROINumber of the ROI, or None if there is no ROI with
+            the name.
+        """
+        return self.numbers.get(roi_name)
+
+    def get_structure_set(self, roi_number):
+        """
+        :param roi_number: ROINumber
+        :return: StructureSetROISequence item of the ROI, or None
+        """
+        return self.structure_sets.get(int(roi_number))
+
+    def get_roi_contour(self, roi_number):
+        """
+        :param roi_number: ROINumber
+        :return: ROIContourSequence item of the ROI, or None
+        """
+        return self.roi_contours.get(int(roi_number))
+
+    def get_observation(self, roi_number):
+        """
+        :param roi_number: ROINumber
+        :return: RTROIObservationsSequence item of the ROI, or None
+        """
+        return self.observations.get(int(roi_number))
+
+    def add_roi(self, structure_set, roi_contour, observation):
+        """
+        Index an ROI that has been added to the dataset.
+        :param structure_set: StructureSetROISequence item of the ROI
+        :param roi_contour: ROIContourSequence item of the ROI
+        :param observation: RTROIObservationsSequence item of the ROI
+        """
+        roi_number = int(structure_set.ROINumber)
+        self.structure_sets[roi_number] = structure_set
+        self.numbers[structure_set.ROIName] = roi_number
+        self.roi_contours[roi_number] = roi_contour
+        self.observations[roi_number] = observation
+
+    def rename_roi(self, roi_number, new_name):
+        """
+        Rename an ROI of the dataset.
+        :param roi_number: ROINumber
+        :param new_name: The ROI's new name
+        """
+        structure_set = self.structure_sets[int(roi_number)]
+        if self.numbers.get(structure_set.ROIName) == int(roi_number):
+            del self.numbers[structure_set.ROIName]
+        structure_set.ROIName = new_name
+        self.numbers[new_name] = int(roi_number)
+
+    def remove_roi(self, roi_number):
+        """
+        Delete an ROI from the dataset.
+        :param roi_number: ROINumber
+        """
+        roi_number = int(roi_number)
+        structure_set = self.structure_sets.pop(roi_number, None)
+        if structure_set is not None:
+            if self.numbers.get(structure_set.ROIName) == roi_number:
+                del self.numbers[structure_set.ROIName]
+            remove_item(self.rtss.StructureSetROISequence, structure_set)
+        roi_contour = self.roi_contours.pop(roi_number, None)
+        if roi_contour is not None:
+            remove_item(self.rtss.ROIContourSequence, roi_contour)
+        observation = self.observations.pop(roi_number, None)
+        if observation is not None:
+            remove_item(self.rtss.RTROIObservationsSequence, observation)
+
+
+def remove_item(sequence, item):
+    """
+    Remove an item from a sequence. Items are compared by identity, as
+    comparing datasets compares every element of them.
+    :param sequence: pydicom Sequence
+    :param item: Item of the sequence
+    """
+    for i, element in enumerate(sequence):
+        if element is item:
+            del sequence[i]
+            return
+
+
+def get_rtss_index(rtss):
+    """
+    Get the index of an RTSTRUCT dataset, building it if the dataset has
+    not been indexed yet or if the index is out of date.
+    :param rtss: RTSTRUCT DICOM dataset object.
+    :return: RTSSIndex object.
+    """
+    patient_dict_container = PatientDictContainer()
+    index = patient_dict_container.get("rtss_index")
+    if index is None or index.rtss is not rtss:
+        index = RTSSIndex(rtss)
+        patient_dict_container.set("rtss_index", index)
+    elif not index.is_valid():
+        index.rebuild()
+    return index
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from src.Model.Configuration import set_up_hidden_dir
+from src.Model.Singleton import Singleton
+
+# Version of the image registration. Changing it invalidates every
+# transform in the cache, and should be done whenever the registration
+# changes.
+TRANSFORM_CACHE_VERSION = 1
+
+
+class TransformCache(metaclass=Singleton):
+    """
+    This Singleton class represents a persistent cache of the transforms
+    calculated by image fusion, so two series do not need to be
+    registered again when they are fused a second time.
+
+    Each transform is stored as the 4x4 matrix written to the REG file,
+    under a key that is a hash of the SeriesInstanceUIDs of the fixed and
+    moving series and of the registration parameters.
+
+    The cache is stored in a SQLite database in the hidden directory,
+    alongside the Configuration database. If the database can not be
+    used, images are registered as if they were not cached.
+    Example usage:
+    cache = TransformCache()
+    """
+
+    def __init__(self, db_file='TransformCache.db'):
+        set_up_hidden_dir()
+        self.db_file_path = Path(
+            os.environ['USER_ONKODICOM_HIDDEN']).joinpath(db_file)
+        self.set_up_cache_db()
+
+    def set_up_cache_db(self):
+        """
+        Create the TRANSFORM_CACHE table inside the SQLite database
+        """
+        connection = sqlite3.connect(self.db_file_path)
+        connection.execute("""
+                    CREATE TABLE IF NOT EXISTS TRANSFORM_CACHE (
+                        key TEXT PRIMARY KEY,
+                        matrix BLOB
+                    );
+                """)
+        connection.commit()
+        connection.close()
+
+    @staticmethod
+    def get_key(fixed_series_uid, moving_series_uid, shrink_factors,
+                smooth_sigmas, number_of_iterations):
+        """
+        Calculate the cache key of the transform between two series.
+        :param fixed_series_uid: SeriesInstanceUID of the fixed series.
+        :param moving_series_uid: SeriesInstanceUID of the moving series.
+        :param shrink_factors: Shrink factor of each level of the
+            registration pyramid.
+        :param smooth_sigmas: Smoothing sigma of each level of the
+            registration pyramid.
+        :param number_of_iterations: Maximum number of iterations of each
+            level.
+        :return: The cache key.
+        """
+        key = "%s|%s|%s|%r|%r|%r" % (
+            TRANSFORM_CACHE_VERSION, fixed_series_uid, moving_series_uid,
+            [int(factor) for factor in shrink_factors],
+            [float(sigma) for sigma in smooth_sigmas],
+            int(number_of_iterations))
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get_transform(self, key):
+        """
+        Get a cached transform.
+        :param key: Cache key, as returned by get_key(..)
+        :return: 4x4 numpy array of the transform, or None if it is not
+            cached.
+        """
+        try:
+            connection = sqlite3.connect(self.db_file_path)
+            row = connection.execute(
+                "SELECT matrix FROM TRANSFORM_CACHE WHERE key = ?;",
+                (key,)).fetchone()
+            connection.close()
+        except sqlite3.Error:
+            logging.exception("Unable to read the transform cache")
+            return None
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=float).reshape(4, 4).copy()
+
+    def update_transform(self, key, affine_matrix):
+        """
+        Add a calculated transform to the cache.
+        :param key: Cache key, as returned by get_key(..)
+        :param affine_matrix: 4x4 numpy array of the transform.
+        """
+        matrix = np.asarray(affine_matrix, dtype=float).reshape(4, 4)
+        try:
+            connection = sqlite3.connect(self.db_file_path)
+            connection.execute(
+                "INSERT OR REPLACE INTO TRANSFORM_CACHE (key, matrix) "
+                "VALUES (?, ?);", (key, matrix.tobytes()))
+            connection.commit()
+            connection.close()
+        except sqlite3.Error:
+            logging.exception("Unable to update the transform cache")
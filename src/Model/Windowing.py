@@ -0,0 +1,75 @@
+"""
+Lookup table (LUT) based windowing of image pixel data.
+
+Rather than performing floating point arithmetic on every pixel each time
+a slice is displayed, a 65536 entry LUT mapping every possible int16
+pixel value to its 8-bit display value is calculated once per (window,
+level) pair. Windowing a slice is then a single vectorised gather into
+that table.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+# Number of (window, level) LUTs to keep. Each LUT is 64 KiB.
+LUT_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=LUT_CACHE_SIZE)
+def get_window_lut(window, level):
+    """
+    Calculate the display LUT for a window and level.
+
+    The LUT is indexed by the int16 pixel values reinterpreted as
+    uint16, so that it can be applied without first copying the pixel
+    data to a wider integer type.
+
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :return: Read-only uint8 numpy array with 65536 entries.
+    """
+    if window == 0:
+        window = 1
+    values = np.arange(65536, dtype=np.uint16).view(np.int16)
+    lut = (values.astype(np.float32) - level) / window * 255
+    np.clip(lut, 0, 255, out=lut)
+    lut = lut.astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def apply_window(np_pixels, window, level, rescale=(1, 0)):
+    """
+    Apply windowing to pixel data. int16 pixel data is windowed using a
+    precomputed LUT, any other pixel data (e.g. a float volume of a
+    series with a fractional rescale slope) falls back to vectorised
+    floating point arithmetic. If either the window or level is 0, the
+    full range of the pixel data is used instead.
+
+    :param np_pixels: Numpy array of pixel data. Any shape, ideally
+        int16 so that the LUT can be used.
+    :param window: Window width of windowing function, in stored pixel
+        values
+    :param level: Level value of windowing function, in stored pixel
+        values
+    :param rescale: Tuple (slope, intercept) of the rescale that has
+        already been applied to np_pixels. The window and level are
+        converted accordingly so the displayed image is unchanged.
+    :return: uint8 numpy array of the same shape as np_pixels.
+    """
+    if window == 0 or level == 0:
+        max_val = np.amax(np_pixels)
+        min_val = np.amin(np_pixels)
+        window, level = max_val - min_val, min_val
+    else:
+        slope, intercept = rescale
+        window = window * slope
+        level = level * slope + intercept
+
+    if np_pixels.dtype != np.int16:
+        np_pixels = (np_pixels - level) / (window if window else 1) * 255
+        np.clip(np_pixels, 0, 255, out=np_pixels)
+        return np_pixels.astype(np.uint8)
+
+    lut = get_window_lut(int(window), int(level))
+    return lut[np_pixels.view(np.uint16)]
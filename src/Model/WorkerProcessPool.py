@@ -0,0 +1,128 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+class WorkerProcessPool:
+    """
+    Persistent pool of worker processes that runs the tasks of
+    calculations (e.g. the DVHs of a structure set, or the isodose
+    boundaries of ISO2ROI). The worker processes are started when the
+    first tasks are run, and are reused by every later calculation until
+    the pool is shut down, or until the arguments of its initializer
+    change.
+
+    Data that every task needs is sent to each worker once, through the
+    initializer, rather than along with each task. Workers are started
+    with the platform's default start method, so the pool is used on
+    spawn-based platforms (Windows and macOS) too.
+    Example usage:
+    results = WorkerProcessPool().run_tasks(pow, [(2, 8), (3, 2)])
+    """
+
+    def __init__(self, initializer=None, initargs=(), max_workers=None):
+        """
+        :param initializer: Function called by each worker process when it
+            starts.
+        :param initargs: Arguments of the initializer.
+        :param max_workers: Maximum number of worker processes. Defaults
+            to the CPU count.
+        """
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def set_initargs(self, initargs):
+        """
+        Change the arguments of the initializer. The current worker
+        processes are shut down, so the workers of the next tasks are
+        started with the new arguments.
+        :param initargs: Arguments of the initializer.
+        """
+        with self.lock:
+            self.initargs = initargs
+            self._shutdown_executor()
+
+    def shutdown(self):
+        """
+        Shut down the worker processes. Tasks that are already running are
+        left to finish in the background, and the workers exit afterwards.
+        The pool starts new workers if it is used again.
+        """
+        with self.lock:
+            self._shutdown_executor()
+
+    def _shutdown_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def get_executor(self):
+        """
+        :return: The ProcessPoolExecutor of the pool, which is created if
+            the pool has no worker processes.
+        """
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=self.initializer, initargs=self.initargs)
+            return self.executor
+
+    def run_tasks(self, fn, task_args, num_tasks=None, interrupt_flag=None,
+                  progress_callback=None):
+        """
+        Run a function on the worker processes once for each set of
+        arguments. At most two tasks per worker are submitted at a time,
+        so task_args can be a generator that prepares the arguments of a
+        task only when it is about to be submitted.
+        :param fn: Module level function to run.
+        :param task_args: Iterable of tuples of the arguments of each task.
+        :param num_tasks: Number of tasks. Defaults to len(task_args).
+        :param interrupt_flag: A threading.Event() object that cancels the
+            remaining tasks when set.
+        :param progress_callback: Function called with the number of
+            finished tasks and the number of tasks whenever tasks finish.
+        :return: List of the results of the tasks in the order of
+            task_args, or None if the calculation was interrupted.
+        """
+        if num_tasks is None:
+            task_args = list(task_args)
+            num_tasks = len(task_args)
+        if not num_tasks:
+            return []
+
+        executor = self.get_executor()
+        task_args = enumerate(task_args)
+        pending = set()
+        indices = {}
+        results = [None] * num_tasks
+        finished = 0
+        try:
+            while True:
+                while len(pending) < 2 * self.max_workers:
+                    index, args = next(task_args, (None, None))
+                    if args is None:
+                        break
+                    future = executor.submit(fn, *args)
+                    indices[future] = index
+                    pending.add(future)
+                if not pending:
+                    return results
+
+                done, pending = wait(pending, timeout=0.1,
+                                     return_when=FIRST_COMPLETED)
+                if interrupt_flag is not None and interrupt_flag.is_set():
+                    return None
+                for future in done:
+                    results[indices.pop(future)] = future.result()
+                finished += len(done)
+                if done and progress_callback is not None:
+                    progress_callback(finished, num_tasks)
+        finally:
+            # Tasks that are already running are left to finish in the
+            # background, and the workers are kept for the next tasks.
+            for future in pending:
+                future.cancel()
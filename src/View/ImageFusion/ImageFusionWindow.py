@@ -8,6 +8,7 @@ from PySide6.QtWidgets import QWidget, QTreeWidget, QTreeWidgetItem, \
     QLabel, QLineEdit, QSizePolicy, QPushButton
 
 from src.Model import DICOMDirectorySearch
+from src.Model.DICOMIndex import DICOMIndex
 from src.Model.Worker import Worker
 from src.View.ImageFusion.ImageFusionProgressWindow \
     import ImageFusionProgressWindow
@@ -323,7 +324,8 @@ class UIImageFusionWindow(object):
             # Then, create a new thread that will load the selected folder
             worker = Worker(DICOMDirectorySearch.get_dicom_structure,
                             self.filepath,
-                            self.interrupt_flag, progress_callback=True)
+                            self.interrupt_flag, index=DICOMIndex(),
+                            progress_callback=True)
             worker.signals.result.connect(self.on_search_complete)
             worker.signals.progress.connect(self.search_progress)
 
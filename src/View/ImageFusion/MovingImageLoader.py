@@ -1,5 +1,4 @@
 import os
-import platform
 from pathlib import Path
 
 from PySide6 import QtCore
@@ -7,7 +6,8 @@ from pydicom import dcmread
 
 from src.Model import ImageLoading
 from src.Model.MovingDictContainer import MovingDictContainer
-from src.Model.MovingModel import create_moving_model
+from src.Model.MovingModel import create_moving_model, \
+    read_images_for_fusion
 from src.Model.ROI import create_initial_rtss_from_ct
 from src.Model.GetPatientInfo import DicomTree
 
@@ -42,7 +42,7 @@ class MovingImageLoader(ImageLoader):
             # Gets the common root folder.
             path = os.path.dirname(os.path.commonprefix(self.selected_files))
             read_data_dict, file_names_dict = ImageLoading.get_datasets(
-                self.selected_files)
+                self.selected_files, progress_callback)
         except ImageLoading.NotAllowedClassError:
             raise ImageLoading.NotAllowedClassError
 
@@ -106,26 +106,12 @@ class MovingImageLoader(ImageLoader):
             if 'rtdose' in file_names_dict and self.calc_dvh:
                 dataset_rtdose = dcmread(file_names_dict['rtdose'])
 
-                # Spawn-based platforms (i.e Windows and MacOS) have a large
-                # overhead when creating a new process, which ends up making
-                # multiprocessing on these platforms more expensive than linear
-                # calculation. As such, multiprocessing is only available on
-                # Linux until a better solution is found.
-                fork_safe_platforms = ['Linux']
-                if platform.system() in fork_safe_platforms:
-                    progress_callback.emit(("Calculating DVHs...", 60))
-                    raw_dvh = ImageLoading.multi_calc_dvh(dataset_rtss,
-                                                          dataset_rtdose,
-                                                          rois,
-                                                          dict_thickness)
-                else:
-                    progress_callback.emit(
-                        ("Calculating DVHs... (This may take a while)", 60))
-                    raw_dvh = ImageLoading.calc_dvhs(dataset_rtss,
-                                                     dataset_rtdose,
-                                                     rois,
-                                                     dict_thickness,
-                                                     interrupt_flag)
+                progress_callback.emit(("Calculating DVHs...", 60))
+                raw_dvh = ImageLoading.multi_calc_dvh(dataset_rtss,
+                                                      dataset_rtdose,
+                                                      rois,
+                                                      dict_thickness,
+                                                      interrupt_flag)
 
                 if interrupt_flag.is_set():  # Stop loading.
                     print("stopped")
@@ -149,4 +135,12 @@ class MovingImageLoader(ImageLoader):
             progress_callback.emit(("Stopping", 85))
             return False
 
+        # Register the images on this thread so that the registration can
+        # be stopped by closing the progress window.
+        progress_callback.emit(("Registering Images...", 85))
+        if not read_images_for_fusion(interrupt_flag=interrupt_flag,
+                                      progress_callback=progress_callback):
+            progress_callback.emit(("Stopping", 85))
+            return False
+
         return True
@@ -1,5 +1,4 @@
 import os
-import platform
 from pathlib import Path
 
 from PySide6 import QtCore
@@ -7,6 +6,7 @@ from pydicom import dcmread
 
 from src.Model import ImageLoading
 from src.Model.CalculateDVHs import dvh2rtdose, rtdose2dvh
+from src.Model.DVHCache import DVHCache
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.ROI import create_initial_rtss_from_ct
 from src.Model.GetPatientInfo import DicomTree
@@ -40,7 +40,7 @@ class ImageLoader(QtCore.QObject):
             # Gets the common root folder.
             path = os.path.dirname(os.path.commonprefix(self.selected_files))
             read_data_dict, file_names_dict = ImageLoading.get_datasets(
-                self.selected_files)
+                self.selected_files, progress_callback)
         except ImageLoading.NotAllowedClassError:
             raise ImageLoading.NotAllowedClassError
 
@@ -106,6 +106,20 @@ class ImageLoader(QtCore.QObject):
                 except KeyError:
                     pass
 
+                # If the DVHs of every ROI were calculated when the patient
+                # was previously opened, use them instead of asking.
+                dvh_cache_keys = DVHCache.get_keys(
+                    dataset_rtss, read_data_dict['rtdose'].SOPInstanceUID,
+                    rois, dict_thickness)
+                raw_dvh = ImageLoading.get_cached_dvhs(dvh_cache_keys, rois)
+                if raw_dvh and len(raw_dvh) == len(rois):
+                    progress_callback.emit(("Loading cached DVHs...", 60))
+                    patient_dict_container.set("raw_dvh", raw_dvh)
+                    patient_dict_container.set(
+                        "dvh_x_y", ImageLoading.converge_to_0_dvh(raw_dvh))
+                    patient_dict_container.set("dvh_outdated", False)
+                    return True
+
                 self.parent_window.signal_advise_calc_dvh.connect(
                     self.update_calc_dvh)
                 self.signal_request_calc_dvh.emit()
@@ -117,28 +131,12 @@ class ImageLoader(QtCore.QObject):
                 if self.calc_dvh:
                     dataset_rtdose = dcmread(file_names_dict['rtdose'])
 
-                    # Spawn-based platforms (i.e Windows and MacOS) have
-                    # a large overhead when creating a new process, which
-                    # ends up making multiprocessing on these platforms more
-                    # expensive than linear calculation. As such,
-                    # multiprocessing is only available on Linux until a better
-                    # solution is found.
-                    fork_safe_platforms = ['Linux']
-                    if platform.system() in fork_safe_platforms:
-                        progress_callback.emit(("Calculating DVHs...", 60))
-                        raw_dvh = \
-                            ImageLoading.multi_calc_dvh(dataset_rtss,
-                                                        dataset_rtdose, rois,
-                                                        dict_thickness)
-                    else:
-                        progress_callback.emit(
-                            ("Calculating DVHs... (This may take a while)",
-                             60))
-                        raw_dvh = \
-                            ImageLoading.calc_dvhs(dataset_rtss,
-                                                   dataset_rtdose, rois,
-                                                   dict_thickness,
-                                                   interrupt_flag)
+                    progress_callback.emit(("Calculating DVHs...", 60))
+                    raw_dvh = \
+                        ImageLoading.multi_calc_dvh(dataset_rtss,
+                                                    dataset_rtdose, rois,
+                                                    dict_thickness,
+                                                    interrupt_flag)
 
                     if interrupt_flag.is_set():  # Stop loading.
                         return False
@@ -7,6 +7,7 @@ from PySide6.QtWidgets import QWidget, QTreeWidget, QTreeWidgetItem, QMessageBox
     QLabel, QLineEdit, QSizePolicy, QPushButton
 
 from src.Model import DICOMDirectorySearch
+from src.Model.DICOMIndex import DICOMIndex
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.Worker import Worker
 from src.View.OpenPatientProgressWindow import OpenPatientProgressWindow
@@ -165,6 +166,9 @@ class UIOpenPatientWindow(object):
         print("Multithreading with maximum %d threads" % self.threadpool.maxThreadCount())
         # Create interrupt event for stopping the directory search
         self.interrupt_flag = threading.Event()
+        # Structure of the directory from the index of its last search,
+        # displayed while the directory is being searched again
+        self.indexed_structure = None
 
         # Bind all texts into the buttons and labels
         self.retranslate_ui(open_patient_window_instance)
@@ -208,8 +212,18 @@ class UIOpenPatientWindow(object):
             # First, clear the widget of any existing data
             self.open_patient_window_patients_tree.clear()
 
-            # Next, update the tree widget
-            self.open_patient_window_patients_tree.addTopLevelItem(QTreeWidgetItem(["Loading selected directory..."]))
+            # Next, update the tree widget. If the directory has been
+            # searched before, the result of that search is shown
+            # straight away while the directory is checked for changes.
+            self.indexed_structure = DICOMDirectorySearch.get_indexed_dicom_structure(
+                self.filepath, DICOMIndex())
+            if len(self.indexed_structure.patients) > 0:
+                for patient_item in self.indexed_structure.get_tree_items_list():
+                    self.open_patient_window_patients_tree.addTopLevelItem(patient_item)
+            else:
+                self.indexed_structure = None
+                self.open_patient_window_patients_tree.addTopLevelItem(
+                    QTreeWidgetItem(["Loading selected directory..."]))
 
             # The choose button is disabled until the thread finishes executing
             self.open_patient_directory_choose_button.setEnabled(False)
@@ -222,7 +236,7 @@ class UIOpenPatientWindow(object):
 
             # Then, create a new thread that will load the selected folder
             worker = Worker(DICOMDirectorySearch.get_dicom_structure, self.filepath,
-                            self.interrupt_flag, progress_callback=True)
+                            self.interrupt_flag, index=DICOMIndex(), progress_callback=True)
             worker.signals.result.connect(self.on_search_complete)
             worker.signals.progress.connect(self.search_progress)
 
@@ -246,6 +260,10 @@ class UIOpenPatientWindow(object):
         """
         Current progress of the file search.
         """
+        # Keep displaying the indexed structure rather than the progress
+        if self.indexed_structure is not None:
+            return
+
         self.open_patient_window_patients_tree.clear()
         self.open_patient_window_patients_tree.addTopLevelItem(QTreeWidgetItem(["Loading selected directory... (%s files searched)"
                                                           % progress_update]))
@@ -257,11 +275,22 @@ class UIOpenPatientWindow(object):
         """
         self.open_patient_directory_choose_button.setEnabled(True)
         self.open_patient_window_stop_button.setVisible(False)
-        self.open_patient_window_patients_tree.clear()
+        indexed_structure = self.indexed_structure
+        self.indexed_structure = None
 
         if dicom_structure is None:  # dicom_structure will be None if function was interrupted.
+            if indexed_structure is None:
+                self.open_patient_window_patients_tree.clear()
             return
 
+        # The tree only needs to be rebuilt if a file was re-read or
+        # removed since the directory was indexed, so that any items the
+        # user has already checked stay checked.
+        if indexed_structure is not None and not dicom_structure.changed:
+            return
+
+        self.open_patient_window_patients_tree.clear()
+
         for patient_item in dicom_structure.get_tree_items_list():
             self.open_patient_window_patients_tree.addTopLevelItem(patient_item)
 
@@ -339,20 +339,32 @@ class CalculateDVHProgressWindow(QtWidgets.QDialog):
 
         dict_thickness = ImageLoading.get_thickness_dict(dataset_rtss, self.patient_dict_container.dataset)
 
+        # If DVHs have already been calculated, only recalculate the DVHs
+        # of ROIs that have been modified since, and of ROIs without one.
+        self.dirty_rois = set(self.patient_dict_container.get("dvh_dirty_rois") or ())
+        self.raw_dvh = self.patient_dict_container.get("raw_dvh")
+        self.dvh_x_y = self.patient_dict_container.get("dvh_x_y")
+        self.rois = rois
+        if self.raw_dvh is not None and self.dvh_x_y is not None:
+            rois = ImageLoading.get_dirty_rois(rois, self.raw_dvh, self.dirty_rois)
+
         interrupt_flag = threading.Event()
-        fork_safe_platforms = ['Linux']
-        if platform.system() in fork_safe_platforms:
-            worker = Worker(ImageLoading.multi_calc_dvh, dataset_rtss, dataset_rtdose, rois, dict_thickness)
-        else:
-            worker = Worker(ImageLoading.calc_dvhs, dataset_rtss, dataset_rtdose, rois, dict_thickness, interrupt_flag)
+        worker = Worker(ImageLoading.multi_calc_dvh, dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                        interrupt_flag)
 
         worker.signals.result.connect(self.dvh_calculated)
 
         self.threadpool.start(worker)
 
     def dvh_calculated(self, result):
-        dvh_x_y = ImageLoading.converge_to_0_dvh(result)
-        self.patient_dict_container.set("raw_dvh", result)
+        if self.raw_dvh is not None and self.dvh_x_y is not None:
+            raw_dvh, dvh_x_y = ImageLoading.merge_dvhs(self.rois, self.raw_dvh, self.dvh_x_y, result)
+        else:
+            raw_dvh = result
+            dvh_x_y = ImageLoading.converge_to_0_dvh(result)
+        self.patient_dict_container.set("raw_dvh", raw_dvh)
         self.patient_dict_container.set("dvh_x_y", dvh_x_y)
+        dirty_rois = self.patient_dict_container.get("dvh_dirty_rois") or set()
+        self.patient_dict_container.set("dvh_dirty_rois", dirty_rois - self.dirty_rois)
         self.signal_dvh_calculated.emit()
         self.close()
@@ -1,8 +1,7 @@
 from PySide6 import QtWidgets, QtCore, QtGui
-from skimage import measure
 
 from src.View.mainpage.DicomView import DicomView
-from src.Model.Isodose import get_dose_grid
+from src.Model.IsodoseCache import calc_dose_polygons, get_isodose_cache
 from src.Controller.PathHandler import resource_path
 
 
@@ -238,42 +237,37 @@ class DicomAxialView(DicomView):
         Display isodoses on the DICOM Image.
         """
         slider_id = self.slider.value()
-        curr_slice_uid = self.patient_dict_container.get("dict_uid")[slider_id]
-        z = self.patient_dict_container.dataset[slider_id].ImagePositionPatient[2]
-        dataset_rtdose = self.patient_dict_container.dataset['rtdose']
-        grid = get_dose_grid(dataset_rtdose, float(z))
-
-        if not (grid == []):
-            # sort selected_doses in ascending order so that the high dose isodose washes
-            # paint over the lower dose isodose washes
-            for sd in sorted(self.patient_dict_container.get("selected_doses")):
-                dose_level = sd * self.patient_dict_container.get("rx_dose_in_cgray") / \
-                    (dataset_rtdose.DoseGridScaling * 10000)
-                contours = measure.find_contours(grid, dose_level)
-
-                polygons = self.calc_dose_polygon(
-                    self.patient_dict_container.get("dose_pixluts")[curr_slice_uid], contours)
-
-                brush_color = self.iso_color[sd]
-                with open(resource_path('data/line&fill_configuration'), 'r') as stream:
-                    elements = stream.readlines()
-                    if len(elements) > 0:
-                        iso_line = int(elements[2].replace('\n', ''))
-                        iso_opacity = int(elements[3].replace('\n', ''))
-                        line_width = float(elements[4].replace('\n', ''))
-                    else:
-                        iso_line = 2
-                        iso_opacity = 5
-                        line_width = 2.0
-                    stream.close()
-                iso_opacity = int((iso_opacity / 100) * 255)
-                brush_color.setAlpha(iso_opacity)
-                pen_color = QtGui.QColor(
-                    brush_color.red(), brush_color.green(), brush_color.blue())
-                pen = self.get_qpen(pen_color, iso_line, line_width)
-                for i in range(len(polygons)):
-                    self.scene.addPolygon(
-                        polygons[i], pen, QtGui.QBrush(brush_color))
+        rx_dose = self.patient_dict_container.get("rx_dose_in_cgray")
+        isodose_cache = get_isodose_cache(self.patient_dict_container)
+
+        with open(resource_path('data/line&fill_configuration'), 'r') as stream:
+            elements = stream.readlines()
+            if len(elements) > 0:
+                iso_line = int(elements[2].replace('\n', ''))
+                iso_opacity = int(elements[3].replace('\n', ''))
+                line_width = float(elements[4].replace('\n', ''))
+            else:
+                iso_line = 2
+                iso_opacity = 5
+                line_width = 2.0
+        iso_opacity = int((iso_opacity / 100) * 255)
+
+        # sort selected_doses in ascending order so that the high dose isodose washes
+        # paint over the lower dose isodose washes
+        selected_doses = sorted(self.patient_dict_container.get("selected_doses"))
+        for sd in selected_doses:
+            polygons = isodose_cache.get_polygons(slider_id, sd, rx_dose)
+
+            brush_color = self.iso_color[sd]
+            brush_color.setAlpha(iso_opacity)
+            pen_color = QtGui.QColor(
+                brush_color.red(), brush_color.green(), brush_color.blue())
+            pen = self.get_qpen(pen_color, iso_line, line_width)
+            for i in range(len(polygons)):
+                self.scene.addPolygon(
+                    polygons[i], pen, QtGui.QBrush(brush_color))
+
+        isodose_cache.prefetch(slider_id, selected_doses, rx_dose)
 
     def calc_dose_polygon(self, dose_pixluts, contours):
         """
@@ -284,16 +278,4 @@ class DicomAxialView(DicomView):
           trace outline of the isodose to be displayed
         :return: List of polygons of type QPolygonF.
         """
-        list_polygons = []
-        for contour in contours:
-            list_qpoints = []
-            # Slicing controls how many points considered for visualization
-            # Essentially affects sharpness of edges, fewer points equals "smoother" edges
-            for point in contour[::2]:
-                curr_qpoint = QtCore.QPoint(
-                    dose_pixluts[0][int(point[1])], dose_pixluts[1][int(point[0])])
-                list_qpoints.append(curr_qpoint)
-            curr_polygon = QtGui.QPolygonF(list_qpoints)
-            list_polygons.append(curr_polygon)
-
-        return list_polygons
+        return calc_dose_polygons(dose_pixluts, contours)
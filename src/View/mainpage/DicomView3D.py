@@ -10,6 +10,7 @@ from vtkmodules.vtkRenderingCore import vtkColorTransferFunction, \
 from vtkmodules.vtkRenderingVolume import vtkFixedPointVolumeRayCastMapper
 
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.Windowing import apply_window
 from src.View.util.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 
 
@@ -55,19 +56,15 @@ class DicomView3D(QtWidgets.QWidget):
 
     def convert_pixel_values_to_vtk_3d_array(self):
         """
-        Scale pixel_values based on W/L and
+        Scale the image volume based on W/L and
         convert it to a vtk 3D array
         """
 
-        three_dimension_np_array = np.array(self.patient_dict_container.
-                                            additional_data["pixel_values"])
-        three_dimension_np_array = three_dimension_np_array.astype(np.int16)
-        three_dimension_np_array = (three_dimension_np_array -
-                                    (self.patient_dict_container.get("level"))) / \
-            self.patient_dict_container.get("window") * 255
-        three_dimension_np_array[three_dimension_np_array < 0] = 0
-        three_dimension_np_array[three_dimension_np_array > 255] = 255
-        three_dimension_np_array = three_dimension_np_array.astype(np.int8)
+        three_dimension_np_array = apply_window(
+            self.patient_dict_container.volume,
+            self.patient_dict_container.get("window"),
+            self.patient_dict_container.get("level"),
+            self.patient_dict_container.get("rescale")).view(np.int8)
         self.depth_array = numpy_support.numpy_to_vtk(three_dimension_np_array.
                                                       ravel(order="F"),
                                                       deep=True,
@@ -79,7 +76,7 @@ class DicomView3D(QtWidgets.QWidget):
         Update volume input data when window level is changed
         """
 
-        # Convert pixel_values in patient_dict_container into a 3D numpy array
+        # Convert the volume in patient_dict_container into a vtk 3D array
         self.convert_pixel_values_to_vtk_3d_array()
 
         # Convert 3d pixel array into vtkImageData to display as vtkVolume
@@ -97,7 +94,7 @@ class DicomView3D(QtWidgets.QWidget):
         Populate volume data
         """
 
-        # Convert pixel_values in patient_dict_container into a 3D numpy array
+        # Convert the volume in patient_dict_container into a vtk 3D array
         self.convert_pixel_values_to_vtk_3d_array()
 
         # Convert 3d pixel array into vtkImageData to display as vtkVolume
@@ -90,7 +90,7 @@ class Drawing(QtWidgets.QGraphicsScene):
             """pixel_array is a 2-Dimensional array containing all pixel 
             coordinates of the q_image. pixel_array[x][y] will return the 
             density of the pixel """
-            self.pixel_array = data_set._pixel_array
+            self.pixel_array = self.data.transpose()
             self.q_image = self.img.toImage()
             for y_coord in range(self.min_y, self.max_y):
                 for x_coord in range(self.min_x, self.max_x):
@@ -1,6 +1,6 @@
 import platform
+import re
 
-import pydicom
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtCore import Qt, QSize
 from PySide6.QtGui import QIcon, QPixmap
@@ -692,12 +692,11 @@ class UIDrawROIWindow:
         dt = self.patient_dict_container.dataset[id]
         rowS = dt.PixelSpacing[0]
         colS = dt.PixelSpacing[1]
-        dt.convert_pixel_data()
         MainPageCallClass().run_transect(
             self.draw_roi_window_instance,
             self.dicom_view.view,
             pixmaps[id],
-            dt._pixel_array.transpose(),
+            self.patient_dict_container.volume[id].transpose(),
             rowS,
             colS,
             is_roi_draw=True,
@@ -755,18 +754,15 @@ class UIDrawROIWindow:
             # Getting most updated selected slice
             id = self.current_slice
 
-            dt = self.patient_dict_container.dataset[id]
-            dt.convert_pixel_data()
-
-            # Path to the selected .dcm file
-            location = self.patient_dict_container.filepaths[id]
-            self.ds = pydicom.dcmread(location)
+            self.ds = self.patient_dict_container.dataset[id]
 
             min_pixel = self.min_pixel_density_line_edit.text()
             max_pixel = self.max_pixel_density_line_edit.text()
 
-            # If they are number inputs
-            if min_pixel.isdecimal() and max_pixel.isdecimal():
+            # If they are number inputs. Densities are in the units of the
+            # image volume (e.g. HU), so they can be negative.
+            if re.fullmatch(r"-?\d+", min_pixel) \
+                    and re.fullmatch(r"-?\d+", max_pixel):
 
                 min_pixel = int(min_pixel)
                 max_pixel = int(max_pixel)
@@ -779,7 +775,7 @@ class UIDrawROIWindow:
 
                 self.drawingROI = Drawing(
                     pixmaps[id],
-                    dt._pixel_array.transpose(),
+                    self.patient_dict_container.volume[id].transpose(),
                     min_pixel,
                     max_pixel,
                     self.patient_dict_container.dataset[id],
@@ -805,7 +801,6 @@ class UIDrawROIWindow:
         """
         id = self.current_slice
         dt = self.patient_dict_container.dataset[id]
-        dt.convert_pixel_data()
         pixmaps = self.patient_dict_container.get("pixmaps_axial")
 
         self.bounds_box_draw = DrawBoundingBox(pixmaps[id], dt)
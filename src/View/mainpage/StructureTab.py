@@ -11,8 +11,8 @@ from src.Model.CalculateDVHs import dvh2rtdose
 from src.Model.GetPatientInfo import DicomTree
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.MovingDictContainer import MovingDictContainer
-from src.Model.ROI import ordered_list_rois, get_roi_contour_pixel, \
-    calc_roi_polygon, transform_rois_contours, merge_rtss
+from src.Model.PolygonCache import PolygonCache, ROIPolygons
+from src.Model.ROI import ordered_list_rois, merge_rtss
 from src.View.mainpage.StructureWidget import StructureWidget
 from src.Controller.PathHandler import resource_path
 
@@ -250,6 +250,9 @@ class StructureTab(QtWidgets.QWidget):
         self.patient_dict_container.set("dict_polygons_axial", {})
         self.patient_dict_container.set("dict_polygons_sagittal", {})
         self.patient_dict_container.set("dict_polygons_coronal", {})
+        if self.patient_dict_container.has_attribute("polygon_cache"):
+            self.patient_dict_container.get(
+                "polygon_cache").invalidate_changed()
 
         if "draw" in change_description:
             dicom_tree_rtss = DicomTree(None)
@@ -352,7 +355,8 @@ class StructureTab(QtWidgets.QWidget):
     def update_dict_polygons(self, state, roi_id):
         """
         Update the polygon dictionaries (axial, coronal, sagittal) used to
-        display the ROIs.
+        display the ROIs. Polygons are calculated by the polygon cache the
+        first time each slice is displayed.
         :param state: True if the ROI is selected, False otherwise
         :param roi_id: ROI number
         """
@@ -367,36 +371,20 @@ class StructureTab(QtWidgets.QWidget):
         roi_name = rois[roi_id]['name']
 
         if state:
-            new_dict_polygons_axial[roi_name] = {}
-            new_dict_polygons_coronal[roi_name] = {}
-            new_dict_polygons_sagittal[roi_name] = {}
-            dict_rois_contours_axial = get_roi_contour_pixel(
-                self.patient_dict_container.get("raw_contour"),
-                [roi_name], self.patient_dict_container.get("pixluts"))
-            dict_rois_contours_coronal, dict_rois_contours_sagittal = \
-                transform_rois_contours(
-                    dict_rois_contours_axial)
-
-            for slice_id in self.patient_dict_container.get(
-                    "dict_uid").values():
-                polygons = calc_roi_polygon(roi_name, slice_id,
-                                            dict_rois_contours_axial)
-                new_dict_polygons_axial[roi_name][slice_id] = polygons
-
-            for slice_id in range(0, len(self.patient_dict_container.get(
-                    "pixmaps_coronal"))):
-                polygons_coronal = calc_roi_polygon(
-                    roi_name, slice_id,
-                    dict_rois_contours_coronal,
-                    aspect["coronal"])
-                polygons_sagittal = calc_roi_polygon(
-                    roi_name, slice_id,
-                    dict_rois_contours_sagittal,
-                    1 / aspect["sagittal"])
-                new_dict_polygons_coronal[roi_name][
-                    slice_id] = polygons_coronal
-                new_dict_polygons_sagittal[roi_name][
-                    slice_id] = polygons_sagittal
+            polygon_cache = self.get_polygon_cache()
+            new_dict_polygons_axial[roi_name] = ROIPolygons(
+                polygon_cache, roi_id, 'axial',
+                self.patient_dict_container.get("dict_uid").values())
+            new_dict_polygons_coronal[roi_name] = ROIPolygons(
+                polygon_cache, roi_id, 'coronal',
+                range(len(self.patient_dict_container.get(
+                    "pixmaps_coronal"))),
+                aspect["coronal"])
+            new_dict_polygons_sagittal[roi_name] = ROIPolygons(
+                polygon_cache, roi_id, 'sagittal',
+                range(len(self.patient_dict_container.get(
+                    "pixmaps_sagittal"))),
+                1 / aspect["sagittal"])
 
             self.patient_dict_container.set("dict_polygons_axial",
                                             new_dict_polygons_axial)
@@ -409,6 +397,18 @@ class StructureTab(QtWidgets.QWidget):
             new_dict_polygons_coronal.pop(roi_name, None)
             new_dict_polygons_sagittal.pop(roi_name, None)
 
+    def get_polygon_cache(self):
+        """
+        Get the polygon cache of the current patient, creating it the
+        first time it is needed. The cache is kept in the dict container
+        so that it is discarded when another patient is opened.
+        :return: PolygonCache object
+        """
+        if not self.patient_dict_container.has_attribute("polygon_cache"):
+            self.patient_dict_container.set(
+                "polygon_cache", PolygonCache(self.patient_dict_container))
+        return self.patient_dict_container.get("polygon_cache")
+
     def save_new_rtss(self, event=None, auto=False):
         """
         Save the current RTSS stored in patient dictionary to the file system.
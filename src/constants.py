@@ -2,3 +2,16 @@ DEFAULT_WINDOW_SIZE = 512
 INITIAL_ONE_VIEW_ZOOM = 1
 INITIAL_FOUR_VIEW_ZOOM = 0.5
 INITIAL_DRAWING_TOOL_RADIUS = 19
+PIXMAP_CACHE_SIZE = 64
+PIXMAP_PREFETCH_RADIUS = 2
+MEMORY_MAP_THRESHOLD = 512 * 1024 * 1024
+POLYGON_CACHE_SIZE = 2000000
+DOSE_PLANE_CACHE_SIZE = 128 * 1024 * 1024
+ISODOSE_CACHE_SIZE = 1024
+ISODOSE_PREFETCH_RADIUS = 2
+ISODOSE_SLICES_PER_TASK = 8
+DVH_CACHE_SIZE = 1000
+FUSION_COLOUR_ROTATION = 0.35
+REGISTRATION_SHRINK_FACTORS = (8, 4)
+REGISTRATION_SMOOTH_SIGMAS = (10, 5)
+REGISTRATION_ITERATIONS = 100
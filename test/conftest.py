@@ -1,10 +1,12 @@
 import os
 import sqlite3
+import sys
 from pathlib import Path
 import pytest
 from PySide6.QtWidgets import QApplication
 
 from src.Model.Configuration import Configuration
+from src.Model.Singleton import Singleton
 
 
 @pytest.fixture(scope="module", autouse=True)
@@ -22,3 +24,25 @@ def init_config(request):
 
     request.addfinalizer(tear_down)
     return connection
+
+
+@pytest.fixture
+def create_sqlite_cache(tmp_path_factory, monkeypatch):
+    """
+    Factory of Singleton SQLite caches (e.g. DVHCache) whose database is
+    in a temporary hidden directory instead of the user's. The cache is
+    the Singleton instance of its class until the end of the test, and
+    the previous instance, if any, is restored afterwards.
+    """
+    hidden_dir = tmp_path_factory.mktemp("hidden")
+
+    def create_cache(cache_class, *args, **kwargs):
+        monkeypatch.setenv('USER_ONKODICOM_HIDDEN', str(hidden_dir))
+        monkeypatch.setattr(sys.modules[cache_class.__module__],
+                            'set_up_hidden_dir', lambda: None)
+        # Bypass Singleton.__call__ so that a new instance is created
+        cache = type.__call__(cache_class, *args, **kwargs)
+        monkeypatch.setitem(Singleton._instances, cache_class, cache)
+        return cache
+
+    return create_cache
@@ -0,0 +1,72 @@
+import numpy as np
+from pydicom.dataelem import RawDataElement
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from src.Model.CalculateImages import PIXEL_DATA_TAG, get_volume
+from src.Model.ImageLoading import read_dataset
+
+
+def write_image(path, pixels, pixel_representation=1, intercept=-1024):
+    """
+    Write a CT image file.
+    :param path: Path of the file.
+    :param pixels: 2D numpy array of the stored pixel values.
+    :param pixel_representation: 1 if the pixels are signed, else 0.
+    :param intercept: RescaleIntercept of the image.
+    """
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = "CT"
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = pixel_representation
+    ds.RescaleSlope = 1
+    ds.RescaleIntercept = intercept
+    ds.PixelData = pixels.tobytes()
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.save_as(path, write_like_original=False)
+
+
+def test_volume_releases_deferred_pixel_data(tmp_path):
+    pixels = np.arange(128 * 128, dtype=np.int16).reshape(128, 128)
+    write_image(tmp_path / "image.dcm", pixels)
+    dataset = read_dataset(str(tmp_path / "image.dcm"))
+    assert dataset._dict[PIXEL_DATA_TAG].value is None
+
+    volume, _ = get_volume({0: dataset}, memory_map=False)
+
+    assert np.array_equal(volume[0], pixels.astype(np.int32) - 1024)
+    # The dataset no longer holds the pixel data read from the file
+    pixel_data = dataset._dict[PIXEL_DATA_TAG]
+    assert isinstance(pixel_data, RawDataElement)
+    assert pixel_data.value is None
+
+
+def test_volume_dtype_fits_stored_values(tmp_path):
+    # Unsigned 16 bit values above 32767 must not wrap around
+    pixels = np.array([[0, 1000], [40000, 65535]], dtype=np.uint16)
+    write_image(tmp_path / "mr.dcm", pixels, pixel_representation=0,
+                intercept=0)
+    volume, _ = get_volume({0: read_dataset(str(tmp_path / "mr.dcm"))},
+                           memory_map=False)
+    assert volume.dtype == np.int32
+    assert np.array_equal(volume[0], pixels)
+
+    # Signed 16 bit CT values with an intercept of 0 still fit an int16
+    pixels = np.array([[-1024, 0], [1000, 3000]], dtype=np.int16)
+    write_image(tmp_path / "ct.dcm", pixels, intercept=0)
+    volume, _ = get_volume({0: read_dataset(str(tmp_path / "ct.dcm"))},
+                           memory_map=False)
+    assert volume.dtype == np.int16
+    assert np.array_equal(volume[0], pixels)
@@ -0,0 +1,117 @@
+import os
+import threading
+from unittest import mock
+from unittest.mock import Mock
+
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from src.Model import DICOMDirectorySearch
+from src.Model.DICOMDirectorySearch import get_dicom_structure, \
+    get_indexed_dicom_structure, read_header
+from src.Model.DICOMIndex import DICOMIndex
+
+CT_IMAGE = "1.2.840.10008.5.1.4.1.1.2"
+
+
+def write_dicom_file(file_path, patient_id, study_uid, series_uid):
+    """Write a minimal CT image header to the given path."""
+    ds = Dataset()
+    ds.PatientID = patient_id
+    ds.PatientName = "Test^Patient"
+    ds.StudyInstanceUID = study_uid
+    ds.SeriesInstanceUID = series_uid
+    ds.SOPInstanceUID = generate_uid()
+    ds.SOPClassUID = CT_IMAGE
+    ds.Modality = "CT"
+
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = CT_IMAGE
+    ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.save_as(str(file_path), write_like_original=False)
+    return ds
+
+
+@pytest.fixture
+def dicom_directory(tmp_path):
+    study_uid = generate_uid()
+    series_uid = generate_uid()
+    (tmp_path / "sub").mkdir()
+    for i in range(4):
+        write_dicom_file(tmp_path / ("ct%s.dcm" % i), "P1", study_uid,
+                         series_uid)
+    write_dicom_file(tmp_path / "sub" / "other.dcm", "P2", generate_uid(),
+                     generate_uid())
+    (tmp_path / "notes.txt").write_text("not a DICOM file")
+    return tmp_path
+
+
+def test_read_header_skips_non_dicom_files(dicom_directory):
+    assert read_header(str(dicom_directory / "notes.txt")) is None
+    header = read_header(str(dicom_directory / "ct0.dcm"))
+    assert header["PatientID"] == "P1"
+    assert header["Modality"] == "CT"
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_get_dicom_structure(dicom_directory, use_processes):
+    progress_callback = Mock()
+    structure = get_dicom_structure(str(dicom_directory), threading.Event(),
+                                    progress_callback, max_workers=2,
+                                    use_processes=use_processes)
+
+    assert sorted(structure.patients) == ["P1", "P2"]
+    study = list(structure.get_patient("P1").studies.values())[0]
+    series = list(study.series.values())[0]
+    assert len(series.images) == 4
+    assert len(structure.get_files()) == 5
+    assert progress_callback.emit.call_count == 6
+
+
+def test_get_dicom_structure_interrupted(dicom_directory):
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert get_dicom_structure(str(dicom_directory), interrupt_flag,
+                               Mock()) is None
+
+
+@pytest.fixture
+def dicom_index(create_sqlite_cache):
+    return create_sqlite_cache(DICOMIndex)
+
+
+def test_rescan_only_reads_changed_files(dicom_directory, dicom_index):
+    path = str(dicom_directory)
+    first = get_dicom_structure(path, threading.Event(), Mock(),
+                                index=dicom_index)
+    assert len(get_indexed_dicom_structure(path, dicom_index).get_files()) \
+        == len(first.get_files()) == 5
+    assert first.changed
+
+    unchanged = get_dicom_structure(path, threading.Event(), Mock(),
+                                    index=dicom_index)
+    assert not unchanged.changed
+
+    # Change one file, remove one file and add one file
+    write_dicom_file(dicom_directory / "ct0.dcm", "P3", generate_uid(),
+                     generate_uid())
+    os.remove(str(dicom_directory / "ct1.dcm"))
+    write_dicom_file(dicom_directory / "new.dcm", "P1", generate_uid(),
+                     generate_uid())
+
+    with mock.patch.object(DICOMDirectorySearch, "read_header",
+                           wraps=read_header) as read:
+        second = get_dicom_structure(path, threading.Event(), Mock(),
+                                     index=dicom_index)
+
+    read_files = sorted(os.path.basename(call.args[0])
+                        for call in read.call_args_list)
+    assert read_files == ["ct0.dcm", "new.dcm"]
+    assert second.changed
+    assert sorted(second.patients) == ["P1", "P2", "P3"]
+    assert sorted(get_indexed_dicom_structure(path, dicom_index)
+                  .get_files()) == sorted(second.get_files())
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from dicompylercore.dvh import DVH
+from pydicom.dataset import Dataset
+
+from src.Model.DVHCache import DVHCache
+
+
+def create_rtss(contour_data):
+    """
+    Create an RTSS dataset with one contour for each ROI.
+    :param contour_data: Dictionary of ROI number to ContourData.
+    """
+    rtss = Dataset()
+    rtss.ROIContourSequence = []
+    for roi, data in contour_data.items():
+        contour = Dataset()
+        contour.ContourGeometricType = "CLOSED_PLANAR"
+        contour.ContourData = data
+        roi_contour = Dataset()
+        roi_contour.ReferencedROINumber = roi
+        roi_contour.ContourSequence = [contour]
+        rtss.ROIContourSequence.append(roi_contour)
+    return rtss
+
+
+@pytest.fixture
+def dvh_cache(create_sqlite_cache):
+    return create_sqlite_cache(DVHCache)
+
+
+def test_dvh_cache_keys():
+    rtss = create_rtss({1: [0, 0, 0, 1, 0, 0, 1, 1, 0],
+                        2: [0, 0, 0, 2, 0, 0, 2, 2, 0]})
+    keys = DVHCache.get_keys(rtss, "1.2.3", [1, 2], {})
+
+    # Changing the contours of one ROI only changes the key of that ROI
+    changed = create_rtss({1: [0, 0, 0, 1, 0, 0, 1, 1, 0],
+                           2: [0, 0, 0, 3, 0, 0, 3, 3, 0]})
+    changed_keys = DVHCache.get_keys(changed, "1.2.3", [1, 2], {})
+    assert keys[1] == changed_keys[1]
+    assert keys[2] != changed_keys[2]
+
+    # The dose and the thickness are part of the key
+    assert keys != DVHCache.get_keys(rtss, "1.2.4", [1, 2], {})
+    assert keys[1] != DVHCache.get_keys(rtss, "1.2.3", [1], {1: 1.5})[1]
+
+
+def test_dvh_cache_round_trip(dvh_cache):
+    rtss = create_rtss({1: [0, 0, 0, 1, 0, 0, 1, 1, 0]})
+    keys = DVHCache.get_keys(rtss, "1.2.3", [1, 2], {})
+    dvh = DVH(counts=np.array([3.0, 2.0, 0.5]), bins=np.array([0, 1, 2, 3]),
+              name="BODY")
+
+    assert dvh_cache.get_dvhs(keys) == {}
+    dvh_cache.update_dvhs(keys, {1: dvh})
+    cached = dvh_cache.get_dvhs(keys)
+
+    assert list(cached) == [1]
+    assert cached[1].name == "BODY"
+    assert cached[1].dvh_type == dvh.dvh_type
+    assert np.array_equal(cached[1].counts, dvh.counts)
+    assert np.array_equal(cached[1].bins, dvh.bins)
+
+
+def test_dvh_cache_keeps_recently_used_dvhs(dvh_cache, monkeypatch):
+    monkeypatch.setattr(dvh_cache, "cache_size", 2)
+    rtss = create_rtss({roi: [0, 0, 0, roi, 0, 0, roi, roi, 0]
+                        for roi in (1, 2, 3)})
+    keys = DVHCache.get_keys(rtss, "1.2.5", [1, 2, 3], {})
+    dvh = DVH(counts=np.array([1.0]), bins=np.array([0, 1]))
+
+    dvh_cache.update_dvhs({1: keys[1]}, {1: dvh})
+    dvh_cache.update_dvhs({2: keys[2]}, {2: dvh})
+    # Reading the first DVH makes the second the least recently used
+    assert list(dvh_cache.get_dvhs({1: keys[1]})) == [1]
+    dvh_cache.update_dvhs({3: keys[3]}, {3: dvh})
+
+    assert sorted(dvh_cache.get_dvhs(keys)) == [1, 3]
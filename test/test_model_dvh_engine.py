@@ -0,0 +1,125 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from pathlib import Path
+from dicompylercore import dvhcalc
+from pydicom import dcmread
+from pydicom.errors import InvalidDicomError
+from src.Model import ImageLoading
+from src.Model.DVHEngine import DVHEngine
+
+
+def find_DICOM_files(file_path):
+    """
+    Function to find DICOM files in a given folder.
+    :param file_path: File path of folder to search.
+    :return: List of file paths of DICOM files in given folder.
+    """
+
+    dicom_files = []
+
+    # Walk through directory
+    for root, dirs, files in os.walk(file_path, topdown=True):
+        for name in files:
+            # Attempt to open file as a DICOM file
+            try:
+                dcmread(os.path.join(root, name))
+            except (InvalidDicomError, FileNotFoundError):
+                pass
+            else:
+                dicom_files.append(os.path.join(root, name))
+    return dicom_files
+
+
+class TestDVHEngine:
+    """
+    This class is to set up data and variables needed to compare the
+    DVHEngine against dicompyler.
+    """
+
+    __test__ = False
+
+    def __init__(self):
+        # Load test DICOM files
+        desired_path = Path.cwd().joinpath('test', 'testdata')
+        selected_files = find_DICOM_files(desired_path)
+        read_data_dict, file_names_dict = \
+            ImageLoading.get_datasets(selected_files)
+
+        self.dataset_rtss = dcmread(file_names_dict['rtss'])
+        self.dataset_rtdose = dcmread(file_names_dict['rtdose'])
+        self.rois = ImageLoading.get_roi_info(self.dataset_rtss)
+        self.dict_thickness = ImageLoading.get_thickness_dict(
+            self.dataset_rtss, read_data_dict)
+        self.engine = DVHEngine(self.dataset_rtss, self.dataset_rtdose)
+
+
+@pytest.fixture(scope="module")
+def test_object():
+    """
+    Function to pass a shared TestDVHEngine object to each test.
+    """
+    test = TestDVHEngine()
+    return test
+
+
+def within_dose_grid(engine, roi):
+    """
+    :return: True if every contour plane of the ROI is inside the dose
+        grid.
+    """
+    return all(engine.get_dose_plane(z) is not None
+               for z in engine.roi_planes.get(int(roi), {}))
+
+
+def test_dvh_engine_matches_dicompyler(test_object):
+    """
+    Test that the DVHs calculated by the engine are the same as the ones
+    calculated by dicompyler, for every ROI that is inside the dose grid.
+    """
+    raw_dvh = test_object.engine.calc_dvhs(test_object.rois,
+                                           test_object.dict_thickness)
+    assert list(raw_dvh) == list(test_object.rois)
+
+    compared = 0
+    for roi in test_object.rois:
+        if not within_dose_grid(test_object.engine, roi):
+            continue
+        expected = dvhcalc.get_dvh(
+            test_object.dataset_rtss, test_object.dataset_rtdose, roi,
+            thickness=test_object.dict_thickness.get(roi))
+        dvh = raw_dvh[roi]
+
+        assert dvh.name == expected.name
+        assert dvh.dvh_type == expected.dvh_type
+        assert len(dvh.counts) == len(expected.counts)
+        assert np.allclose(dvh.counts, expected.counts)
+        assert np.allclose(dvh.bins, expected.bins)
+        compared += 1
+
+    assert compared > 0
+
+
+def test_dvh_engine_dose_limit(test_object):
+    """
+    Test that no dose bins above the dose limit are calculated.
+    """
+    roi = next(iter(test_object.rois))
+    dose_limit = 100
+    raw_dvh = test_object.engine.calc_dvhs([roi], test_object.dict_thickness,
+                                           dose_limit=dose_limit)
+    assert len(raw_dvh[roi].counts) <= dose_limit
+
+
+def test_dvh_engine_interrupt(test_object):
+    """
+    Test that an interrupted calculation returns None.
+    """
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert test_object.engine.calc_dvhs(test_object.rois,
+                                        test_object.dict_thickness,
+                                        interrupt_flag) is None
@@ -0,0 +1,103 @@
+import threading
+
+import numpy as np
+import SimpleITK as sitk
+from pydicom.dataset import Dataset
+
+from src.Model.ImageFusion import LazyFusedPixmaps, get_colormix_luts, \
+    register_images, convert_combined_affine_to_matrix, \
+    convert_matrix_to_affine_transform, create_sitk_image
+
+
+class ProgressSignal:
+    """Stands in for the progress signal of a Worker."""
+
+    def __init__(self):
+        self.updates = []
+
+    def emit(self, progress):
+        self.updates.append(progress)
+
+
+def create_sphere_image(centre):
+    grid = np.mgrid[:24, :24, :24]
+    distance = np.sqrt(sum((axis - c) ** 2 for axis, c in zip(grid, centre)))
+    return sitk.GetImageFromArray(
+        np.where(distance < 6, 1000, -1000).astype(np.int16))
+
+
+def test_colormix_is_grey_where_images_agree():
+    fixed_lut, moving_lut = get_colormix_luts()
+    values = np.arange(256)
+    mixed = fixed_lut[values].astype(int) + moving_lut[values]
+
+    # Equal pixels are blended to (almost) grey, and never overflow
+    assert mixed.max() <= 255
+    assert np.all(np.abs(mixed - values[:, None]) <= 1)
+
+
+def test_lazy_fused_pixmaps_views():
+    fixed = np.random.randint(-1024, 3000, (6, 16, 12)).astype(np.int16)
+    moving = np.random.randint(-1024, 3000, (6, 16, 12)).astype(np.int16)
+    coronal = LazyFusedPixmaps(fixed, moving, "coronal", 400, 800, 512, 256)
+
+    assert len(coronal) == 16
+    image = coronal.render_image(3)
+    assert (image.width(), image.height()) == (512, 256)
+    assert np.array_equal(coronal.get_slice(3, moving), moving[:, 3, :])
+
+
+def test_register_images_progress_and_interrupt():
+    fixed = create_sphere_image((12, 12, 12))
+    moving = create_sphere_image((12, 12, 14))
+    progress = ProgressSignal()
+
+    registered, tfm = register_images(fixed, moving, shrink_factors=[2, 1],
+                                      smooth_sigmas=[1, 0],
+                                      number_of_iterations=5,
+                                      progress_callback=progress)
+    assert registered.GetSize() == fixed.GetSize()
+    assert tfm.GetNumberOfTransforms() == 2
+    assert progress.updates
+    assert all(85 <= percentage <= 95 for _, percentage in progress.updates)
+
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert register_images(fixed, moving, shrink_factors=[2, 1],
+                           smooth_sigmas=[1, 0], number_of_iterations=5,
+                           interrupt_flag=interrupt_flag) is None
+
+
+def test_affine_matrix_round_trip():
+    rigid = sitk.Euler3DTransform((10, 20, 30), 0.1, -0.2, 0.3, (1, 2, 3))
+    affine = sitk.AffineTransform(3)
+    affine.SetMatrix(rigid.GetMatrix())
+    affine.SetCenter(rigid.GetCenter())
+    affine.SetTranslation(rigid.GetTranslation())
+
+    converted = convert_matrix_to_affine_transform(
+        convert_combined_affine_to_matrix(affine))
+    for point in [(0, 0, 0), (15, -40, 100)]:
+        assert np.allclose(converted.TransformPoint(point),
+                           rigid.TransformPoint(point))
+
+
+def test_create_sitk_image_geometry():
+    volume = np.arange(3 * 4 * 5, dtype=np.int16).reshape(3, 4, 5)
+    datasets = {}
+    for i in range(3):
+        dataset = Dataset()
+        dataset.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        # Slices ordered from head to feet
+        dataset.ImagePositionPatient = [-100, -50, 30 - 2.5 * i]
+        dataset.PixelSpacing = [0.8, 0.6]
+        datasets[i] = dataset
+
+    image = create_sitk_image(volume, datasets)
+
+    assert np.array_equal(sitk.GetArrayViewFromImage(image), volume)
+    assert np.allclose(image.GetOrigin(), (-100, -50, 30))
+    assert np.allclose(image.GetSpacing(), (0.6, 0.8, 2.5))
+    assert np.allclose(image.GetDirection(), (1, 0, 0, 0, 1, 0, 0, 0, -1))
+    assert np.allclose(image.TransformIndexToPhysicalPoint((4, 3, 2)),
+                       (-100 + 4 * 0.6, -50 + 3 * 0.8, 25))
@@ -1,9 +1,12 @@
 import os
+import numpy as np
 import pytest
 
 from src.Model import ROI
+from src.Model.DosePlaneCache import get_dose_plane_cache
 from src.Model.ISO2ROI import ISO2ROI
-from src.Model.Isodose import get_dose_grid
+from src.Model.Isodose import calculate_isodose_boundaries, \
+    find_isodose_boundaries, get_dose_grid
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model import ImageLoading
 
@@ -245,3 +248,53 @@ def test_create_rtss(test_object):
     assert rtss.StudyInstanceUID == test_ds.StudyInstanceUID
     assert rtss.Modality == 'RTSTRUCT'
     assert rtss.SOPClassUID == '1.2.840.10008.5.1.4.1.1.481.3'
+
+
+def test_dose_plane_cache(test_object):
+    """
+    Test that the dose plane cache returns the same dose grids as
+    get_dose_grid, and reuses them.
+    :param test_object: test_object function, for accessing the shared
+                        TestIso2Roi object.
+    """
+    rt_plan_dose = test_object.patient_dict_container.dataset['rtdose']
+    cache = get_dose_plane_cache(test_object.patient_dict_container)
+    assert get_dose_plane_cache(test_object.patient_dict_container) is cache
+
+    dataset = test_object.patient_dict_container.dataset[0]
+    z = dataset.ImagePositionPatient[2]
+    grid = cache.get_dose_grid(z)
+
+    assert np.array_equal(grid, get_dose_grid(rt_plan_dose, float(z)))
+    assert cache.get_dose_grid(z) is grid
+    assert not grid.flags.writeable
+
+
+def test_calculate_isodose_boundaries_in_parallel(test_object):
+    """
+    Test that the boundaries found on the worker processes are the same
+    as the ones found in this process.
+    :param test_object: test_object function, for accessing the shared
+                        TestIso2Roi object.
+    """
+    rt_plan_dose = test_object.patient_dict_container.dataset['rtdose']
+    slices = []
+    for slider_id in range(3):
+        dataset = test_object.patient_dict_container.dataset[slider_id]
+        slices.append((slider_id, float(dataset.ImagePositionPatient[2])))
+    thresholds = {"ISO": 1}
+
+    expected = find_isodose_boundaries(
+        [(slider_id, get_dose_grid(rt_plan_dose, z))
+         for slider_id, z in slices], thresholds)
+    boundaries = calculate_isodose_boundaries(
+        get_dose_plane_cache(test_object.patient_dict_container), slices,
+        thresholds)
+
+    assert sorted(boundaries) == [0, 1, 2]
+    for slider_id in boundaries:
+        assert len(boundaries[slider_id]["ISO"]) == \
+               len(expected[slider_id]["ISO"])
+        for contour, expected_contour in zip(boundaries[slider_id]["ISO"],
+                                             expected[slider_id]["ISO"]):
+            assert np.array_equal(contour, expected_contour)
@@ -13,8 +13,11 @@ from pydicom.tag import Tag
 from pathlib import Path
 
 from src.Model.PatientDictContainer import PatientDictContainer
-from src.Model.ROI import add_to_roi, calculate_matrix, create_roi, create_initial_rtss_from_ct
+from src.Model.ROI import add_to_roi, calculate_matrix, create_roi, create_initial_rtss_from_ct, \
+    get_pixluts, calculate_pixels, create_roi_from_contours, delete_roi, rename_roi, \
+    get_contour_edges, reslice_contours
 from src.Model import ImageLoading
+from src.Model.ContourStore import ROIContours
 
 
 def find_DICOM_files(file_path):
@@ -78,6 +81,88 @@ def test_calculate_matrix():
     assert np.all(array_y == np.array([0, 1, 2, 3]))
 
 
+def test_get_pixluts_shares_identical_luts():
+    datasets = {}
+    for i in range(3):
+        image_ds = dataset.Dataset()
+        image_ds.SOPInstanceUID = str(i)
+        image_ds.PixelSpacing = [0.5, 2]
+        image_ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        image_ds.ImagePositionPatient = [-1, 3, i]
+        image_ds.Rows = 3
+        image_ds.Columns = 4
+        datasets[i] = image_ds
+    pixluts = get_pixluts(datasets)
+    assert np.all(pixluts["0"][0] == np.array([-1, -0.5, 0, 0.5]))
+    assert np.all(pixluts["0"][1] == np.array([3, 5, 7]))
+    assert pixluts["0"][0] is pixluts["2"][0]
+    assert pixluts["0"][1] is pixluts["2"][1]
+    assert not pixluts["0"][0].flags.writeable
+
+
+def test_calculate_pixels():
+    pixlut = (np.array([-1, 0, 1, 2]), np.array([10, 12, 14]))
+    contour = [-0.5, 12, 0, 1, 9, 0, 5, 14.5, 0]
+    assert calculate_pixels(pixlut, contour) == [[1, 2], [3, 0], [0, 0]]
+    assert calculate_pixels(pixlut, contour, feetfirst=True) == \
+        [[1, 2], [2, 0], [0, 0]]
+    assert calculate_pixels(pixlut, contour, prone=True) == \
+        [[1, 1], [2, 0], [0, 0]]
+    # Descending LUTs must give the same result as a linear scan
+    descending = (pixlut[0][::-1], pixlut[1][::-1])
+    assert calculate_pixels(descending, contour) == [[0, 0], [0, 0], [0, 0]]
+    assert calculate_pixels(descending, contour, prone=True) == \
+        [[0, 0], [0, 0], [0, 0]]
+
+
+def test_roi_contours():
+    contour_sequence = []
+    for uid, data in [("1.1", [0, 0, 0, 1, 0, 0, 1, 1, 0]),
+                      ("1.2", [0, 0, 1, 2, 0, 1]),
+                      ("1.1", [5, 5, 0, 6, 5, 0, 6, 6, 0, 5, 6, 0])]:
+        contour_image = dataset.Dataset()
+        contour_image.ReferencedSOPInstanceUID = uid
+        contour = dataset.Dataset()
+        contour.ContourImageSequence = [contour_image]
+        contour.ContourData = data
+        contour_sequence.append(contour)
+
+    roi_contours = ROIContours.from_contour_sequence(contour_sequence)
+
+    # Contours are grouped by slice
+    assert sorted(roi_contours) == ["1.1", "1.2"]
+    assert [len(contour) for contour in roi_contours["1.1"]] == [3, 4]
+    assert roi_contours["1.3"] == []
+    assert "1.3" not in roi_contours
+
+    # The points of a slice are a view of the points of the ROI
+    points, offsets = roi_contours.get_slice_points("1.1")
+    assert np.shares_memory(points, roi_contours.points)
+    assert list(offsets) == [0, 3, 7]
+    assert np.array_equal(points[3], [5, 5, 0])
+
+    assert roi_contours == ROIContours.from_contour_sequence(contour_sequence)
+
+
+def test_reslice_contours():
+    # The same square on three consecutive slices
+    square = [[10, 20], [30, 20], [30, 40], [10, 40]]
+    edges = np.concatenate([get_contour_edges(square, i) for i in range(3)])
+
+    coronal = reslice_contours(edges, 1)
+    sagittal = reslice_contours(edges, 0)
+
+    # Every row and column inside the square has one outline
+    assert sorted(coronal) == list(range(20, 40))
+    assert sorted(sagittal) == list(range(10, 30))
+    assert coronal[25] == [[10, 0], [10, 1], [10, 2], [30, 2], [30, 1], [30, 0]]
+    assert sagittal[15] == [[20, 0], [20, 1], [20, 2], [40, 2], [40, 1], [40, 0]]
+
+    # Slices that are not consecutive give separate outlines
+    edges = np.concatenate([get_contour_edges(square, i) for i in (0, 2)])
+    assert len(reslice_contours(edges, 1)[25]) == 2
+
+
 def test_add_to_roi():
     rt_ss = dataset.Dataset()
 
@@ -152,6 +237,67 @@ def test_create_roi():
     )
     assert (first_contour.ContourGeometricType == "CLOSED_PLANAR")
     assert (rt_ss.RTROIObservationsSequence[0].RTROIInterpretedType == "ORGAN")
+    # The DVH of the new ROI has to be calculated
+    new_roi_number = updated_rtss.StructureSetROISequence[-1].ROINumber
+    assert new_roi_number in patient_dict_container.get("dvh_dirty_rois")
+
+
+def test_create_roi_from_contours():
+    rt_ss = dataset.Dataset()
+    rt_ss.StructureSetROISequence = []
+    rt_ss.ROIContourSequence = []
+    rt_ss.RTROIObservationsSequence = []
+
+    image_ds = dataset.Dataset()
+    image_ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    image_ds.SOPInstanceUID = "1.2.3.4.5.6.7.8.9"
+    image_ds.FrameOfReferenceUID = "1.2.3"
+    triangle = [0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0]
+    roi_list = [{'coords': triangle, 'ds': image_ds} for _ in range(3)]
+
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.set_initial_values(None, None, None, blah="blah", rois={})
+    updated_rtss = create_roi_from_contours(rt_ss, "ISO", roi_list, "DOSE_REGION")
+
+    # A single ROI holds every contour
+    assert len(updated_rtss.StructureSetROISequence) == 1
+    assert len(updated_rtss.ROIContourSequence) == 1
+    contours = updated_rtss.ROIContourSequence[0].ContourSequence
+    assert [contour.ContourNumber for contour in contours] == [1, 2, 3]
+    assert all(contour.ContourGeometricType == "CLOSED_PLANAR" for contour in contours)
+    assert updated_rtss.RTROIObservationsSequence[0].RTROIInterpretedType == "DOSE_REGION"
+
+    # Contours are added to an existing ROI
+    updated_rtss = create_roi_from_contours(updated_rtss, "ISO", roi_list[:1])
+    assert len(updated_rtss.ROIContourSequence) == 1
+    assert len(updated_rtss.ROIContourSequence[0].ContourSequence) == 4
+
+
+def test_rename_and_delete_roi():
+    rt_ss = dataset.Dataset()
+    rt_ss.StructureSetROISequence = []
+    rt_ss.ROIContourSequence = []
+    rt_ss.RTROIObservationsSequence = []
+
+    image_ds = dataset.Dataset()
+    image_ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    image_ds.SOPInstanceUID = "1.2.3.4.5.6.7.8.9"
+    image_ds.FrameOfReferenceUID = "1.2.3"
+    roi_list = [{'coords': [0, 0, 0, 0, 1, 0, 1, 0, 0], 'ds': image_ds}]
+
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.set_initial_values(None, None, None, blah="blah", rois={})
+    rt_ss = create_roi_from_contours(rt_ss, "FIRST", roi_list)
+    rt_ss = create_roi_from_contours(rt_ss, "SECOND", roi_list)
+
+    rt_ss = rename_roi(rt_ss, 1, "RENAMED")
+    assert rt_ss.StructureSetROISequence[0].ROIName == "RENAMED"
+
+    # Deleting an ROI removes it from every sequence
+    rt_ss = delete_roi(rt_ss, "RENAMED")
+    assert [roi.ROIName for roi in rt_ss.StructureSetROISequence] == ["SECOND"]
+    assert [roi.ReferencedROINumber for roi in rt_ss.ROIContourSequence] == [2]
+    assert [roi.ReferencedROINumber for roi in rt_ss.RTROIObservationsSequence] == [2]
 
 
 def test_create_initial_rtss_from_ct(qtbot, test_object, init_config):
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from src.Model.TransformCache import TransformCache
+
+
+@pytest.fixture
+def transform_cache(create_sqlite_cache):
+    return create_sqlite_cache(TransformCache)
+
+
+def test_transform_cache_keys():
+    key = TransformCache.get_key("1.2.3", "1.2.4", (8, 4), (10, 5), 100)
+
+    assert key == TransformCache.get_key("1.2.3", "1.2.4", [8, 4],
+                                         [10.0, 5.0], 100)
+    assert key != TransformCache.get_key("1.2.4", "1.2.3", (8, 4), (10, 5),
+                                         100)
+    assert key != TransformCache.get_key("1.2.3", "1.2.4", (8,), (10,), 100)
+    assert key != TransformCache.get_key("1.2.3", "1.2.4", (8, 4), (10, 5),
+                                         50)
+
+
+def test_transform_cache_round_trip(transform_cache):
+    key = TransformCache.get_key("1.2.3", "1.2.4", (8, 4), (10, 5), 100)
+    matrix = np.eye(4)
+    matrix[0:3, 3] = [1.5, -2.0, 3.25]
+
+    assert transform_cache.get_transform(key) is None
+    transform_cache.update_transform(key, matrix)
+    assert np.array_equal(transform_cache.get_transform(key), matrix)
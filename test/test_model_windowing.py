@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.Model.Windowing import apply_window, get_window_lut
+
+
+def float_window(np_pixels, window, level):
+    """Windowing as previously calculated for every pixel of a slice."""
+    np_pixels = np_pixels.astype(np.int16)
+    np_pixels = (np_pixels - level) / window * 255
+    np_pixels[np_pixels < 0] = 0
+    np_pixels[np_pixels > 255] = 255
+    return np_pixels.astype(np.uint8)
+
+
+def test_lut_matches_float_windowing():
+    np_pixels = np.arange(-2000, 4000, dtype=np.int16).reshape(60, 100)
+    for window, level in [(400, 800), (1600, -300), (160, 950)]:
+        assert np.array_equal(apply_window(np_pixels, window, level),
+                              float_window(np_pixels, window, level))
+
+
+def test_lut_on_non_contiguous_slice():
+    volume = np.random.randint(-1024, 3000, (8, 16, 16)).astype(np.int16)
+    sagittal = volume[:, :, 3]
+    assert np.array_equal(apply_window(sagittal, 400, 800),
+                          float_window(sagittal, 400, 800))
+
+
+def test_full_range_when_window_or_level_is_zero():
+    np_pixels = np.array([[100, 150], [200, 300]], dtype=np.int16)
+    windowed = apply_window(np_pixels, 0, 0)
+    assert windowed[0, 0] == 0
+    assert windowed[1, 1] == 255
+
+
+def test_lut_is_cached_and_read_only():
+    lut = get_window_lut(400, 800)
+    assert lut is get_window_lut(400, 800)
+    assert lut.shape == (65536,)
+    assert not lut.flags.writeable
+
+
+def test_window_on_rescaled_pixels_matches_stored_pixels():
+    stored = np.arange(0, 3000, dtype=np.int16).reshape(30, 100)
+    rescaled = (stored - 1024).astype(np.int16)
+    assert np.array_equal(apply_window(rescaled, 400, 800, (1, -1024)),
+                          apply_window(stored, 400, 800))
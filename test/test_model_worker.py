@@ -1,9 +1,11 @@
+import threading
 from unittest import mock
 from unittest.mock import Mock
 
 from PySide6.QtCore import QThreadPool
 
 from src.Model.Worker import Worker
+from src.Model.WorkerProcessPool import WorkerProcessPool
 
 
 class FakeClass:
@@ -104,3 +106,34 @@ def test_worker_error_signal(qtbot):
 
         thing.func_to_test.assert_called_with("test", 3)
         assert isinstance(args[0][1], ValueError)
+
+
+def test_worker_process_pool():
+    """
+    Testing that the results of the worker process pool are in the order
+    of the tasks, that it can be interrupted, and that its worker
+    processes are reused until it is shut down.
+    """
+    pool = WorkerProcessPool(max_workers=2)
+    progress = []
+    task_args = ((i, 2) for i in range(10))
+    results = pool.run_tasks(pow, task_args, 10,
+                             progress_callback=lambda *args:
+                             progress.append(args))
+
+    assert results == [i ** 2 for i in range(10)]
+    assert progress[-1] == (10, 10)
+
+    executor = pool.executor
+    assert pool.run_tasks(pow, [(3, 2)]) == [9]
+    assert pool.executor is executor
+
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert pool.run_tasks(pow, [(2, 8)], interrupt_flag=interrupt_flag) \
+        is None
+
+    pool.shutdown()
+    assert pool.executor is None
+    assert pool.run_tasks(pow, [(2, 3)]) == [8]
+    pool.shutdown()